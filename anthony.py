@@ -1,151 +1,21 @@
-import json
-import socket
 import logging
-import binascii
-import struct
 import argparse
 import random
-import math
 import pdb
 import time
-import sympy
-
-
-class ServerMessageTypes(object):
-    TEST = 0
-    CREATETANK = 1
-    DESPAWNTANK = 2
-    FIRE = 3
-    TOGGLEFORWARD = 4
-    TOGGLEREVERSE = 5
-    TOGGLELEFT = 6
-    TOGGLERIGHT = 7
-    TOGGLETURRETLEFT = 8
-    TOGGLETURRETRIGHT = 9
-    TURNTURRETTOHEADING = 10
-    TURNTOHEADING = 11
-    MOVEFORWARDDISTANCE = 12
-    MOVEBACKWARSDISTANCE = 13
-    STOPALL = 14
-    STOPTURN = 15
-    STOPMOVE = 16
-    STOPTURRET = 17
-    OBJECTUPDATE = 18
-    HEALTHPICKUP = 19
-    AMMOPICKUP = 20
-    SNITCHPICKUP = 21
-    DESTROYED = 22
-    ENTEREDGOAL = 23
-    KILL = 24
-    SNITCHAPPEARED = 25
-    GAMETIMEUPDATE = 26
-    HITDETECTED = 27
-    SUCCESSFULLHIT = 28
-
-    strings = {
-        TEST: "TEST",
-        CREATETANK: "CREATETANK",
-        DESPAWNTANK: "DESPAWNTANK",
-        FIRE: "FIRE",
-        TOGGLEFORWARD: "TOGGLEFORWARD",
-        TOGGLEREVERSE: "TOGGLEREVERSE",
-        TOGGLELEFT: "TOGGLELEFT",
-        TOGGLERIGHT: "TOGGLERIGHT",
-        TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-        TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
-        TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
-        TURNTOHEADING: "TURNTOHEADING",
-        MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
-        MOVEBACKWARSDISTANCE: "MOVEBACKWARDSDISTANCE",
-        STOPALL: "STOPALL",
-        STOPTURN: "STOPTURN",
-        STOPMOVE: "STOPMOVE",
-        STOPTURRET: "STOPTURRET",
-        OBJECTUPDATE: "OBJECTUPDATE",
-        HEALTHPICKUP: "HEALTHPICKUP",
-        AMMOPICKUP: "AMMOPICKUP",
-        SNITCHPICKUP: "SNITCHPICKUP",
-        DESTROYED: "DESTROYED",
-        ENTEREDGOAL: "ENTEREDGOAL",
-        KILL: "KILL",
-        SNITCHAPPEARED: "SNITCHAPPEARED",
-        GAMETIMEUPDATE: "GAMETIMEUPDATE",
-        HITDETECTED: "HITDETECTED",
-        SUCCESSFULLHIT: "SUCCESSFULLHIT"
-    }
-
-    def toString(self, id):
-        if id in self.strings.keys():
-            return self.strings[id]
-        else:
-            return "??UNKNOWN??"
-
-
-class ServerComms(object):
-    '''
-    TCP comms handler
-    
-    Server protocol is simple:
-    
-    * 1st byte is the message type - see ServerMessageTypes
-    * 2nd byte is the length in bytes of the payload (so max 255 byte payload)
-    * 3rd byte onwards is the payload encoded in JSON
-    '''
-    ServerSocket = None
-    MessageTypes = ServerMessageTypes()
-
-    def __init__(self, hostname, port):
-        self.ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.ServerSocket.connect((hostname, port))
-
-    def readMessage(self):
-        '''
-        Read a message from the server
-        '''
-        messageTypeRaw = self.ServerSocket.recv(1)
-        messageLenRaw = self.ServerSocket.recv(1)
-        messageType = struct.unpack('>B', messageTypeRaw)[0]
-        messageLen = struct.unpack('>B', messageLenRaw)[0]
-
-        if messageLen == 0:
-            messageData = bytearray()
-            messagePayload = {'messageType': messageType}
-        else:
-            messageData = self.ServerSocket.recv(messageLen)
-            logging.debug("*** {}".format(messageData))
-            messagePayload = json.loads(messageData.decode('utf-8'))
-            messagePayload['messageType'] = messageType
-
-        logging.debug('Turned message {} into type {} payload {}'.format(
-            binascii.hexlify(messageData),
-            self.MessageTypes.toString(messageType),
-            messagePayload))
-        return messagePayload
-
-    def sendMessage(self, messageType=None, messagePayload=None):
-        '''
-        Send a message to the server
-        '''
-        message = bytearray()
-
-        if messageType is not None:
-            message.append(messageType)
-        else:
-            message.append(0)
 
-        if messagePayload is not None:
-            messageString = json.dumps(messagePayload)
-            message.append(len(messageString))
-            message.extend(str.encode(messageString))
-
-        else:
-            message.append(0)
+from tankbot.lazy import prewarm
+from tankbot.comms import ServerMessageTypes, ServerComms, CommandBuffer
+from tankbot.tracing import FrameTrace
+from tankbot.dispatch import MessageDispatcher
+from tankbot.entities import Tank, Pickup, Snitch, track
+from tankbot.enemytable import EnemyTable
+from tankbot.firingtable import FiringTable
+from tankbot.firecontrol import FireControl
+from tankbot.hitprobability import HitEstimator
+from tankbot.leadcorrection import LeadCorrector
+from tankbot.deadreckoning import SelfPredictor
 
-        logging.debug('Turned message type {} payload {} into {}'.format(
-            self.MessageTypes.toString(messageType),
-            messagePayload,
-            binascii.hexlify(message)))
-        return self.ServerSocket.send(message)
 
 
 class States(object):
@@ -159,6 +29,8 @@ parser.add_argument('-d', '--debug', action='store_true', help='Enable debug out
 parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
 parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
 parser.add_argument('-n', '--name', default='RandomBot', help='Name of bot')
+parser.add_argument('-l', '--lead-correction', action='store_true',
+                    help='Learn lead corrections from hits during the match')
 args = parser.parse_args()
 
 # Set up console logging
@@ -169,132 +41,71 @@ else:
 
 # Connect to game server
 GameServer = ServerComms(args.hostname, args.port)
+Commands = CommandBuffer(GameServer)
+if args.debug:
+    GameServer.trace = FrameTrace()
+    GameServer.trace.installCrashHandler()
 
 
 class States(object):
     NOTHING = 'NOTHING'
 
 
-def getCartesian(x, y, b):
-    m = (b - 90) / 360
-    c = y - m * x
-    return m, c
-
-
-def getHeading(x1, y1, x2, y2):
-    heading = math.atan2(y2 - y1, x2 - x1)
-    heading = math.degrees(heading)
-    heading = math.fmod(heading - 360, 360)
-    return abs(heading)
-
-
-def calculateDistance(x1, y1, x2, y2):
-    headingX = x2 - x1
-    headingY = y2 - y1
-    return math.sqrt((headingX * headingX) + (headingY * headingY))
-
-
-def targetStill(enemy_x, enemy_y, me_x, me_y):
-    return getHeading(enemy_x, enemy_y, me_x, me_y)
-
-
-def targetStraight(enemy_x, enemy_y, me_x, me_y):
-    a = enemy_x
-    b = enemy_y
-    c = me_x
-    d = me_y
-    b = info.myTank['Heading']
-
-    m, k = getCartesian(enemy_x, enemy_y, b)
-
-    speed_e = tankSpeed
-    speed_b = projectileSpeed
-
-    x = 0.0
-    y = 0.0
-
-    a = (m ** 2 + 1) * (speed_b - speed_e)
-    b = speed_b * (-2 * c + 2 * m * k - 2 * m * d) - speed_e * (-2 * a + 2 * m * k - 2 * m * b)
-    c = speed_b * (a ** 2 + k ** 2 - 2 * k * b + b ** 2) - speed_b * (a ** 2 + k ** 2 - 2 * k * d + d ** 2)
-
-    x = quadratic(a, b, c)
-    y = m * x + k
-    return getHeading(x, y, me_x, me_y)
-
-
-def quadratic(a, b, c):
-    return (-b + math.sqrt(b ** 2 - 4 * a * c))/(2*a)
-
-
-def targetRight(enemy_x, enemy_y, me_x, me_y):
-    x = sympy.Symbol('x')
-    y = sympy.Symbol('y')
-
-    a = enemy_x
-    b = enemy_y
-    c = me_x
-    d = me_y
-    r = turnRadius
-
-    [p,q] = sympy.nsolve([ math.sqrt((x - a) ** 2 + (y - b)) / speed_bullet - ( r * math.arccos(1 - (x - c) ** 2 - (y - d) ** 2) / (2 * r ** 2)) / speed_enemy, (x - a) ** 2 + (y - b) ** 2 - r ** 2 , [x,y], [1,1]])
-    return getHeading(p,q)
-
-
-def targetRight2(p, enemy_x, enemy_y, me_x, me_y):
-    x, y = p
-    a = enemy_x
-    b = enemy_y
-    c = me_x
-    d = me_y
-    r = turnRadius
-
-    F[0] = sqrt((x - a) ** 2 + (y - b)) / speed_bullet - (
-                r * arccos(1 - (x - c) ** 2 - (y - d) ** 2) / (2 * r ** 2)) / speed_enemy
-    F[1] = (x - a) ** 2 + (y - b) ** 2 - r ** 2
-    enemy_x, enemy_y = equation(F)
-    return getHeading(enemy_y, enemy_y, me_x, me_y)
-
-
-def equation(F):
-    zGuess = array([1, 1])
-    z = fsolve(equation, zGuess)
-    return z
-
-
 class Info(object):
     def __init__(self):
         self.myTank = None
         self.healthPickups = {}
         self.ammoPickups = {}
         self.snitch = None
-        self.enemies = {}
-        self.prevEnemies = {}
-
-    def update(self, message):
-        if message['messageType'] == ServerMessageTypes.OBJECTUPDATE:
-            if message['Type'] == 'Tank':
-                if message['Id'] == tankID:
-                    self.myTank = message
-                    logging.info("x1: " + str(message.get('X')))
-                    logging.info("x2: " + str(message.get('Y')))
-                else:
-                    if (message['Id'] in self.enemies):
-                        self.prevEnemies[message['Id']] = self.enemies[message['Id']]
-                    self.enemies[message['Id']] = message
-
-            elif message['Type'] == 'HealthPickup':
-                self.healthPickups[message['Id']] = message
-            elif message['Type'] == 'AmmoPickup':
-                self.ammoPickups[message['Id']] = message
-            elif message['Type'] == 'Snitch':
-                self.snitch = message
+        self.enemies = EnemyTable()
+        self.selfState = SelfPredictor()
+        # off unless asked for: it still costs hits when the firing model is right
+        self.leadCorrector = LeadCorrector() if args.lead_correction else None
+
+        self.dispatcher = MessageDispatcher()
+        self.update = self.dispatcher.dispatch
+        self.updateAll = self.dispatcher.dispatchAll
+        subscribe = self.dispatcher.subscribe
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Tank', self.onTank)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'HealthPickup', self.onHealthPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'AmmoPickup', self.onAmmoPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Snitch', self.onSnitch)
+        if self.leadCorrector is not None:
+            subscribe(ServerMessageTypes.SUCCESSFULLHIT, handler=self.onSuccessfulHit)
+
+    def onTank(self, message):
+        if message['Id'] == tankID:
+            if self.myTank is None:
+                self.myTank = Tank(message)
             else:
-                print('Unrecognized message type:', message)
+                self.myTank.update(message)
+            self.selfState.correct(self.myTank, time.time())
+            logging.info("x1: " + str(message.get('X')))
+            logging.info("x2: " + str(message.get('Y')))
+        else:
+            self.enemies.update(message)
+
+    def onHealthPickup(self, message):
+        track(self.healthPickups, Pickup, message)
+
+    def onAmmoPickup(self, message):
+        track(self.ammoPickups, Pickup, message)
+
+    def onSnitch(self, message):
+        if self.snitch is None:
+            self.snitch = Snitch(message)
+        else:
+            self.snitch.update(message)
+
+    def onSuccessfulHit(self, message):
+        self.leadCorrector.hit(time.time())
 
 
 # Spawn our tank
 logging.info("Creating tank with name '{}'".format(args.name))
 GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+# load NumPy while the server sets the tank up
+prewarm('numpy')
 
 message = GameServer.readMessage()
 tankID = message.get("Id")
@@ -303,36 +114,25 @@ maxHealth = 5
 ammo = 10
 waitTime = 50
 info = Info()
-tankSpeed = 10
-projectileSpeed = 35
-turnRadius = 5.7815
+Commands.observers.append(info.selfState.onCommands)
+fireControl = FireControl(FiringTable.load(), tickTime=waitTime * 0.001, hitEstimator=HitEstimator(),
+                          leadCorrector=info.leadCorrector, minProbability=0.3)
 
 
 def tryShot():
-    turretHeading = info.myTank["TurretHeading"]
-    xm = info.myTank['X']
-    ym = info.myTank['Y']
-    for enemy in info.prevEnemies:
-        x1 = info.prevEnemies[enemy]['X']
-        y1 = info.prevEnemies[enemy]['Y']
-        h1 = info.prevEnemies[enemy]['Heading']
-        x2 = info.enemies[enemy]['X']
-        y2 = info.enemies[enemy]['Y']
-        h2 = info.enemies[enemy]['Heading']
-        ht = None
-
-        if (x1 == x2 and y1 == y2):
-            ht = targetStill(x2, y2, xm, ym)
-        elif (x1 != x2 or y1 != y2) and h1 == h2:
-            ht = targetStraight(x2, y2, xm, ym)
-        elif (x1 != x2 or y1 != y2) and h1 > h2:
-            ht = targetRight(x2, y2, xm, ym)
-        elif (x1 != x2 or y1 != y2) and h1 < h2:
-            ht = targetRight(x2, y2, xm, ym)
-        else:
-            return
-        if turretHeading == ht:
-            GameServer.sendMessage(ServerMessageTypes.FIRE)
+    # one batched pass over every tracked enemy picks the best shot; the
+    # turret is sent to where it meets the moving aim point once, and FIRE
+    # goes out on the tick it lines up
+    if info.myTank is None:
+        return
+    shot = fireControl.aim(info.enemies, info.myTank, time.time(), info.selfState.turretTarget)
+    if shot is None:
+        return
+    if shot.turn:
+        Commands.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': shot.heading})
+    if shot.fire:
+        Commands.sendMessage(ServerMessageTypes.FIRE)
+
 
 def move(i):
     if (i == 0):
@@ -340,13 +140,13 @@ def move(i):
     else:
         turnLeft()
 def turnRight():
-    GameServer.sendMessage(ServerMessageTypes.TOGGLERIGHT)
-    GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount':3})    
+    Commands.sendMessage(ServerMessageTypes.TOGGLERIGHT)
+    Commands.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount':3})    
     logging.info('Turning right')
 
 def turnLeft():
-    GameServer.sendMessage(ServerMessageTypes.TOGGLELEFT)
-    GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount':3})    
+    Commands.sendMessage(ServerMessageTypes.TOGGLELEFT)
+    Commands.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount':3})    
     logging.info('Turning left')
 
 def switchMovement(i):
@@ -368,19 +168,27 @@ def Main():
     t = time.time()
     i = 0
     while True:
-        message = GameServer.readMessage()
-        info.update(message)
+        # one decision every waitTime ms, between server updates too
+        tickEnd = time.time() + waitTime * 0.001
+        while True:
+            info.updateAll(GameServer.readMessages(timeout=max(tickEnd - time.time(), 0)))
+            if time.time() >= tickEnd:
+                break
+        info.enemies.step()
+        if info.myTank is not None:
+            info.selfState.refresh(info.myTank, time.time())
         loopTime = time.time()
         elapsedTime = loopTime - t
         # print(i)
         if (elapsedTime > 1):
             
             switchMovement(i)
-            tryShot()
             # i =1
             t = loopTime
         else:
-            move(i) 
+            move(i)
+        tryShot()
+        Commands.flush()
     # t = 0
 
     # while True:
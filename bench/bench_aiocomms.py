@@ -0,0 +1,113 @@
+#!/usr/bin/python
+'''
+Drives AsyncServerComms and AsyncCommandBuffer end to end against a local
+asyncio server and checks both directions
+
+The server streams OBJECTUPDATEs for tanks, ends with a GAMETIMEUPDATE
+and keeps every byte the bot sends back. The bot reads in batches with
+readMessages, queues a tick of commands after each batch and flushes
+them with one write. Every update has to arrive decoded as it was sent,
+the server has to receive exactly the frames of the commands queued,
+tick by tick, and the buffer's observers have to see each tick. The
+script exits non-zero if any of that fails, and reports the cost per
+message and per tick.
+
+    python bench/bench_aiocomms.py
+    python bench/bench_aiocomms.py -n 50000
+'''
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes, CommandEncoder
+from tankbot.aiocomms import AsyncServerComms, AsyncCommandBuffer
+
+T = ServerMessageTypes
+
+
+def updates(count):
+    return [{'messageType': T.OBJECTUPDATE, 'Id': random.randint(1, 12), 'Name': 'Bot{}'.format(i % 12),
+             'Type': 'Tank', 'X': round(random.uniform(-70, 70), 3), 'Y': round(random.uniform(-100, 100), 3),
+             'Heading': round(random.uniform(0, 360), 3), 'TurretHeading': round(random.uniform(0, 360), 3),
+             'Health': 5, 'Ammo': 10}
+            for i in range(count)]
+
+
+def tick(i):
+    return [(T.MOVEFORWARDDISTANCE, {'Amount': 3}), (T.TURNTOHEADING, {'Amount': i % 360}),
+            (T.TURNTURRETTOHEADING, {'Amount': (i * 7) % 360}), (T.FIRE, None)]
+
+
+async def run(messages):
+    encoder = CommandEncoder()
+    received = bytearray()
+    finished = asyncio.get_running_loop().create_future()
+
+    async def serve(reader, writer):
+        for message in messages:
+            payload = dict(message)
+            writer.write(encoder.encode(payload.pop('messageType'), payload))
+        writer.write(encoder.encode(T.GAMETIMEUPDATE, {'Time': 0}))
+        await writer.drain()
+        received.extend(await reader.read())
+        writer.close()
+        finished.set_result(None)
+
+    server = await asyncio.start_server(serve, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    start = time.perf_counter()
+    comms = await AsyncServerComms.connect('127.0.0.1', port)
+    commands = AsyncCommandBuffer(comms)
+    observed = []
+    commands.observers.append(lambda sent, now: observed.append(len(sent)))
+    got = []
+    ticks = 0
+    done = False
+    while not done:
+        for message in await comms.readMessages():
+            if message['messageType'] == T.GAMETIMEUPDATE:
+                done = True
+            else:
+                got.append(message)
+        for messageType, messagePayload in tick(ticks):
+            commands.sendMessage(messageType, messagePayload)
+        await commands.flush()
+        ticks += 1
+    comms.close()
+    elapsed = time.perf_counter() - start
+    await finished
+    server.close()
+    await server.wait_closed()
+
+    failures = []
+    if got != messages:
+        failures.append('{} of {} updates arrived, {} of them as sent'.format(
+            len(got), len(messages), sum(a == b for a, b in zip(got, messages))))
+    expected = b''.join(encoder.encode(messageType, messagePayload)
+                        for i in range(ticks) for messageType, messagePayload in tick(i))
+    if bytes(received) != expected:
+        failures.append('server received {} bytes, expected {}'.format(len(received), len(expected)))
+    if observed != [len(tick(i)) for i in range(ticks)]:
+        failures.append('observers saw {} ticks, {} were flushed'.format(len(observed), ticks))
+    return failures, ticks, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', default=20000, type=int, help='Updates for the server to send')
+    args = parser.parse_args()
+
+    random.seed(1)
+    messages = updates(args.count)
+    failures, ticks, elapsed = asyncio.run(run(messages))
+    for failure in failures:
+        print('FAIL', failure)
+    print('{} updates in {} ticks: {:.2f} us per update, {:.1f} us per tick'.format(
+        len(messages), ticks, elapsed / len(messages) * 1e6, elapsed / ticks * 1e6))
+    sys.exit(1 if failures else 0)
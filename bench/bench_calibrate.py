@@ -0,0 +1,161 @@
+#!/usr/bin/python
+'''
+Records a synthetic match with known physics through FrameTrace and
+checks how closely tankbot.calibrate recovers the constants
+
+Tanks toggle driving, turning and their turrets at random and the server
+reports every one of them each update; frames arrive with some latency
+and jitter and are stamped on arrival, as a real FrameTrace would. Our
+own tank stands still, aims at one enemy after another with the true
+constants and fires whenever its turret is on target and loaded; a
+SUCCESSFULLHIT arrives for every projectile that comes within the hit
+radius of an enemy. An empty trace and one without any tank updates
+have to calibrate to nothing rather than fail; the script exits non-zero
+if they do not.
+
+    python bench/bench_calibrate.py
+    python bench/bench_calibrate.py -d 300 -j 0.01
+'''
+
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot import physics
+from tankbot.comms import ServerMessageTypes, CommandEncoder
+from tankbot.tracing import FrameTrace
+from tankbot.geometry import angleDifference
+from tankbot.intercept import interceptTurning
+from tankbot.calibrate import Recording, Calibrator
+
+Step = 0.005
+Update = 0.05
+Truth = {'tankSpeed': 9.0, 'turnRate': 80.0, 'turretTurnRate': 120.0, 'projectileSpeed': 28.0}
+Truth['turnRadius'] = Truth['tankSpeed'] / math.radians(Truth['turnRate'])
+
+
+def simulate(duration, tanks, latency, jitter, rng):
+    '''
+    (time, direction, frame) of everything our connection would see, in
+    arrival order
+    '''
+    encoder = CommandEncoder()
+    state = numpy.column_stack([rng.uniform(-40, 40, (tanks, 2)), rng.uniform(0, 360, (tanks, 2))])
+    controls = numpy.zeros((tanks, 3))
+    changes = numpy.zeros(tanks)
+    projectiles = []
+    reloaded = 0.0
+    frames = [(0.0, FrameTrace.Sent, encoder.encode(ServerMessageTypes.CREATETANK, {'Name': 'us'}))]
+    for step in range(int(duration / Step)):
+        now = step * Step
+        change = changes <= now
+        controls[change] = rng.integers(-1, 2, (change.sum(), 3))
+        controls[0] = 0  # we stand still and aim
+        changes[change] = now + rng.uniform(0.5, 2.0, change.sum())
+        # stay inside the arena by heading back towards the middle
+        away = numpy.hypot(state[:, 0], state[:, 1]) > 60
+        controls[away, 0] = numpy.where(numpy.cos(numpy.radians(state[away, 2])) * state[away, 0] -
+                                        numpy.sin(numpy.radians(state[away, 2])) * state[away, 1] > 0, -1, 1)
+        state[:, 2] = (state[:, 2] + controls[:, 1] * Truth['turnRate'] * Step) % 360.0
+        target = 1 + int(now / 3.0) % (tanks - 1)
+        aim = float(interceptTurning(state[0, 0], state[0, 1], state[target, 0], state[target, 1], state[target, 2],
+                                     controls[target, 0] * Truth['tankSpeed'], controls[target, 1] * Truth['turnRate'],
+                                     Truth['projectileSpeed'])[0])
+        slew = Truth['turretTurnRate'] * Step
+        controls[0, 2] = numpy.clip(angleDifference(aim, state[0, 3]) / slew, -1, 1) if math.isfinite(aim) else 0
+        state[:, 3] = (state[:, 3] + controls[:, 2] * slew) % 360.0
+        state[:, 0] += controls[:, 0] * Truth['tankSpeed'] * numpy.cos(numpy.radians(state[:, 2])) * Step
+        state[:, 1] -= controls[:, 0] * Truth['tankSpeed'] * numpy.sin(numpy.radians(state[:, 2])) * Step
+        flying = []
+        for projectile in projectiles:
+            projectile[:2] += projectile[2:4] * Step
+            if numpy.hypot(*(state[1:, :2] - projectile[:2]).T).min() < physics.hitRadius:
+                frames.append((now + latency, FrameTrace.Received,
+                               encoder.encode(ServerMessageTypes.SUCCESSFULLHIT)))
+            elif now < projectile[4]:
+                flying.append(projectile)
+        projectiles = flying
+        if math.isfinite(aim) and abs(angleDifference(aim, state[0, 3])) < 0.5 and now >= reloaded:
+            reloaded = now + 0.5
+            heading = math.radians(state[0, 3])
+            projectiles.append(numpy.array([state[0, 0], state[0, 1], Truth['projectileSpeed'] * math.cos(heading),
+                                            -Truth['projectileSpeed'] * math.sin(heading), now + 4.0]))
+            frames.append((now - latency, FrameTrace.Sent, encoder.encode(ServerMessageTypes.FIRE)))
+        if step % int(Update / Step) == 0:
+            for tankId, (x, y, heading, turret) in enumerate(state):
+                payload = {'Id': tankId, 'Name': 'us' if tankId == 0 else 'them{}'.format(tankId), 'Type': 'Tank',
+                           'X': x, 'Y': y, 'Heading': heading, 'TurretHeading': turret, 'Health': 5, 'Ammo': 10}
+                frames.append((now + latency + abs(rng.normal(0, jitter)), FrameTrace.Received,
+                               encoder.encode(ServerMessageTypes.OBJECTUPDATE, payload)))
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def degenerate(directory):
+    '''
+    Failures calibrating from traces with nothing to fit
+    '''
+    encoder = CommandEncoder()
+    traces = {
+        'empty': [],
+        'no tanks': [(0.0, FrameTrace.Sent, encoder.encode(ServerMessageTypes.CREATETANK, {'Name': 'us'})),
+                     (0.1, FrameTrace.Received, encoder.encode(ServerMessageTypes.OBJECTUPDATE, {
+                         'Id': 7, 'Type': 'HealthPickup', 'X': 1.0, 'Y': 2.0})),
+                     (0.2, FrameTrace.Sent, encoder.encode(ServerMessageTypes.FIRE)),
+                     (0.3, FrameTrace.Received, encoder.encode(ServerMessageTypes.SUCCESSFULLHIT))],
+    }
+    failures = []
+    for name, frames in traces.items():
+        path = os.path.join(directory, name.replace(' ', '-') + '.txt')
+        record(frames, path)
+        try:
+            fits = Calibrator().fit([Recording(path)])
+        except Exception as error:
+            failures.append('{} trace raised {!r}'.format(name, error))
+        else:
+            if fits:
+                failures.append('{} trace fitted {}'.format(name, sorted(fits)))
+    return failures
+
+
+def record(frames, path):
+    trace = FrameTrace(max(len(frames), 1))
+    for t, direction, frame in frames:
+        trace.record(direction, frame)
+        trace.times[(trace.count - 1) % trace.size] = t
+    trace.dumpToFile(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--duration', default=120.0, type=float, help='Seconds of play')
+    parser.add_argument('-t', '--tanks', default=5, type=int, help='Tanks including ours')
+    parser.add_argument('-l', '--latency', default=0.02, type=float, help='One way latency in seconds')
+    parser.add_argument('-j', '--jitter', default=0.005, type=float, help='Arrival jitter in seconds')
+    args = parser.parse_args()
+
+    frames = simulate(args.duration, args.tanks, args.latency, args.jitter, numpy.random.default_rng(1))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'trace.txt')
+        record(frames, path)
+        start = time.perf_counter()
+        recording = Recording(path)
+        fits = Calibrator().fit([recording])
+        elapsed = time.perf_counter() - start
+        failures = degenerate(directory)
+    print('{} frames, {} shots, {} hits, calibrated in {:.2f} s'.format(
+        len(frames), len(recording.fires), len(recording.hits), elapsed))
+    for name, truth in sorted(Truth.items()):
+        fit = fits.get(name)
+        print('{:<16} true {:8.3f}  fitted {:>8}  error {:>7}  from {:>4} samples'.format(
+            name, truth, '-' if fit is None else '{:.3f}'.format(fit.value),
+            '-' if fit is None else '{:+.2%}'.format(fit.value / truth - 1.0), 0 if fit is None else fit.samples))
+    for failure in failures:
+        print('FAIL', failure)
+    sys.exit(1 if failures else 0)
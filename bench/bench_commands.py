@@ -0,0 +1,169 @@
+#!/usr/bin/python
+'''
+Checks which commands CommandBuffer coalesces away and times a tick of
+commands sent one by one against sent through the buffer
+
+Each check queues a sequence of commands and compares what flush()
+actually sends with what should survive: later setpoints replace
+earlier ones, STOP* cancels what it stops, toggles and FIRE are never
+merged, and nothing that moves the turret is dropped once a FIRE was
+queued after it. CommandEncoder has to send a NaN, infinite or
+non-numeric Amount as json.dumps would, as it did before it had frame
+tables. The script exits non-zero if any check fails. The
+timing sends a typical tick (drive, turn, turret, fire) into a socket
+stand-in that counts the calls made against it; it costs nothing, so the
+times are the Python side alone, without the syscall each call makes.
+Creating a CommandEncoder is timed as well, since every bot does it
+before it can send CREATETANK.
+
+    python bench/bench_commands.py
+    python bench/bench_commands.py -n 50000
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes, ServerComms, CommandBuffer, CommandEncoder
+
+T = ServerMessageTypes
+
+
+class RecordingComms(object):
+    '''
+    Enough of ServerComms for CommandBuffer, keeping what was sent
+    '''
+    def __init__(self):
+        self.encoder = CommandEncoder()
+        self.sent = []
+
+    def sendFrames(self, frames):
+        self.sent.extend(frames)
+        return sum(len(frame) for frame in frames)
+
+
+class CountingSocket(object):
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, data):
+        self.calls += 1
+        return len(data)
+
+    def sendall(self, data):
+        self.calls += 1
+
+
+Checks = [
+    ('later turret setpoint replaces an earlier one',
+     [(T.TURNTURRETTOHEADING, 10), (T.TURNTURRETTOHEADING, 20)],
+     [(T.TURNTURRETTOHEADING, 20)]),
+    ('FIRE keeps the turret setpoint it was aimed with',
+     [(T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.TURNTURRETTOHEADING, 20)],
+     [(T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.TURNTURRETTOHEADING, 20)]),
+    ('setpoints after the last FIRE still coalesce',
+     [(T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.TURNTURRETTOHEADING, 20), (T.TURNTURRETTOHEADING, 30)],
+     [(T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.TURNTURRETTOHEADING, 30)]),
+    ('FIRE keeps turret toggles ahead of it from STOPTURRET',
+     [(T.TOGGLETURRETLEFT, None), (T.FIRE, None), (T.STOPTURRET, None)],
+     [(T.TOGGLETURRETLEFT, None), (T.FIRE, None), (T.STOPTURRET, None)]),
+    ('FIRE does not protect body setpoints',
+     [(T.TURNTOHEADING, 10), (T.FIRE, None), (T.TURNTOHEADING, 20)],
+     [(T.FIRE, None), (T.TURNTOHEADING, 20)]),
+    ('STOPALL cancels motion but not a turret setpoint a FIRE used',
+     [(T.MOVEFORWARDDISTANCE, 5), (T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.STOPALL, None)],
+     [(T.TURNTURRETTOHEADING, 10), (T.FIRE, None), (T.STOPALL, None)]),
+    ('STOPALL cancels everything without a FIRE',
+     [(T.MOVEFORWARDDISTANCE, 5), (T.TOGGLELEFT, None), (T.TURNTURRETTOHEADING, 10), (T.STOPALL, None)],
+     [(T.STOPALL, None)]),
+    ('toggles and FIRE are never merged',
+     [(T.TOGGLELEFT, None), (T.TOGGLELEFT, None), (T.FIRE, None), (T.FIRE, None)],
+     [(T.TOGGLELEFT, None), (T.TOGGLELEFT, None), (T.FIRE, None), (T.FIRE, None)]),
+]
+
+
+def check():
+    failures = []
+    for name, queued, expected in Checks:
+        comms = RecordingComms()
+        buffer = CommandBuffer(comms)
+        for messageType, amount in queued:
+            buffer.sendMessage(messageType, None if amount is None else {'Amount': amount})
+        buffer.flush()
+        wanted = [comms.encoder.encode(messageType, None if amount is None else {'Amount': amount})
+                  for messageType, amount in expected]
+        if comms.sent != wanted:
+            failures.append('{}: sent {}, expected {}'.format(name, comms.sent, wanted))
+    return failures
+
+
+def oddAmounts():
+    '''
+    Amounts the frame tables cannot hold, which must encode as json.dumps
+    '''
+    failures = []
+    encoder = CommandEncoder()
+    for messageType in CommandEncoder.HeadingCommands + CommandEncoder.DistanceCommands:
+        for amount in (float('nan'), float('inf'), float('-inf'), '90'):
+            payload = {'Amount': amount}
+            try:
+                frame = encoder.encode(messageType, payload)
+            except Exception as error:
+                failures.append('{} Amount {!r} raised {!r}'.format(T.strings[messageType], amount, error))
+                continue
+            data = json.dumps(payload).encode('utf-8')
+            if frame != bytes((messageType, len(data))) + data:
+                failures.append('{} Amount {!r} sent as {}'.format(T.strings[messageType], amount, frame))
+    return failures
+
+
+def tick(send, i):
+    send(T.MOVEFORWARDDISTANCE, {'Amount': 3})
+    send(T.TURNTOHEADING, {'Amount': i % 360})
+    send(T.TURNTURRETTOHEADING, {'Amount': (i * 7) % 360})
+    send(T.FIRE)
+
+
+def timing(ticks):
+    '''
+    (socket calls, us) per tick for sendMessage per command and for
+    CommandBuffer
+    '''
+    results = []
+    for buffered in (False, True):
+        comms = ServerComms.__new__(ServerComms)
+        comms.ServerSocket = CountingSocket()
+        comms.encoder = CommandEncoder()
+        comms.trace = None
+        buffer = CommandBuffer(comms)
+        send = buffer.sendMessage if buffered else comms.sendMessage
+        start = time.perf_counter()
+        for i in range(ticks):
+            tick(send, i)
+            buffer.flush()
+        results.extend([comms.ServerSocket.calls / ticks, (time.perf_counter() - start) / ticks * 1e6])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--ticks', default=20000, type=int, help='Ticks of commands to time')
+    args = parser.parse_args()
+
+    failures = check()
+    for failure in failures:
+        print('FAIL', failure)
+    print('{} of {} checks failed'.format(len(failures), len(Checks)))
+    odd = oddAmounts()
+    for failure in odd:
+        print('FAIL', failure)
+    failures += odd
+    start = time.perf_counter()
+    CommandEncoder()
+    print('CommandEncoder() in {:.3f} ms'.format((time.perf_counter() - start) * 1e3))
+    print('per command {:.1f} socket calls, {:.2f} us per tick; buffered {:.1f}, {:.2f} us'.format(
+        *timing(args.ticks)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,288 @@
+#!/usr/bin/python
+'''
+Replays a message stream through RandomBot's original if/elif Info.update
+and through the MessageDispatcher version, and reports the cost per message
+
+The stream is cut into batches as readMessages() would return them. The
+chain is called once per message of a batch, the dispatcher once per
+batch through dispatchAll(). Before timing, the script checks that both
+end in the same state, that a (OBJECTUPDATE, None) subscriber sees every
+object update, and that kinds nobody subscribed to are dropped without
+logging; it exits non-zero if any check fails.
+
+    python bench/bench_dispatch.py                  # synthetic match
+    python bench/bench_dispatch.py -t trace.txt     # a FrameTrace dump from a bot run with -d
+'''
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes, decodeMessage
+from tankbot.tracing import FrameTrace, readTrace
+from tankbot.dispatch import MessageDispatcher
+
+MyName = 'RandomBot'
+
+
+class ChainInfo(object):
+    '''
+    Info.update as RandomBot shipped it
+    '''
+    def __init__(self):
+        self.myTank = None
+        self.enemies = {}
+        self.healthPickups = {}
+        self.ammoPickups = {}
+        self.snitch = None
+        self.snitchPickedUp = None
+        self.destroyed = False
+        self.enteredGoal = False
+        self.didKill = False
+        self.snitchAppeared = False
+        self.timeLeft = None
+        self.hitDetected = False
+        self.didHit = False
+
+    def update(self, message):
+        if message['messageType'] == ServerMessageTypes.OBJECTUPDATE:
+            if message['Type'] == 'Tank':
+                if message['Name'] == MyName:
+                    self.myTank = message
+                else:
+                    self.enemies[message['Id']] = {'obj': message, 'time': 0}
+            elif message['Type'] == 'HealthPickup':
+                self.healthPickups[message['Id']] = {'obj': message, 'time': 0}
+            elif message['Type'] == 'AmmoPickup':
+                self.ammoPickups[message['Id']] = {'obj': message, 'time': 0}
+            elif message['Type'] == 'Snitch':
+                self.snitch = {'obj': message, 'time': 0}
+            else:
+                pass
+        elif message['messageType'] == ServerMessageTypes.SNITCHPICKUP:
+            self.snitchPickedUp = message['Id']
+            self.snitch = None
+        elif message['messageType'] == ServerMessageTypes.DESTROYED:
+            self.destroyed = True
+        elif message['messageType'] == ServerMessageTypes.ENTEREDGOAL:
+            self.enteredGoal = True
+        elif message['messageType'] == ServerMessageTypes.KILL:
+            self.didKill = True
+        elif message['messageType'] == ServerMessageTypes.SNITCHAPPEARED:
+            self.snitchAppeared = True
+        elif message['messageType'] == ServerMessageTypes.GAMETIMEUPDATE:
+            self.timeLeft = message['Time']
+        elif message['messageType'] == ServerMessageTypes.HITDETECTED:
+            self.hitDetected = True
+        elif message['messageType'] == ServerMessageTypes.SUCCESSFULLHIT:
+            self.didHit = True
+
+
+class DispatchInfo(ChainInfo):
+    '''
+    The same state kept through a MessageDispatcher, as RandomBot does now
+    '''
+    def __init__(self, tanksOnly=False):
+        ChainInfo.__init__(self)
+        self.dispatcher = MessageDispatcher()
+        subscribe = self.dispatcher.subscribe
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Tank', self.onTank)
+        self.update = self.dispatcher.dispatch
+        self.updateAll = self.dispatcher.dispatchAll
+        if tanksOnly:
+            return
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'HealthPickup', self.onHealthPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'AmmoPickup', self.onAmmoPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Snitch', self.onSnitch)
+        subscribe(ServerMessageTypes.SNITCHPICKUP, handler=self.onSnitchPickup)
+        subscribe(ServerMessageTypes.DESTROYED, handler=self.onDestroyed)
+        subscribe(ServerMessageTypes.ENTEREDGOAL, handler=self.onEnteredGoal)
+        subscribe(ServerMessageTypes.KILL, handler=self.onKill)
+        subscribe(ServerMessageTypes.SNITCHAPPEARED, handler=self.onSnitchAppeared)
+        subscribe(ServerMessageTypes.GAMETIMEUPDATE, handler=self.onGameTimeUpdate)
+        subscribe(ServerMessageTypes.HITDETECTED, handler=self.onHitDetected)
+        subscribe(ServerMessageTypes.SUCCESSFULLHIT, handler=self.onSuccessfulHit)
+
+    def onTank(self, message):
+        if message['Name'] == MyName:
+            self.myTank = message
+        else:
+            self.enemies[message['Id']] = {'obj': message, 'time': 0}
+
+    def onHealthPickup(self, message):
+        self.healthPickups[message['Id']] = {'obj': message, 'time': 0}
+
+    def onAmmoPickup(self, message):
+        self.ammoPickups[message['Id']] = {'obj': message, 'time': 0}
+
+    def onSnitch(self, message):
+        self.snitch = {'obj': message, 'time': 0}
+
+    def onSnitchPickup(self, message):
+        self.snitchPickedUp = message['Id']
+        self.snitch = None
+
+    def onDestroyed(self, message):
+        self.destroyed = True
+
+    def onEnteredGoal(self, message):
+        self.enteredGoal = True
+
+    def onKill(self, message):
+        self.didKill = True
+
+    def onSnitchAppeared(self, message):
+        self.snitchAppeared = True
+
+    def onGameTimeUpdate(self, message):
+        self.timeLeft = message['Time']
+
+    def onHitDetected(self, message):
+        self.hitDetected = True
+
+    def onSuccessfulHit(self, message):
+        self.didHit = True
+
+
+def syntheticStream(count):
+    '''
+    A message mix resembling a busy arena: mostly tank updates, some pickups
+    and a sprinkling of events
+    '''
+    messages = []
+    for _ in range(count):
+        roll = random.random()
+        if roll < 0.7:
+            tankId = random.randint(1, 8)
+            messages.append({'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Tank', 'Id': tankId,
+                             'Name': MyName if tankId == 1 else 'Enemy{}'.format(tankId),
+                             'X': random.uniform(-70, 70), 'Y': random.uniform(-100, 100),
+                             'Heading': random.uniform(0, 360), 'TurretHeading': random.uniform(0, 360),
+                             'Health': 5, 'Ammo': 10})
+        elif roll < 0.8:
+            messages.append({'messageType': ServerMessageTypes.OBJECTUPDATE,
+                             'Type': random.choice(['HealthPickup', 'AmmoPickup']),
+                             'Id': random.randint(100, 110), 'X': 0.0, 'Y': 0.0})
+        elif roll < 0.82:
+            messages.append({'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Snitch',
+                             'Id': 200, 'X': 0.0, 'Y': 0.0})
+        elif roll < 0.95:
+            messages.append({'messageType': ServerMessageTypes.GAMETIMEUPDATE, 'Time': random.randint(0, 300)})
+        else:
+            messages.append({'messageType': random.choice([
+                ServerMessageTypes.HITDETECTED, ServerMessageTypes.SUCCESSFULLHIT,
+                ServerMessageTypes.KILL, ServerMessageTypes.SNITCHAPPEARED])})
+    return messages
+
+
+def recordedStream(path):
+    return [decodeMessage(messageType, payload)
+            for _, direction, messageType, payload in readTrace(path)
+            if direction == FrameTrace.Received]
+
+
+def chainAll(info):
+    update = info.update
+
+    def updateAll(messages):
+        for message in messages:
+            update(message)
+    return updateAll
+
+
+def batches(messages, size):
+    return [messages[start:start + size] for start in range(0, len(messages), size)]
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def check(messages):
+    failures = []
+    chain = ChainInfo()
+    dispatched = DispatchInfo()
+    chainAll(chain)(messages)
+    dispatched.updateAll(messages)
+    state = dict(vars(dispatched))
+    del state['dispatcher'], state['update'], state['updateAll']
+    if state != vars(chain):
+        failures.append('dispatcher and chain disagree on {}'.format(
+            sorted(name for name in state if state[name] != vars(chain)[name])))
+
+    objects = [message for message in messages if message['messageType'] == ServerMessageTypes.OBJECTUPDATE]
+    seen = []
+    wildcard = MessageDispatcher()
+    wildcard.subscribe(ServerMessageTypes.OBJECTUPDATE, handler=seen.append)
+    wildcard.subscribe(ServerMessageTypes.OBJECTUPDATE, 'Tank', lambda message: None)
+    wildcard.dispatchAll(messages + [{'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Crate'}])
+    if seen[:-1] != objects or seen[-1:] != [{'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Crate'}]:
+        failures.append('(OBJECTUPDATE, None) saw {} of {} object updates'.format(len(seen), len(objects) + 1))
+
+    counter = CountingHandler()
+    root = logging.getLogger()
+    root.addHandler(counter)
+    level = root.level
+    root.setLevel(logging.INFO)
+    try:
+        DispatchInfo(tanksOnly=True).updateAll(messages)
+        MessageDispatcher().dispatch({'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Crate'})
+        quiet = counter.count
+        root.setLevel(logging.DEBUG)
+        MessageDispatcher().dispatch({'messageType': ServerMessageTypes.OBJECTUPDATE, 'Type': 'Crate'})
+        logged = counter.count - quiet
+    finally:
+        root.setLevel(level)
+        root.removeHandler(counter)
+    if quiet:
+        failures.append('{} records logged at INFO for unsubscribed or unknown kinds'.format(quiet))
+    if logged != 1:
+        failures.append('an unknown Type logged {} records at DEBUG, expected 1'.format(logged))
+    return failures
+
+
+def replay(updateAll, messages, rounds, size):
+    '''
+    Best of rounds replays in batches of size, in ns per message
+    '''
+    stream = batches(messages, size)
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for batch in stream:
+            updateAll(batch)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(messages) * 1e9
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--trace', help='FrameTrace dump to replay instead of a synthetic stream')
+    parser.add_argument('-n', '--count', default=20000, type=int, help='Synthetic messages to generate')
+    parser.add_argument('-r', '--rounds', default=20, type=int, help='Times to replay the stream')
+    parser.add_argument('-b', '--batch', default=8, type=int, help='Messages per readMessages() batch')
+    args = parser.parse_args()
+
+    random.seed(1)
+    messages = recordedStream(args.trace) if args.trace else syntheticStream(args.count)
+    failures = check(messages)
+    for failure in failures:
+        print('FAIL', failure)
+    print('{} messages x {} rounds in batches of {}'.format(len(messages), args.rounds, args.batch))
+    print('if/elif chain      {:>7.1f} ns/msg'.format(
+        replay(chainAll(ChainInfo()), messages, args.rounds, args.batch)))
+    print('dispatch table     {:>7.1f} ns/msg'.format(
+        replay(DispatchInfo().updateAll, messages, args.rounds, args.batch)))
+    print('tanks only         {:>7.1f} ns/msg'.format(
+        replay(DispatchInfo(tanksOnly=True).updateAll, messages, args.rounds, args.batch)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+'''
+Microbenchmark for ServerComms frame decoding
+
+Replays a synthetic OBJECTUPDATE stream through the original per-message
+readMessage and through the buffered recv_into reader, and reports syscalls,
+time and tracemalloc'd memory per message for both.
+
+Allocations are counted as the sys.getallocatedblocks() delta over a
+whole replay that keeps every decoded message alive, per message: the
+blocks each path leaves allocated for the caller, buffers and queues
+included. Blocks allocated and freed again inside readMessage cancel
+out of that count; the transient bytes column is where they show.
+
+    python bench/bench_frames.py -n 20000
+'''
+
+import os
+import sys
+import json
+import collections
+import gc
+import time
+import random
+import struct
+import logging
+import binascii
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes, ServerComms
+
+
+class StreamSocket(object):
+    '''
+    Socket stand-in that serves a fixed byte stream in segments of up to
+    segmentSize bytes, counting the calls made against it
+    '''
+    def __init__(self, data, segmentSize=1460):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.segmentSize = segmentSize
+        self.calls = 0
+
+    def recv(self, size):
+        self.calls += 1
+        size = min(size, self.segmentSize)
+        chunk = bytes(self.data[self.offset:self.offset + size])
+        self.offset += len(chunk)
+        return chunk
+
+    def recv_into(self, buffer):
+        self.calls += 1
+        size = min(len(buffer), self.segmentSize, len(self.data) - self.offset)
+        buffer[:size] = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+
+class LegacyComms(object):
+    '''
+    The readMessage every bot script shipped with before tankbot.comms
+    '''
+    MessageTypes = ServerMessageTypes()
+
+    def __init__(self, sock):
+        self.ServerSocket = sock
+
+    def readMessage(self):
+        messageTypeRaw = self.ServerSocket.recv(1)
+        messageLenRaw = self.ServerSocket.recv(1)
+        messageType = struct.unpack('>B', messageTypeRaw)[0]
+        messageLen = struct.unpack('>B', messageLenRaw)[0]
+
+        if messageLen == 0:
+            messageData = bytearray()
+            messagePayload = {'messageType': messageType}
+        else:
+            messageData = self.ServerSocket.recv(messageLen)
+            logging.debug("*** {}".format(messageData))
+            messagePayload = json.loads(messageData.decode('utf-8'))
+            messagePayload['messageType'] = messageType
+
+        logging.debug('Turned message {} into type {} payload {}'.format(
+            binascii.hexlify(messageData),
+            self.MessageTypes.toString(messageType),
+            messagePayload))
+        return messagePayload
+
+
+def bufferedComms(sock):
+    comms = ServerComms.__new__(ServerComms)
+    comms.ServerSocket = sock
+    comms.initReadBuffer()
+    comms.pending = collections.deque()
+    return comms
+
+
+def makeStream(count):
+    frames = bytearray()
+    for i in range(count):
+        payload = json.dumps({
+            'Id': random.randint(1, 12), 'Name': 'Bot{}'.format(i % 12), 'Type': 'Tank',
+            'X': random.uniform(-70, 70), 'Y': random.uniform(-100, 100),
+            'Heading': random.uniform(0, 360), 'TurretHeading': random.uniform(0, 360),
+            'Health': 5, 'Ammo': 10}).encode('utf-8')
+        frames.append(ServerMessageTypes.OBJECTUPDATE)
+        frames.append(len(payload))
+        frames.extend(payload)
+    return bytes(frames)
+
+
+def run(label, comms, sock, count):
+    tracemalloc.start()
+    transient = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        comms.readMessage()
+        transient += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    print('{:<10} {:>8.2f} syscalls/msg {:>8.2f} us/msg {:>10.1f} transient bytes/msg'.format(
+        label, sock.calls / count, elapsed / count * 1e6, transient / count))
+
+
+def blocks(comms, count):
+    '''
+    Allocated blocks per message, holding on to every message decoded
+    '''
+    messages = [None] * count
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        for i in range(count):
+            messages[i] = comms.readMessage()
+        allocated = sys.getallocatedblocks() - before
+    finally:
+        gc.enable()
+    return allocated / count
+
+
+def timeOnly(comms, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        comms.readMessage()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', default=20000, type=int, help='Messages to decode')
+    args = parser.parse_args()
+
+    random.seed(1)
+    stream = makeStream(args.count)
+
+    sock = StreamSocket(stream)
+    run('legacy', LegacyComms(sock), sock, args.count)
+    sock = StreamSocket(stream)
+    run('buffered', bufferedComms(sock), sock, args.count)
+
+    print('allocated blocks: legacy {:.2f}/msg, buffered {:.2f}/msg'.format(
+        blocks(LegacyComms(StreamSocket(stream)), args.count),
+        blocks(bufferedComms(StreamSocket(stream)), args.count)))
+    # tracemalloc slows every allocation down, so time again without it
+    print('untraced: legacy {:.2f} us/msg, buffered {:.2f} us/msg'.format(
+        timeOnly(LegacyComms(StreamSocket(stream)), args.count),
+        timeOnly(bufferedComms(StreamSocket(stream)), args.count)))
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+'''
+Checks tankbot.geometry against the helpers the bot scripts used to carry
+and times its scalar and array forms per enemy
+
+The legacy getHeading, GetHeading and calculateDistance are kept below
+verbatim. On random points, points on the axes, coincident points and
+points a hair apart, the scalar and array forms have to agree with each
+other (to rounding; NumPy's vectorised atan2 is not bit for bit libm's)
+and with them (modulo 360, since the legacy ones can return 360 itself),
+stay in their documented ranges, and round-trip: the point
+distance(p, q) along heading(p, q) from p is q, and b turned by
+angleDifference(a, b) is a. The script exits non-zero on any failure.
+
+    python bench/bench_geometry.py
+    python bench/bench_geometry.py -n 100000 -r 20
+'''
+
+import os
+import sys
+import math
+import timeit
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.geometry import heading, headings, distance, distances, angleDifference, angleDifferences, \
+    normalizeHeading, normalizeHeadings, velocity, velocities
+
+
+def getHeading(x1, y1, x2, y2):
+    heading = math.atan2(y2 - y1, x2 - x1)
+    heading = math.degrees(heading)
+    heading = math.fmod(heading - 360, 360)
+    return abs(heading)
+
+
+def GetHeading(x1, y1, x2, y2):
+    heading = (float)(math.atan2(y2 - y1, x2 - x1))
+    heading = (float)(heading * (180.0 / math.pi))
+    heading = math.fmod(360 - heading, 360)
+    return abs(heading)
+
+
+def calculateDistance(x1, y1, x2, y2):
+    headingX = x2 - x1
+    headingY = y2 - y1
+    return math.sqrt((headingX * headingX) + (headingY * headingY))
+
+
+def points(count, rng):
+    '''
+    (x1, y1, x2, y2) arrays: random pairs plus the awkward cases
+    '''
+    x1, y1, x2, y2 = rng.uniform(-100, 100, (4, count))
+    axes = numpy.array([(0, 0, 1, 0), (0, 0, 0, 1), (0, 0, -1, 0), (0, 0, 0, -1), (0, 0, 0, 0),
+                        (5, 5, 5, 5), (0, 0, 1, -1e-15), (0, 0, 1, 1e-15), (0, 0, -1, -1e-15), (0, 0, -1, 1e-15)],
+                       dtype=float).T
+    return [numpy.concatenate([column, extra]) for column, extra in zip((x1, y1, x2, y2), axes)]
+
+
+def same(a, b, tolerance=1e-9):
+    '''
+    Whether headings a and b agree modulo 360
+    '''
+    return abs(angleDifference(a, b)) <= tolerance
+
+
+def check(count, rng):
+    failures = []
+
+    def expect(condition, message, *values):
+        if not condition:
+            failures.append(message.format(*values))
+
+    x1, y1, x2, y2 = points(count, rng)
+    batch = headings(x1, y1, x2, y2)
+    batchDistance = distances(x1, y1, x2, y2)
+    batchVx, batchVy = velocities(batch, batchDistance)
+    for i, (a, b, c, d) in enumerate(zip(x1.tolist(), y1.tolist(), x2.tolist(), y2.tolist())):
+        h = heading(a, b, c, d)
+        expect(0.0 <= h < 360.0, 'heading{} = {} out of [0, 360)', (a, b, c, d), h)
+        expect(same(h, getHeading(a, b, c, d)), 'heading{} = {}, getHeading {}', (a, b, c, d), h, getHeading(a, b, c, d))
+        expect(same(h, GetHeading(a, b, c, d)), 'heading{} = {}, GetHeading {}', (a, b, c, d), h, GetHeading(a, b, c, d))
+        expect(same(h, batch[i]), 'heading{} = {}, headings {}', (a, b, c, d), h, batch[i])
+        r = distance(a, b, c, d)
+        expect(abs(r - calculateDistance(a, b, c, d)) <= 1e-9 * max(r, 1.0), 'distance{} = {}, calculateDistance {}',
+               (a, b, c, d), r, calculateDistance(a, b, c, d))
+        expect(abs(r - batchDistance[i]) <= 1e-12 * max(r, 1.0), 'distance{} = {}, distances {}',
+               (a, b, c, d), r, batchDistance[i])
+        dx, dy = velocity(h, r)
+        expect(abs(a + dx - c) <= 1e-9 * max(r, 1.0) and abs(b + dy - d) <= 1e-9 * max(r, 1.0),
+               'velocity(heading, distance) from {} misses {}', (a, b), (c, d))
+        expect(abs(dx - batchVx[i]) <= 1e-9 * max(r, 1.0) and abs(dy - batchVy[i]) <= 1e-9 * max(r, 1.0),
+               'velocity({}, {}) = {}, velocities {}', h, r, (dx, dy), (batchVx[i], batchVy[i]))
+
+    a, b = rng.uniform(-720, 720, (2, count))
+    a = numpy.concatenate([a, [0.0, 180.0, -180.0, 360.0, -1e-15, 1e-15, 359.99999999999994]])
+    b = numpy.concatenate([b, [180.0, 0.0, 0.0, 0.0, 0.0, 360.0, 0.0]])
+    batch = angleDifferences(a, b)
+    batchNormal = normalizeHeadings(a)
+    expect(((batch >= -180.0) & (batch < 180.0)).all(), 'angleDifferences out of [-180, 180)')
+    expect(((batchNormal >= 0.0) & (batchNormal < 360.0)).all(), 'normalizeHeadings out of [0, 360)')
+    for i, (p, q) in enumerate(zip(a.tolist(), b.tolist())):
+        turn = angleDifference(p, q)
+        expect(-180.0 <= turn < 180.0, 'angleDifference({}, {}) = {} out of [-180, 180)', p, q, turn)
+        expect(abs(turn - batch[i]) <= 1e-9, 'angleDifference({}, {}) = {}, angleDifferences {}', p, q, turn, batch[i])
+        expect(same(q + turn, p), 'turning {} by {} does not reach {}', q, turn, p)
+        normal = normalizeHeading(p)
+        expect(0.0 <= normal < 360.0 and same(normal, p), 'normalizeHeading({}) = {}', p, normal)
+        expect(same(normal, batchNormal[i]), 'normalizeHeading({}) = {}, normalizeHeadings {}', p, normal, batchNormal[i])
+    return failures
+
+
+def cost(enemies, repeats, rng):
+    '''
+    Microseconds per enemy for bearing and range to every enemy
+    '''
+    me = rng.uniform(-100, 100, 2)
+    xs, ys = rng.uniform(-100, 100, (2, enemies))
+    meX, meY = float(me[0]), float(me[1])
+    xList, yList = xs.tolist(), ys.tolist()
+
+    def legacy():
+        return [(getHeading(meX, meY, x, y), calculateDistance(meX, meY, x, y)) for x, y in zip(xList, yList)]
+
+    def scalar():
+        return [(heading(meX, meY, x, y), distance(meX, meY, x, y)) for x, y in zip(xList, yList)]
+
+    def batched():
+        return headings(meX, meY, xs, ys), distances(meX, meY, xs, ys)
+
+    number = max(1, 20000 // enemies)
+    return [min(timeit.repeat(run, number=number, repeat=repeats)) / number / enemies * 1e6
+            for run in (legacy, scalar, batched)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', default=20000, type=int, help='Random cases to check')
+    parser.add_argument('-r', '--repeats', default=5, type=int, help='Timing repeats, best one counts')
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    failures = check(args.count, rng)
+    for failure in failures[:20]:
+        print('FAIL', failure)
+    print('{} failures in {} cases'.format(len(failures), args.count))
+    print('enemies   us per enemy: legacy  scalar  batched')
+    for enemies in (1, 4, 16, 64):
+        print('{:>7}   {:>20.3f} {:>7.3f} {:>8.3f}'.format(enemies, *cost(enemies, args.repeats, rng)))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+'''
+Checks HitEstimator's probabilities against shots flown along the true
+path of targets driving random arcs, and times a tick's worth of enemies
+
+Each trial tracks one target for a while through an EnemyTable, then
+asks for the hit probability of shots at and around its firing solution
+and flies those shots against where the target really goes. Predicted
+and observed hit rates are reported per probability band; a calibrated
+estimator has them agree, and the table is what a fire threshold should
+be picked from.
+
+    python bench/bench_hitprobability.py
+    python bench/bench_hitprobability.py -t 500 -e 8 -s 2000
+'''
+
+import os
+import sys
+import time
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.enemytable import EnemyTable
+from tankbot.intercept import interceptTurning
+from tankbot.hitprobability import HitEstimator
+from bench_turret import Step, Update, targetPath, hits
+
+Offsets = numpy.linspace(-6.0, 6.0, 9)
+Bands = [0.0, 0.1, 0.2, 0.4, 0.6, 0.8, 1.0]
+
+
+def observe(enemies, path, row, until):
+    for i in range(int(until / Update) + 1):
+        x, y, h = path[int(round(i * Update / Step))]
+        enemies.update({'Id': row, 'X': x, 'Y': y, 'Heading': h, 'TurretHeading': h, 'Health': 5, 'Ammo': 10},
+                       i * Update)
+        enemies.step()
+
+
+def calibration(estimator, trials, rng):
+    predicted, observed = [], []
+    for trial in range(trials):
+        path = targetPath(8.0, rng)
+        now = rng.uniform(1.0, 4.0)
+        enemies = EnemyTable()
+        observe(enemies, path, 0, now)
+        x, y, v, h, w, _ = enemies.tracker.estimate([0], now)
+        lead, flight = interceptTurning(0.0, 0.0, x, y, h, v, w)
+        cloud = estimator.cloud(enemies.tracker, 0.0, 0.0, [0], now, flight)
+        candidates = lead[:, None] + Offsets
+        predicted.extend(estimator.probability(cloud, candidates)[0])
+        observed.extend(hits(path, now, heading) for heading in candidates[0])
+    predicted, observed = numpy.array(predicted), numpy.array(observed)
+    for lo, hi in zip(Bands[:-1], Bands[1:]):
+        band = (predicted >= lo) & ((predicted < hi) | (hi == Bands[-1]))
+        if band.any():
+            print('predicted {:.1f}-{:.1f}: {:>5} shots, mean predicted {:6.1%}, hit {:6.1%}'.format(
+                lo, hi, int(band.sum()), predicted[band].mean(), observed[band].mean()))
+
+
+def cost(estimator, enemies, ticks, rng):
+    table = EnemyTable()
+    for row in range(enemies):
+        observe(table, targetPath(3.0, rng), row, 2.0)
+    rows = table.rows()
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(ticks):
+            cloud = estimator.cloud(table.tracker, 0.0, 0.0, rows, 2.0, 1.0)
+            estimator.probability(cloud, numpy.zeros((len(rows), len(Offsets))))
+        elapsed = (time.perf_counter() - start) / ticks
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e3
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--trials', default=300, type=int, help='Tracked targets to shoot at')
+    parser.add_argument('-e', '--enemies', default=4, type=int, help='Enemies per timed tick')
+    parser.add_argument('-s', '--samples', default=1000, type=int, help='Samples per enemy')
+    parser.add_argument('-n', '--ticks', default=100, type=int, help='Ticks to time')
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    estimator = HitEstimator(args.samples, seed=1)
+    calibration(estimator, args.trials, rng)
+    print('{} enemies x {} samples x {} headings: {:.2f} ms/tick'.format(
+        args.enemies, args.samples, len(Offsets), cost(estimator, args.enemies, args.ticks, rng)))
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+'''
+Checks interceptStraight and interceptTurning against a brute-force search
+for the hit time and reports the cost of solving a whole tick's worth of
+enemies
+
+    python bench/bench_intercept.py
+    python bench/bench_intercept.py -e 8 -n 5000
+'''
+
+import os
+import sys
+import math
+import time
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot import physics
+from tankbot.geometry import headings, velocities, angleDifferences
+from tankbot.intercept import interceptStraight, interceptTurning
+
+
+def straightPath(x, y, heading, speed, turnRate):
+    vx, vy = velocities(heading, speed)
+    return lambda t: (x + vx * t, y + vy * t)
+
+
+def turningPath(x, y, heading, speed, turnRate):
+    if abs(turnRate) < 1e-6:
+        return straightPath(x, y, heading, speed, turnRate)
+    h0 = math.radians(heading)
+    w = math.radians(turnRate)
+    return lambda t: (x + speed / w * (math.sin(h0 + w * t) - math.sin(h0)),
+                      y + speed / w * (math.cos(h0 + w * t) - math.cos(h0)))
+
+
+def bruteForce(shooterX, shooterY, path, horizon=10.0, step=1e-3):
+    '''
+    Scalar reference: walk t forward until the projectile has covered the
+    distance to the target at path(t), then bisect the crossing
+    '''
+    def gap(t):
+        x, y = path(t)
+        return math.hypot(x - shooterX, y - shooterY) - physics.projectileSpeed * t
+
+    t = 0.0
+    while t < horizon:
+        if gap(t + step) <= 0:
+            lo, hi = t, t + step
+            if gap(lo) <= 0:
+                hi = lo
+            for _ in range(60):
+                mid = (lo + hi) / 2.0
+                if gap(mid) > 0:
+                    lo = mid
+                else:
+                    hi = mid
+            return headings(shooterX, shooterY, *path(hi)), hi
+        t += step
+    return math.nan, math.nan
+
+
+def scenario(count, rng, fast=0.05):
+    '''
+    Random shooter/target pairs inside the arena, targets at up to tankSpeed
+    and turning up to full lock, plus a fraction faster than the projectile
+    to exercise the no-solution case
+    '''
+    shooterX = rng.uniform(-70, 70, count)
+    shooterY = rng.uniform(-100, 100, count)
+    targetX = rng.uniform(-70, 70, count)
+    targetY = rng.uniform(-100, 100, count)
+    heading = rng.uniform(0, 360, count)
+    speed = rng.uniform(-physics.tankSpeed, physics.tankSpeed, count)
+    fast = rng.random(count) < fast
+    speed[fast] = physics.projectileSpeed * rng.uniform(1.01, 2.0, fast.sum())
+    turnRate = rng.uniform(-physics.turnRate, physics.turnRate, count)
+    return shooterX, shooterY, targetX, targetY, heading, speed, turnRate
+
+
+def solveStraight(shooterX, shooterY, targetX, targetY, heading, speed, turnRate):
+    return interceptStraight(shooterX, shooterY, targetX, targetY, *velocities(heading, speed))
+
+
+def solveTurning(shooterX, shooterY, targetX, targetY, heading, speed, turnRate):
+    return interceptTurning(shooterX, shooterY, targetX, targetY, heading, speed, turnRate)
+
+
+# interceptTurning gives up on targets faster than the projectile, though
+# one going round in circles can still be caught eventually, so it is only
+# checked on tank-like speeds
+Solvers = [('straight', solveStraight, straightPath, 0.05), ('turning', solveTurning, turningPath, 0.0)]
+
+
+def accuracy(name, solve, path, fast, count, rng):
+    arrays = scenario(count, rng, fast)
+    heading, t = solve(*arrays)
+    reference = numpy.array([bruteForce(sx, sy, path(*target)) for sx, sy, *target in zip(*arrays)])
+    agree = numpy.isnan(t) == numpy.isnan(reference[:, 1])
+    solved = ~numpy.isnan(t) & ~numpy.isnan(reference[:, 1])
+    headingError = numpy.abs(angleDifferences(heading[solved], reference[solved, 0]))
+    timeError = numpy.abs(t[solved] - reference[solved, 1])
+    print('{:<9} {} cases, {} without a solution, {} disagree on solvability, '
+          'max heading error {:.2e} deg, max time error {:.2e} s'.format(
+              name, count, int(numpy.isnan(t).sum()), int((~agree).sum()), headingError.max(), timeError.max()))
+
+
+def cost(solve, path, enemies, ticks, rng):
+    '''
+    Best of five runs, in microseconds per tick of `enemies` targets, for
+    the vectorized solver and the brute-force reference
+    '''
+    arrays = [scenario(enemies, rng) for _ in range(ticks)]
+    results = []
+    for run, runs in [(lambda values: solve(*values), ticks),
+                      (lambda values: [bruteForce(sx, sy, path(*target)) for sx, sy, *target in zip(*values)],
+                       max(ticks // 100, 1))]:
+        best = None
+        for _ in range(5):
+            start = time.perf_counter()
+            for values in arrays[:runs]:
+                run(values)
+            elapsed = (time.perf_counter() - start) / runs
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(best * 1e6)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--cases', default=2000, type=int, help='Random cases for the accuracy check')
+    parser.add_argument('-e', '--enemies', default=4, type=int, help='Enemies solved per tick')
+    parser.add_argument('-n', '--ticks', default=2000, type=int, help='Ticks to time')
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    for name, solve, path, fast in Solvers:
+        accuracy(name, solve, path, fast, args.cases, rng)
+    for name, solve, path, fast in Solvers:
+        vectorized, reference = cost(solve, path, args.enemies, args.ticks, rng)
+        print('{:<9} vectorized {:>8.1f} us/tick, brute force {:>9.1f} us/tick ({} enemies, {:.1f} us/target)'.format(
+            name, vectorized, reference, args.enemies, vectorized / args.enemies))
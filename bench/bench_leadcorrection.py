@@ -0,0 +1,120 @@
+#!/usr/bin/python
+'''
+Shows LeadCorrector recovering hits when the firing model is wrong
+
+The shooter aims with the projectile speed from tankbot.physics while
+its shots really fly at a different speed, like after a server change
+the constants have not caught up with. Engagements against targets on
+random arcs run back to back; every hit is reported to the corrector
+when the shot lands, as SUCCESSFULLHIT would be. Hit rates per block of
+engagements are printed with and without the corrector, followed by
+the biases and scales it learned. The target paths and the corrector's
+own draws are seeded, so a run repeats exactly.
+
+    python bench/bench_leadcorrection.py
+    python bench/bench_leadcorrection.py -v 30 -e 60 -s 1
+'''
+
+import os
+import sys
+import math
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot import physics
+from tankbot.comms import ServerMessageTypes
+from tankbot.entities import Tank
+from tankbot.enemytable import EnemyTable
+from tankbot.firingtable import FiringTable
+from tankbot.firecontrol import FireControl
+from tankbot.leadcorrection import LeadCorrector
+from tankbot.motion import MotionClassifier
+from tankbot.deadreckoning import SelfPredictor
+from bench_turret import Step, Tick, Update, targetPath
+
+
+def impact(path, fired, heading, speed, horizon=3.0):
+    '''
+    When a projectile fired from the origin at time fired along heading
+    hits the target, or None if it misses
+    '''
+    start = int(round(fired / Step))
+    t = numpy.arange(0, min(int(horizon / Step), len(path) - start)) * Step
+    x = speed * math.cos(math.radians(heading)) * t
+    y = -speed * math.sin(math.radians(heading)) * t
+    target = path[start:start + len(t)]
+    inside = numpy.flatnonzero(numpy.hypot(target[:, 0] - x, target[:, 1] - y) < physics.hitRadius)
+    return fired + t[inside[0]] if len(inside) else None
+
+
+def engagement(fireControl, path, duration, speed):
+    '''
+    (shots, hits) over one engagement of duration seconds
+    '''
+    enemies = EnemyTable()
+    predictor = SelfPredictor()
+    predictor.correct(Tank({'Id': 0, 'Name': 'shooter', 'X': 0.0, 'Y': 0.0, 'Heading': 0.0,
+                            'TurretHeading': 0.0, 'Health': 5, 'Ammo': 10}, 0.0), 0.0)
+    corrector = fireControl.leadCorrector
+    if corrector is not None:
+        corrector.pending.clear()
+    landings = []
+    shots = hits = 0
+    nextUpdate = 0.0
+    for tick in range(int(duration / Tick)):
+        now = tick * Tick
+        while nextUpdate <= now:
+            x, y, h = path[int(round(nextUpdate / Step))]
+            enemies.update({'Id': 1, 'X': x, 'Y': y, 'Heading': h, 'TurretHeading': h, 'Health': 5, 'Ammo': 10},
+                           nextUpdate)
+            nextUpdate += Update
+        enemies.step()
+        for landed in [landed for landed in landings if landed <= now]:
+            landings.remove(landed)
+            if corrector is not None:
+                corrector.hit(landed)
+        predictor.advance(now)
+        tank = Tank({'Id': 0, 'Name': 'shooter', 'X': 0.0, 'Y': 0.0, 'Heading': 0.0,
+                     'TurretHeading': predictor.TurretHeading, 'Health': 5, 'Ammo': 10}, now)
+        shot = fireControl.aim(enemies, tank, now, predictor.turretTarget)
+        commands = []
+        if shot is not None and shot.turn:
+            commands.append((ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': shot.heading}))
+        if shot is not None and shot.fire:
+            shots += 1
+            landed = impact(path, now, predictor.TurretHeading, speed)
+            if landed is not None:
+                hits += 1
+                landings.append(landed)
+        predictor.onCommands(commands, now)
+    return shots, hits
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-v', '--speed', default=physics.projectileSpeed * 0.85, type=float,
+                        help='Real projectile speed; the model keeps physics.projectileSpeed')
+    parser.add_argument('-e', '--engagements', default=40, type=int, help='Engagements in a row')
+    parser.add_argument('-d', '--duration', default=15.0, type=float, help='Seconds per engagement')
+    parser.add_argument('-b', '--blocks', default=4, type=int, help='Blocks to report hit rates over')
+    parser.add_argument('-s', '--seed', default=0, type=int, help="Seed for the corrector's draws")
+    args = parser.parse_args()
+
+    table = FiringTable.load()
+    paths = [targetPath(args.duration + 3.0, numpy.random.default_rng(seed)) for seed in range(args.engagements)]
+    print('model projectile speed {}, real {:.1f}'.format(physics.projectileSpeed, args.speed))
+    for name, corrector in [('uncorrected', None), ('corrected', LeadCorrector(seed=args.seed))]:
+        fireControl = FireControl(table, tickTime=Tick, leadCorrector=corrector)
+        results = numpy.array([engagement(fireControl, path, args.duration, args.speed) for path in paths])
+        blocks = numpy.array_split(results, args.blocks)
+        print('{:<12} hits per shot by block: {}'.format(
+            name, '  '.join('{:6.1%}'.format(block[:, 1].sum() / max(block[:, 0].sum(), 1)) for block in blocks)))
+    scales, biases = corrector.best()
+    shots = corrector.resolved
+    for band, limit in enumerate(list(corrector.bands) + [math.inf]):
+        for motion, label in enumerate(MotionClassifier.Names):
+            if shots[band, motion]:
+                print('  up to {:>5} units, {:<8} {:>4.0f} shots  scale {:5.2f}  bias {:+5.1f} deg'.format(
+                    limit, label, shots[band, motion], scales[band, motion], biases[band, motion]))
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+'''
+Labels targets that switch between standing still, driving straight and
+turning on full lock with the old two-snapshot comparison (equal X/Y means
+still, equal headings straight, anything else a turn) and with
+MotionClassifier, on positions and headings carrying a little float
+jitter like the server's, and reports how often each matches the truth,
+how often its label flips, and what an update costs
+
+    python bench/bench_motion.py
+    python bench/bench_motion.py -e 8 -d 60 -j 0.01
+'''
+
+import os
+import sys
+import time
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot import physics
+from tankbot.enemytable import EnemyTable
+from tankbot.motion import MotionClassifier
+
+Update = 0.05
+Settle = 0.3  # seconds after a switch that are not scored
+
+
+def scripts(enemies, duration, rng):
+    '''
+    True label per enemy and update, switching every one to two seconds
+    '''
+    updates = int(duration / Update)
+    labels = numpy.empty((enemies, updates), dtype=int)
+    fresh = numpy.zeros((enemies, updates), dtype=bool)
+    for enemy in range(enemies):
+        t = 0
+        while t < updates:
+            length = int(rng.uniform(1.0, 2.0) / Update)
+            labels[enemy, t:t + length] = rng.choice(
+                [MotionClassifier.Still, MotionClassifier.Straight, MotionClassifier.Left, MotionClassifier.Right])
+            fresh[enemy, t:t + int(Settle / Update)] = True
+            t += length
+    return labels, fresh
+
+
+def drive(labels, jitter, rng):
+    '''
+    (x, y, heading) per enemy and update following labels, with jitter
+    '''
+    enemies, updates = labels.shape
+    x, y, h = rng.uniform(-50, 50, enemies), rng.uniform(-80, 80, enemies), rng.uniform(0, 360, enemies)
+    poses = numpy.empty((enemies, updates, 3))
+    turn = {MotionClassifier.Left: -1, MotionClassifier.Right: 1}
+    for t in range(updates):
+        for enemy in range(enemies):
+            label = labels[enemy, t]
+            if label != MotionClassifier.Still:
+                h[enemy] = (h[enemy] + turn.get(label, 0) * physics.turnRate * Update) % 360.0
+                x[enemy] += physics.tankSpeed * numpy.cos(numpy.radians(h[enemy])) * Update
+                y[enemy] -= physics.tankSpeed * numpy.sin(numpy.radians(h[enemy])) * Update
+        poses[:, t] = numpy.stack([x, y, h], axis=1)
+    poses[:, :, :2] += rng.normal(0, jitter, (enemies, updates, 2))
+    poses[:, :, 2] = (poses[:, :, 2] + rng.normal(0, jitter * 10, (enemies, updates))) % 360.0
+    return poses
+
+
+def snapshot(poses):
+    previous, current = poses[:, :-1], poses[:, 1:]
+    still = (previous[..., 0] == current[..., 0]) & (previous[..., 1] == current[..., 1])
+    straight = previous[..., 2] == current[..., 2]
+    right = (current[..., 2] - previous[..., 2]) % 360.0 < 180.0
+    labels = numpy.where(still, MotionClassifier.Still,
+                         numpy.where(straight, MotionClassifier.Straight,
+                                     numpy.where(right, MotionClassifier.Right, MotionClassifier.Left)))
+    # nothing to compare against on the first update
+    return numpy.concatenate([numpy.full((len(poses), 1), MotionClassifier.Erratic), labels], axis=1)
+
+
+def classifier(poses):
+    enemies, updates, _ = poses.shape
+    table = EnemyTable()
+    labels = numpy.empty((enemies, updates), dtype=int)
+    elapsed = 0.0
+    for t in range(updates):
+        for enemy in range(enemies):
+            x, y, h = poses[enemy, t]
+            table.update({'Id': enemy, 'X': x, 'Y': y, 'Heading': h, 'TurretHeading': h, 'Health': 5, 'Ammo': 10},
+                         t * Update)
+        start = time.perf_counter()
+        table.step()
+        elapsed += time.perf_counter() - start
+        labels[:, t] = table.motion.label[[table.rowOf[enemy] for enemy in range(enemies)]]
+    return labels, elapsed / updates
+
+
+def report(name, labels, truth, fresh, duration):
+    scored = ~fresh
+    flips = (labels[:, 1:] != labels[:, :-1]).sum() / (len(labels) * duration)
+    turning = numpy.isin(labels, [MotionClassifier.Left, MotionClassifier.Right, MotionClassifier.Erratic]).mean()
+    print('{:<11} {:6.1%} correct, {:5.2f} label changes per enemy-second (truth {:.2f}), '
+          'turning solver on {:5.1%} of updates'.format(
+              name, (labels == truth)[scored].mean(), flips,
+              (truth[:, 1:] != truth[:, :-1]).sum() / (len(truth) * duration), turning))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--enemies', default=4, type=int, help='Enemies tracked at once')
+    parser.add_argument('-d', '--duration', default=30.0, type=float, help='Seconds of play')
+    parser.add_argument('-j', '--jitter', default=1e-3, type=float,
+                        help='Standard deviation of the position jitter; headings get ten times as much in degrees')
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    truth, fresh = scripts(args.enemies, args.duration, rng)
+    poses = drive(truth, args.jitter, rng)
+    report('snapshot', snapshot(poses), truth, fresh, args.duration)
+    labels, cost = classifier(poses)
+    report('classifier', labels, truth, fresh, args.duration)
+    print('EnemyTable.step with {} enemies: {:.0f} us per update'.format(args.enemies, cost * 1e6))
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+'''
+Checks DistanceField against a textbook Dijkstra search and compares a
+tick of Planner lookups with searching afresh every tick
+
+The arena gets a few random walls so routes have to bend. Every field's
+distances must match heapq Dijkstra over the same 8-connected grid, and
+walking a field's pointers from any reachable cell must reach the
+destination in exactly that distance, and a tank already at the
+destination must get no waypoint. Timings are for building a field,
+for one waypoint lookup from a random position, and for the fresh search
+a bot without cached fields would run every tick instead. The script
+exits non-zero on any mismatch.
+
+    python bench/bench_planner.py
+    python bench/bench_planner.py -w 12 -c 2.0
+'''
+
+import os
+import sys
+import math
+import time
+import heapq
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.planner import ArenaGrid, DistanceField, Planner
+
+
+def dijkstra(grid, destination):
+    rows, columns = grid.shape
+    distance = numpy.full(grid.shape, numpy.inf)
+    queue = []
+    for row, column in zip(*numpy.nonzero(destination & grid.free)):
+        distance[row, column] = 0.0
+        queue.append((0.0, row, column))
+    heapq.heapify(queue)
+    while queue:
+        d, row, column = heapq.heappop(queue)
+        if d > distance[row, column]:
+            continue
+        for dr, dc in DistanceField.Steps:
+            r, c = row + dr, column + dc
+            if 0 <= r < rows and 0 <= c < columns and grid.free[r, c]:
+                step = d + math.hypot(dr, dc) * grid.cellSize
+                if step < distance[r, c]:
+                    distance[r, c] = step
+                    heapq.heappush(queue, (step, r, c))
+    return distance
+
+
+def walls(grid, count, rng):
+    xs, ys = grid.centres()
+    mask = numpy.zeros(grid.shape, dtype=bool)
+    for _ in range(count):
+        x, y = rng.uniform(-50, 50), rng.uniform(-90, 90)
+        length, horizontal = rng.uniform(15, 40), rng.random() < 0.5
+        if horizontal:
+            mask |= (numpy.abs(ys - y) <= grid.cellSize) & (numpy.abs(xs - x) <= length / 2)
+        else:
+            mask |= (numpy.abs(xs - x) <= grid.cellSize) & (numpy.abs(ys - y) <= length / 2)
+    grid.block(mask)
+
+
+def check(field, reference, grid):
+    failures = 0
+    if not numpy.allclose(field.distance, reference, rtol=1e-9, atol=1e-9):
+        failures += 1
+        print('FAIL distances differ from Dijkstra')
+    for row, column in zip(*numpy.nonzero(numpy.isfinite(field.distance) & grid.free)):
+        walked, r, c = 0.0, row, column
+        for _ in range(grid.shape[0] * grid.shape[1]):
+            step = field.step[r, c]
+            if step < 0:
+                break
+            dr, dc = DistanceField.Steps[step]
+            walked += math.hypot(dr, dc) * grid.cellSize
+            r, c = r + dr, c + dc
+        if field.distance[r, c] != 0.0 or abs(walked - field.distance[row, column]) > 1e-6:
+            failures += 1
+            if failures < 5:
+                print('FAIL walking from', (row, column), 'ends at', (r, c), 'after', walked,
+                      'expected', field.distance[row, column])
+    for row, column in zip(*numpy.nonzero(field.distance == 0.0)):
+        waypoint = field.waypoint(*grid.centre(row, column), lookahead=8)
+        if waypoint is not None:
+            failures += 1
+            print('FAIL waypoint from destination cell', (row, column), 'is', waypoint)
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--walls', default=6, type=int, help='Random walls to route round')
+    parser.add_argument('-c', '--cell', default=2.5, type=float, help='Cell size in units')
+    parser.add_argument('-n', '--lookups', default=2000, type=int, help='Waypoint lookups to time')
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    grid = ArenaGrid(cellSize=args.cell)
+    walls(grid, args.walls, rng)
+    planner = Planner(grid)
+    print('{}x{} cells, {} blocked'.format(grid.shape[0], grid.shape[1], int((~grid.free).sum())))
+
+    failures = 0
+    for name, lookup in (('goal', planner.goal), ('middle', planner.middle)):
+        start = time.perf_counter()
+        lookup(0.0, 0.0)
+        built = time.perf_counter() - start
+        field = planner.fields[name]
+        destination = field.distance == 0.0
+        start = time.perf_counter()
+        reference = dijkstra(grid, destination)
+        searched = time.perf_counter() - start
+        failures += check(field, reference, grid)
+
+        positions = rng.uniform((-65, -105), (65, 105), (args.lookups, 2))
+        start = time.perf_counter()
+        for x, y in positions:
+            lookup(x, y)
+        looked = (time.perf_counter() - start) / args.lookups
+        print('{:<7} field built in {:6.1f} ms, heapq Dijkstra {:6.1f} ms, lookup {:6.1f} us per tick'.format(
+            name, built * 1e3, searched * 1e3, looked * 1e6))
+    print('{} failures'.format(failures))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+'''
+Measures how long each bot takes from process start to sending CREATETANK
+
+A fake server listens on localhost, each bot is started as a subprocess
+pointed at it, and the clock stops when the CREATETANK frame arrives. For
+comparison it also times a bare interpreter and one that imports NumPy
+up front, which is what every spawn used to pay before the heavy imports
+became lazy.
+
+    python bench/bench_startup.py
+    python bench/bench_startup.py -r 10 theBot.py store/RandomBot.py
+'''
+
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes
+
+Root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+Bots = ['theBot.py', 'anthony.py', 'spinning.py', 'store/RandomBot.py', 'store/RdBt.py',
+        'store/bot-origin-1req-s.py']
+
+
+def timeToCreate(listener, command):
+    '''
+    Seconds from starting command until its CREATETANK frame arrives
+    '''
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=Root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        connection = None
+        while connection is None:
+            try:
+                connection, _ = listener.accept()
+            except socket.timeout:
+                if process.poll() is not None:
+                    # died before connecting, e.g. a missing dependency
+                    return float('nan')
+        with connection:
+            data = b''
+            while True:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    return float('nan')
+                data += chunk
+                while len(data) >= 2 and len(data) >= 2 + data[1]:
+                    if data[0] == ServerMessageTypes.CREATETANK:
+                        return time.perf_counter() - start
+                    data = data[2 + data[1]:]
+    finally:
+        process.kill()
+        process.wait()
+
+
+def timeToExit(command):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=Root, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('bots', nargs='*', default=Bots, help='Bot scripts to start, relative to the repo root')
+    parser.add_argument('-r', '--runs', default=5, type=int, help='Starts per bot; the median is reported')
+    args = parser.parse_args()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    listener.settimeout(0.1)
+    port = listener.getsockname()[1]
+
+    for label, code in [('python', 'pass'), ('python + numpy', 'import numpy')]:
+        runs = [timeToExit([sys.executable, '-c', code]) for _ in range(args.runs)]
+        print('{:<28} {:>7.1f} ms to exit'.format(label, statistics.median(runs) * 1e3))
+    for bot in args.bots:
+        command = [sys.executable, bot, '-H', '127.0.0.1', '-p', str(port), '-n', 'StartupBench']
+        runs = [timeToCreate(listener, command) for _ in range(args.runs)]
+        print('{:<28} {:>7.1f} ms to CREATETANK'.format(bot, statistics.median(runs) * 1e3))
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+'''
+Duels a stationary shooter against a target driving random arcs and
+compares RandomBot's old turret handling (resend TURNTURRETTOHEADING while
+more than headingErrorFire off the target's current position, FIRE
+otherwise) and FireControl with the turret command resent every tick
+against FireControl's predictive timing, with and without the Monte Carlo
+fire gate, counting turret commands, shots and hits
+
+The target is observed every server update through an EnemyTable, the
+shooter's turret is played forward by a SelfPredictor from the commands it
+sends, and every shot is flown against the target's true path. Nothing
+limits the rate of fire unless --reload is given, so a policy that fires
+every tick collects hits by volume; the server's reload time is not
+measured yet.
+
+    python bench/bench_turret.py
+    python bench/bench_turret.py -s 20 -d 30 -r 0.5
+'''
+
+import os
+import sys
+import math
+import argparse
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot import physics
+from tankbot.comms import ServerMessageTypes
+from tankbot.entities import Tank
+from tankbot.enemytable import EnemyTable
+from tankbot.geometry import headings
+from tankbot.firingtable import FiringTable
+from tankbot.firecontrol import FireControl
+from tankbot.hitprobability import HitEstimator
+from tankbot.deadreckoning import SelfPredictor
+
+Step = 0.001
+Tick = 0.05
+Update = 0.05
+HeadingErrorFire = 8
+
+
+def targetPath(duration, rng):
+    '''
+    True (x, y, heading) every Step seconds of a target driving at
+    tankSpeed, switching between full lock left, straight and full lock
+    right every one to two seconds
+    '''
+    count = int(duration / Step) + 1
+    path = numpy.empty((count, 3))
+    distance = rng.uniform(20, 60)
+    bearing = rng.uniform(0, 2 * math.pi)
+    x, y, h = distance * math.cos(bearing), distance * math.sin(bearing), rng.uniform(0, 360)
+    turn, switch = 0, 0.0
+    for i in range(count):
+        if i * Step >= switch:
+            turn = rng.choice((-1, 0, 1))
+            switch += rng.uniform(1.0, 2.0)
+        path[i] = x, y, h
+        h = (h + turn * physics.turnRate * Step) % 360.0
+        x += physics.tankSpeed * math.cos(math.radians(h)) * Step
+        y -= physics.tankSpeed * math.sin(math.radians(h)) * Step
+    return path
+
+
+def hits(path, fired, heading, horizon=3.0):
+    '''
+    Whether a projectile fired from the origin at time fired along heading
+    passes within hitRadius of the target
+    '''
+    start = int(round(fired / Step))
+    t = numpy.arange(0, min(int(horizon / Step), len(path) - start)) * Step
+    x = physics.projectileSpeed * math.cos(math.radians(heading)) * t
+    y = -physics.projectileSpeed * math.sin(math.radians(heading)) * t
+    target = path[start:start + len(t)]
+    return bool((numpy.hypot(target[:, 0] - x, target[:, 1] - y) < physics.hitRadius).any())
+
+
+def legacy(enemies, tank, now, predictor):
+    x, y = enemies.tracker.estimate(enemies.rows(), now)[:2]
+    heading = float(headings(tank.X, tank.Y, x[0], y[0]))
+    if abs(tank.TurretHeading - heading) > HeadingErrorFire:
+        return [(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': heading})]
+    return [(ServerMessageTypes.FIRE, None)]
+
+
+def predictive(fireControl, resend=False):
+    '''
+    FireControl's timing; with resend the turret command goes out every
+    tick, as tryShot did before it knew when the turret would line up
+    '''
+    def policy(enemies, tank, now, predictor):
+        shot = fireControl.aim(enemies, tank, now, predictor.turretTarget)
+        commands = []
+        if shot is not None and (shot.turn or resend):
+            commands.append((ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': shot.heading}))
+        if shot is not None and shot.fire:
+            commands.append((ServerMessageTypes.FIRE, None))
+        return commands
+    return policy
+
+
+def duel(policy, path, duration, reload=0.0):
+    '''
+    (turret commands, shots, hits) over one run of duration seconds
+    '''
+    enemies = EnemyTable()
+    predictor = SelfPredictor()
+    predictor.correct(Tank({'Id': 0, 'Name': 'shooter', 'X': 0.0, 'Y': 0.0, 'Heading': 0.0,
+                            'TurretHeading': 0.0, 'Health': 5, 'Ammo': 10}, 0.0), 0.0)
+    turns = shots = hit = 0
+    nextUpdate = 0.0
+    loaded = 0.0
+    for tick in range(int(duration / Tick)):
+        now = tick * Tick
+        while nextUpdate <= now:
+            x, y, h = path[int(round(nextUpdate / Step))]
+            enemies.update({'Id': 1, 'X': x, 'Y': y, 'Heading': h, 'TurretHeading': h, 'Health': 5, 'Ammo': 10},
+                           nextUpdate)
+            nextUpdate += Update
+        enemies.step()
+        predictor.advance(now)
+        tank = Tank({'Id': 0, 'Name': 'shooter', 'X': 0.0, 'Y': 0.0, 'Heading': 0.0,
+                     'TurretHeading': predictor.TurretHeading, 'Health': 5, 'Ammo': 10}, now)
+        commands = [command for command in policy(enemies, tank, now, predictor)
+                    if command[0] != ServerMessageTypes.FIRE or now >= loaded]
+        for messageType, _ in commands:
+            if messageType == ServerMessageTypes.TURNTURRETTOHEADING:
+                turns += 1
+            elif messageType == ServerMessageTypes.FIRE:
+                shots += 1
+                hit += hits(path, now, predictor.TurretHeading)
+                loaded = now + reload
+        predictor.onCommands(commands, now)
+    return turns, shots, hit
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--seeds', default=10, type=int, help='Random target paths to duel against')
+    parser.add_argument('-d', '--duration', default=20.0, type=float, help='Seconds per duel')
+    parser.add_argument('-r', '--reload', default=0.0, type=float, help='Seconds between shots at the least')
+    args = parser.parse_args()
+
+    table = FiringTable.load()
+    paths = [targetPath(args.duration + 3.0, numpy.random.default_rng(seed)) for seed in range(args.seeds)]
+    fireControl = FireControl(table, tickTime=Tick)
+    sampled = FireControl(table, tickTime=Tick, hitEstimator=HitEstimator(seed=1))
+    for name, policy in [('legacy', legacy), ('every tick', predictive(fireControl, resend=True)),
+                         ('predictive', predictive(fireControl)), ('monte carlo', predictive(sampled))]:
+        turns, shots, hit = numpy.sum([duel(policy, path, args.duration, args.reload) for path in paths], axis=0)
+        seconds = args.seeds * args.duration
+        print('{:<11} {:>6.2f} turret commands/s {:>6.2f} shots/s {:>5d} hits {:>6.1%} hits per shot'.format(
+            name, turns / seconds, shots / seconds, hit, hit / max(shots, 1)))
@@ -1,152 +1,27 @@
 #!/usr/bin/python
 
-import json
-import socket
 import logging
-import binascii
-import struct
 import argparse
 import time
-import math
-import numpy
-from scipy.optimize import *
-
-
-class ServerMessageTypes(object):
-    TEST = 0
-    CREATETANK = 1
-    DESPAWNTANK = 2
-    FIRE = 3
-    TOGGLEFORWARD = 4
-    TOGGLEREVERSE = 5
-    TOGGLELEFT = 6
-    TOGGLERIGHT = 7
-    TOGGLETURRETLEFT = 8
-    TOGGLETURRETRIGHT = 9
-    TURNTURRETTOHEADING = 10
-    TURNTOHEADING = 11
-    MOVEFORWARDDISTANCE = 12
-    MOVEBACKWARSDISTANCE = 13
-    STOPALL = 14
-    STOPTURN = 15
-    STOPMOVE = 16
-    STOPTURRET = 17
-    OBJECTUPDATE = 18
-    HEALTHPICKUP = 19
-    AMMOPICKUP = 20
-    SNITCHPICKUP = 21
-    DESTROYED = 22
-    ENTEREDGOAL = 23
-    KILL = 24
-    SNITCHAPPEARED = 25
-    GAMETIMEUPDATE = 26
-    HITDETECTED = 27
-    SUCCESSFULLHIT = 28
-
-    strings = {
-        TEST: "TEST",
-        CREATETANK: "CREATETANK",
-        DESPAWNTANK: "DESPAWNTANK",
-        FIRE: "FIRE",
-        TOGGLEFORWARD: "TOGGLEFORWARD",
-        TOGGLEREVERSE: "TOGGLEREVERSE",
-        TOGGLELEFT: "TOGGLELEFT",
-        TOGGLERIGHT: "TOGGLERIGHT",
-        TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-        TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
-        TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
-        TURNTOHEADING: "TURNTOHEADING",
-        MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
-        MOVEBACKWARSDISTANCE: "MOVEBACKWARDSDISTANCE",
-        STOPALL: "STOPALL",
-        STOPTURN: "STOPTURN",
-        STOPMOVE: "STOPMOVE",
-        STOPTURRET: "STOPTURRET",
-        OBJECTUPDATE: "OBJECTUPDATE",
-        HEALTHPICKUP: "HEALTHPICKUP",
-        AMMOPICKUP: "AMMOPICKUP",
-        SNITCHPICKUP: "SNITCHPICKUP",
-        DESTROYED: "DESTROYED",
-        ENTEREDGOAL: "ENTEREDGOAL",
-        KILL: "KILL",
-        SNITCHAPPEARED: "SNITCHAPPEARED",
-        GAMETIMEUPDATE: "GAMETIMEUPDATE",
-        HITDETECTED: "HITDETECTED",
-        SUCCESSFULLHIT: "SUCCESSFULLHIT"
-    }
-
-    def toString(self, id):
-        if id in self.strings.keys():
-            return self.strings[id]
-        else:
-            return "??UNKNOWN??"
-
-
-class ServerComms(object):
-    '''
-    TCP comms handler
-
-    Server protocol is simple:
-
-    * 1st byte is the message type - see ServerMessageTypes
-    * 2nd byte is the length in bytes of the payload (so max 255 byte payload)
-    * 3rd byte onwards is the payload encoded in JSON
-    '''
-    ServerSocket = None
-    MessageTypes = ServerMessageTypes()
-
-    def __init__(self, hostname, port):
-        self.ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.ServerSocket.connect((hostname, port))
-
-    def readMessage(self):
-        '''
-        Read a message from the server
-        '''
-        messageTypeRaw = self.ServerSocket.recv(1)
-        messageLenRaw = self.ServerSocket.recv(1)
-        messageType = struct.unpack('>B', messageTypeRaw)[0]
-        messageLen = struct.unpack('>B', messageLenRaw)[0]
-
-        if messageLen == 0:
-            messageData = bytearray()
-            messagePayload = {'messageType': messageType}
-        else:
-            messageData = self.ServerSocket.recv(messageLen)
-            logging.debug("*** {}".format(messageData))
-            messagePayload = json.loads(messageData.decode('utf-8'))
-            messagePayload['messageType'] = messageType
-
-        logging.debug('Turned message {} into type {} payload {}'.format(
-            binascii.hexlify(messageData),
-            self.MessageTypes.toString(messageType),
-            messagePayload))
-        return messagePayload
-
-    def sendMessage(self, messageType=None, messagePayload=None):
-        '''
-        Send a message to the server
-        '''
-        message = bytearray()
-
-        if messageType is not None:
-            message.append(messageType)
-        else:
-            message.append(0)
-
-        if messagePayload is not None:
-            messageString = json.dumps(messagePayload)
-            message.append(len(messageString))
-            message.extend(str.encode(messageString))
-
-        else:
-            message.append(0)
-
-        logging.debug('Turned message type {} payload {} into {}'.format(
-            self.MessageTypes.toString(messageType),
-            messagePayload,
-            binascii.hexlify(message)))
-        return self.ServerSocket.send(message)
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.lazy import lazyImport, prewarm
+from tankbot.comms import ServerMessageTypes, ServerComms, CommandBuffer
+from tankbot.tracing import FrameTrace
+from tankbot.dispatch import MessageDispatcher
+from tankbot.entities import Tank, Pickup, Snitch, track
+from tankbot.enemytable import EnemyTable
+from tankbot.expiry import ExpiryIndex
+from tankbot.geometry import heading, distance, angleDifference, normalizeHeading
+from tankbot.deadreckoning import SelfPredictor
+from tankbot.firingtable import FiringTable
+from tankbot.firecontrol import FireControl
+from tankbot.hitprobability import HitEstimator
+from tankbot.leadcorrection import LeadCorrector
+
+numpy = lazyImport('numpy')
 
 
 # Parse command line args
@@ -155,6 +30,8 @@ parser.add_argument('-d', '--debug', action='store_true', help='Enable debug out
 parser.add_argument('-H', '--hostname', default='127.0.0.1', help='Hostname to connect to')
 parser.add_argument('-p', '--port', default=8052, type=int, help='Port to connect to')
 parser.add_argument('-n', '--name', default='RandomBot', help='Name of bot')
+parser.add_argument('-l', '--lead-correction', action='store_true',
+                    help='Learn lead corrections from hits during the match')
 args = parser.parse_args()
 
 """
@@ -192,10 +69,16 @@ else:
 
 # Connect to game server
 GameServer = ServerComms(args.hostname, args.port)
+Commands = CommandBuffer(GameServer)
+if args.debug:
+    GameServer.trace = FrameTrace()
+    GameServer.trace.installCrashHandler()
 
 # Spawn our tank
 logging.info("Creating tank with name '{}'".format(args.name))
 GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+# load NumPy while the server sets the tank up
+prewarm('numpy')
 
 # Main loop - read game messages, ignore them and randomly perform actions
 # server params
@@ -205,71 +88,27 @@ maxAmmo = 10
 # params
 waitTime = 50  # wait n milliseconds to send a new message
 memoryTime = 200
+trackTime = 1500  # enemies are extrapolated by the tracker for this many ms before being forgotten
 healthThresh = 2  # health threshold to transite state
 ammoThresh = 0  # ammo threshold to transite state
 expectedDist = 17  # expected distance to the enemy
 headingErrorMove = 10  # tolerable angle error for turning before moving
-headingErrorFire = 8  # tolerable angle error for turning before firing
+fireProbability = 0.3  # fire once a shot along the turret is estimated to hit this often
 allowedStationaryTime = 200  # allowed stationary time before having to move again (to avoid attack)
 
-turnRadius  # TODO
-projectileSpeed  # TODO
-tankSpeed  # TODO
-
 # vars
 stationaryTime = 0
 
-def getCartesian(x, y, b):
-    m = (b - 90) / 360
-    c = y - m * x
-    return m, c
-
-
-def targetStraight(enemy_x, enemy_y, me_x, my_y, heading):
-    a = enemy_x
-    b = enemy_y
-    c = me_x
-    d = me_y
-
-    m, k = getCartesian(enemy_x, enemy_y)
-
-    speed_e = tankSpeed
-    speed_b = projectileSpeed
-
-    x = 0.0
-    y = 0.0
-
-    a = (m ** 2 + 1) * (speed_b - speed_e)
-    b = speed_b * (-2 * c + 2 * m * k - 2 * m * d) - speed_e * (-2 * a + 2 * m * k - 2 * m * b)
-    c = speed_b * (a ** 2 + k ** 2 - 2 * k * b + b ** 2) - speed_b * (a ** 2 + k ** 2 - 2 * k * d + d ** 2)
-
-    x = quadratic(a, b, c)
-    y = m * x + k
-    return x, y
-
-def getHeading(x1, y1, x2, y2):
-    heading = math.atan2(y2 - y1, x2 - x1)
-    heading = math.degrees(heading)
-    heading = math.fmod(heading - 360, 360)
-    return abs(heading)
-
-
-def calculateDistance(x1, y1, x2, y2):
-    headingX = x2 - x1
-    headingY = y2 - y1
-    return math.sqrt((headingX * headingX) + (headingY * headingY))
-
-
-def tryMove(myTank, x2, y2, distance=None, alignTurret=False, shift=0):
-    heading = getHeading(myTank['X'], myTank['Y'], x2, y2)
-    if abs(myTank['Heading'] - heading) > headingErrorMove:
-        GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading + shift})
-    elif alignTurret and abs(myTank['TurretHeading'] - heading) > 15:  # only for watching
-        GameServer.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': heading})
+def tryMove(myTank, x2, y2, length=None, alignTurret=False, shift=0):
+    bearing = heading(myTank.X, myTank.Y, x2, y2)
+    if abs(angleDifference(bearing, myTank.Heading)) > headingErrorMove:
+        Commands.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': normalizeHeading(bearing + shift)})
+    elif alignTurret and abs(angleDifference(bearing, myTank.TurretHeading)) > 15:  # only for watching
+        Commands.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': bearing})
     else:
-        if not distance:
-            distance = calculateDistance(myTank['X'], myTank['Y'], x2, y2)
-        GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': distance})
+        if not length:
+            length = distance(myTank.X, myTank.Y, x2, y2)
+        Commands.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': length})
         global stationaryTime
         stationaryTime = 0
 
@@ -278,12 +117,24 @@ class Info(object):
     def __init__(self):
         # Objects
         self.myTank = None
-        self.enemies = {}
+        self.enemies = EnemyTable()
+        self.selfState = SelfPredictor()
+        # off unless asked for: it still costs hits when the firing model is right
+        self.leadCorrector = LeadCorrector() if args.lead_correction else None
         self.healthPickups = {}
         self.ammoPickups = {}
         self.snitch = None
         self.nearEnemies = {}
 
+        # Objects not seen for memoryTime ms (enemies: trackTime ms) are forgotten
+        self.memory = ExpiryIndex(memoryTime * 0.001)
+        self.forgetters = {
+            'enemy': self.enemies.remove,
+            'health': lambda Id: self.healthPickups.pop(Id, None),
+            'ammo': lambda Id: self.ammoPickups.pop(Id, None),
+            'snitch': self.forgetSnitch,
+        }
+
         # Other Info
         self.snitchPickedUp = None
         self.destroyed = False
@@ -294,62 +145,93 @@ class Info(object):
         self.hitDetected = False
         self.didHit = False
 
-    def update(self, message):
-        if message['messageType'] == ServerMessageTypes.OBJECTUPDATE:
-            if message['Type'] == 'Tank':
-                if message['Name'] == args.name:
-                    self.myTank = message
-                else:
-                    self.enemies[message['Id']] = {'obj': message, 'time': 0}
-            elif message['Type'] == 'HealthPickup':
-                self.healthPickups[message['Id']] = {'obj': message, 'time': 0}
-            elif message['Type'] == 'AmmoPickup':
-                self.ammoPickups[message['Id']] = {'obj': message, 'time': 0}
-            elif message['Type'] == 'Snitch':
-                self.snitch = {'obj': message, 'time': 0}
+        self.dispatcher = MessageDispatcher()
+        self.update = self.dispatcher.dispatch
+        self.updateAll = self.dispatcher.dispatchAll
+        subscribe = self.dispatcher.subscribe
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Tank', self.onTank)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'HealthPickup', self.onHealthPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'AmmoPickup', self.onAmmoPickup)
+        subscribe(ServerMessageTypes.OBJECTUPDATE, 'Snitch', self.onSnitch)
+        subscribe(ServerMessageTypes.SNITCHPICKUP, handler=self.onSnitchPickup)
+        subscribe(ServerMessageTypes.DESTROYED, handler=self.onDestroyed)
+        subscribe(ServerMessageTypes.ENTEREDGOAL, handler=self.onEnteredGoal)
+        subscribe(ServerMessageTypes.KILL, handler=self.onKill)
+        subscribe(ServerMessageTypes.SNITCHAPPEARED, handler=self.onSnitchAppeared)
+        subscribe(ServerMessageTypes.GAMETIMEUPDATE, handler=self.onGameTimeUpdate)
+        subscribe(ServerMessageTypes.HITDETECTED, handler=self.onHitDetected)
+        subscribe(ServerMessageTypes.SUCCESSFULLHIT, handler=self.onSuccessfulHit)
+
+    def onTank(self, message):
+        now = time.time()
+        if message['Name'] == args.name:
+            if self.myTank is None:
+                self.myTank = Tank(message, now)
             else:
-                print('Unrecognized message type:', message)
-        elif message['messageType'] == ServerMessageTypes.SNITCHPICKUP:
-            self.snitchPickedUp = message['Id']
+                self.myTank.update(message, now)
+            self.selfState.correct(self.myTank, now)
+        else:
+            self.enemies.update(message, now)
+            self.memory.touch(('enemy', message['Id']), now, trackTime * 0.001)
+
+    def onHealthPickup(self, message):
+        now = time.time()
+        track(self.healthPickups, Pickup, message, now)
+        self.memory.touch(('health', message['Id']), now)
+
+    def onAmmoPickup(self, message):
+        now = time.time()
+        track(self.ammoPickups, Pickup, message, now)
+        self.memory.touch(('ammo', message['Id']), now)
+
+    def onSnitch(self, message):
+        now = time.time()
+        if self.snitch is None:
+            self.snitch = Snitch(message, now)
+        else:
+            self.snitch.update(message, now)
+        self.memory.touch(('snitch', message['Id']), now)
+
+    def forgetSnitch(self, Id):
+        if self.snitch is not None and self.snitch.Id == Id:
             self.snitch = None
-        elif message['messageType'] == ServerMessageTypes.DESTROYED:
-            self.destroyed = True
-        elif message['messageType'] == ServerMessageTypes.ENTEREDGOAL:
-            self.enteredGoal = True
-        elif message['messageType'] == ServerMessageTypes.KILL:
-            self.didKill = True
-        elif message['messageType'] == ServerMessageTypes.SNITCHAPPEARED:
-            self.snitchAppeared = True
-        elif message['messageType'] == ServerMessageTypes.GAMETIMEUPDATE:
-            self.timeLeft = message['Time']
-        elif message['messageType'] == ServerMessageTypes.HITDETECTED:
-            self.hitDetected = True
-        elif message['messageType'] == ServerMessageTypes.SUCCESSFULLHIT:
-            self.didHit = True
+
+    def onSnitchPickup(self, message):
+        self.snitchPickedUp = message['Id']
+        self.snitch = None
+
+    def onDestroyed(self, message):
+        self.destroyed = True
+        self.selfState.stop()
+
+    def onEnteredGoal(self, message):
+        self.enteredGoal = True
+
+    def onKill(self, message):
+        self.didKill = True
+
+    def onSnitchAppeared(self, message):
+        self.snitchAppeared = True
+
+    def onGameTimeUpdate(self, message):
+        self.timeLeft = message['Time']
+
+    def onHitDetected(self, message):
+        self.hitDetected = True
+
+    def onSuccessfulHit(self, message):
+        self.didHit = True
+        if self.leadCorrector is not None:
+            self.leadCorrector.hit(time.time())
 
     def out(self):
         print(
-        'health:', self.myTank['Health'], 'ammo:', self.myTank['Ammo'], 'enemies:', len(self.enemies), 'healthPickups:',
+        'health:', self.myTank.Health, 'ammo:', self.myTank.Ammo, 'enemies:', len(self.enemies), 'healthPickups:',
         len(self.healthPickups), 'ammoPickups:', len(self.ammoPickups))
 
     def next(self):
-        def forget(dic):
-            toRemove = []
-            for key, value in dic.items():
-                value['time'] += waitTime
-                if value['time'] > memoryTime:
-                    toRemove.append(key)
-            for key in toRemove:
-                del dic[key]
-
-        forget(self.enemies)
-        forget(self.healthPickups)
-        forget(self.ammoPickups)
-
-        if self.snitch:
-            self.snitch['time'] += waitTime
-            if self.snitch['time'] > memoryTime:
-                self.snitch = None
+        for kind, Id in self.memory.expire(time.time()):
+            self.forgetters[kind](Id)
 
         self.snitchPickedUp = None
         self.destroyed = False
@@ -375,7 +257,7 @@ class States(object):
 
 def transiteState(currentState, info):
     # Special cases
-    if info.snitchPickedUp == info.myTank['Id']:
+    if info.snitchPickedUp == info.myTank.Id:
         return States.BANK_POINTS
     if info.didKill:
         return States.BANK_POINTS
@@ -387,57 +269,57 @@ def transiteState(currentState, info):
     if currentState == States.SCAN:
         # if info.snitchAppeared:
         # 	return States.SEARCH_SNITCH
-        if info.myTank['Health'] <= healthThresh:
+        if info.myTank.Health <= healthThresh:
             return States.SEARCH_HEALTH
         if info.snitch:
             return States.PICKUP_SNITCH
-        if info.myTank['Ammo'] <= ammoThresh:
+        if info.myTank.Ammo <= ammoThresh:
             return States.SEARCH_AMMO
         if info.enemies:
             return States.ATTACK_TARGET
 
     elif currentState == States.SEARCH_HEALTH:
-        if info.myTank['Health'] == maxHealth:
+        if info.myTank.Health == maxHealth:
             return States.SCAN
         if info.healthPickups:
             return States.PICKUP_HEALTH
 
     elif currentState == States.SEARCH_AMMO:
-        if info.myTank['Ammo'] == maxAmmo:
+        if info.myTank.Ammo == maxAmmo:
             return States.SCAN
-        if info.myTank['Health'] <= healthThresh:
+        if info.myTank.Health <= healthThresh:
             return States.SEARCH_HEALTH
         if info.ammoPickups:
             return States.PICKUP_AMMO
 
     elif currentState == States.SEARCH_SNITCH:
-        # if info.myTank['Health'] <= healthThresh:  # which is prior: health or snitch?
+        # if info.myTank.Health <= healthThresh:  # which is prior: health or snitch?
         # 	return States.SEARCH_HEALTH
-        if info.snitchPickedUp != info.myTank['Id']:
+        if info.snitchPickedUp != info.myTank.Id:
             return States.SCAN
 
     elif currentState == States.PICKUP_HEALTH:
-        if info.myTank['Health'] == maxHealth:
+        if info.myTank.Health == maxHealth:
             return States.SCAN
         if not info.healthPickups:
             return States.SEARCH_HEALTH
 
     elif currentState == States.PICKUP_AMMO:
-        if info.myTank['Ammo'] == maxAmmo:
+        if info.myTank.Ammo == maxAmmo:
             return States.SCAN
         if not info.ammoPickups:
             return States.SEARCH_AMMO
 
     elif currentState == States.PICKUP_SNITCH:
-        if info.snitchPickedUp != info.myTank['Id']:
+        if info.snitchPickedUp != info.myTank.Id:
             return States.SCAN
 
     elif currentState == States.ATTACK_TARGET:
         if not info.enemies:
             return States.SCAN
-        if info.myTank['Health'] <= healthThresh:
+        if info.myTank.Health <= healthThresh:
             return States.SEARCH_HEALTH
-        if info.myTank['Ammo'] <= ammoThresh:
+        if info.myTank.Ammo <= ammoThresh:
             return States.SEARCH_AMMO
 
     elif currentState == States.BANK_POINTS:
@@ -451,83 +333,76 @@ def transiteState(currentState, info):
     return currentState
 
 
-def quadratic(a, b, c):
-    return -2 * b + Math.sqrt(b ** 2 - 4 * a * c)
-
-
 def performAction(currentState, info):
     if currentState == States.SCAN or currentState == States.SEARCH_HEALTH or currentState == States.SEARCH_AMMO or currentState == States.SEARCH_SNITCH:
-        if calculateDistance(info.myTank['X'], info.myTank['Y'], 0, 0) > 15:
-            tryMove(info.myTank, ((info.myTank['X'] > 0) * 2 - 1) * 10, ((info.myTank['Y'] > 0) * 2 - 1) * 10,
+        if distance(info.myTank.X, info.myTank.Y, 0, 0) > 15:
+            tryMove(info.myTank, ((info.myTank.X > 0) * 2 - 1) * 10, ((info.myTank.Y > 0) * 2 - 1) * 10,
                     alignTurret=True)  # go to a point closer to center
         else:
-            GameServer.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING,
-                                   {'Amount': math.fmod(info.myTank['TurretHeading'] + 60, 360)})
+            Commands.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING,
+                                   {'Amount': normalizeHeading(info.myTank.TurretHeading + 60)})
 
     elif currentState == States.PICKUP_HEALTH or currentState == States.PICKUP_AMMO or currentState == States.PICKUP_SNITCH:
         if currentState == States.PICKUP_HEALTH:
-            healthPickup = list(info.healthPickups.values())[0]['obj']
-            x2 = healthPickup['X']
-            y2 = healthPickup['Y']
+            healthPickup = list(info.healthPickups.values())[0]
+            x2 = healthPickup.X
+            y2 = healthPickup.Y
         elif currentState == States.PICKUP_AMMO:
-            ammoPickup = list(info.ammoPickups.values())[0]['obj']
-            x2 = ammoPickup['X']
-            y2 = ammoPickup['Y']
+            ammoPickup = list(info.ammoPickups.values())[0]
+            x2 = ammoPickup.X
+            y2 = ammoPickup.Y
         elif currentState == States.PICKUP_SNITCH:
-            x2 = info.snitch['obj']['X']
-            y2 = info.snitch['obj']['Y']
+            x2 = info.snitch.X
+            y2 = info.snitch.Y
         tryMove(info.myTank, x2, y2, alignTurret=True)
 
     elif currentState == States.ATTACK_TARGET:
-        enemy = list(info.enemies.values())[0]['obj']  # TODO: sort enermies
-        x2 = enemy['X']
-        y2 = enemy['Y']
-
-        heading = getHeading(info.myTank['X'], info.myTank['Y'], x2, y2)
-        distance = calculateDistance(info.myTank['X'], info.myTank['Y'], x2, y2)
-        if distance > expectedDist:
-            # if abs(info.myTank['TurretHeading'] - heading) < 10:  # try to fire when moving to enemy
+        # engage whoever is most dangerous to us right now
+        enemies = info.enemies
+        rows = enemies.rows()
+        row = rows[numpy.argmax(enemies.threat(info.myTank.X, info.myTank.Y)[rows])]
+        # go for where the tracker expects it now, not where it was last seen
+        xs, ys, _, _, _, _ = enemies.tracker.estimate([row], time.time())
+        x2 = xs[0]
+        y2 = ys[0]
+
+        bearing = heading(info.myTank.X, info.myTank.Y, x2, y2)
+        separation = distance(info.myTank.X, info.myTank.Y, x2, y2)
+        if separation > expectedDist:
+            # if abs(info.myTank.TurretHeading - bearing) < 10:  # try to fire when moving to enemy
             # 	if random.randint(0,10) > 5:
             # 		GameServer.sendMessage(ServerMessageTypes.FIRE)
             # 	else:
-            # 		tryMove(info.myTank, x2, y2, distance=distance-expectedDist, alignTurret=True)
+            # 		tryMove(info.myTank, x2, y2, length=separation-expectedDist, alignTurret=True)
             # else:
-            # 	tryMove(info.myTank, x2, y2, distance=distance-expectedDist, alignTurret=True)
-            tryMove(info.myTank, x2, y2, distance=distance - expectedDist, alignTurret=True)
+            # 	tryMove(info.myTank, x2, y2, length=separation-expectedDist, alignTurret=True)
+            tryMove(info.myTank, x2, y2, length=separation - expectedDist, alignTurret=True)
         else:
             # # rotate body for moving
-            # h1 = (heading - 90) % 360
-            # h2 = (heading + 90) % 360
-            # if (info.myTank['Heading'] - h1) % 360 > 40 \
-            # 		and abs(info.myTank['Heading'] - h2) > 40:
-            # 	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': fmod(info.myTank['Heading']+45, 360)})
+            # h1 = (bearing - 90) % 360
+            # h2 = (bearing + 90) % 360
+            # if (info.myTank.Heading - h1) % 360 > 40 \
+            # 		and abs(info.myTank.Heading - h2) > 40:
+            # 	GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': fmod(info.myTank.Heading+45, 360)})
             # else:
 
             # if stationaryTime > allowedStationaryTime:  # should keep moving to avoid getting hit
-            # 	tryMove(info.myTank, info.myTank['X']+random.randint(-5,5), info.myTank['Y']+random.randint(-5,5))
+            # 	tryMove(info.myTank, info.myTank.X+random.randint(-5,5), info.myTank.Y+random.randint(-5,5))
             # else:
-            if abs(info.myTank['TurretHeading'] - heading) > headingErrorFire:
-                GameServer.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': heading})
+            # lead the target and fire on the tick the turret lines up with it
+            shot = fireControl.aim(enemies, info.myTank, time.time(), info.selfState.turretTarget, rows=[row])
+            if shot is None:
+                Commands.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': bearing})
             else:
-                GameServer.sendMessage(ServerMessageTypes.FIRE)
+                if shot.turn:
+                    Commands.sendMessage(ServerMessageTypes.TURNTURRETTOHEADING, {'Amount': shot.heading})
+                if shot.fire:
+                    Commands.sendMessage(ServerMessageTypes.FIRE)
 
     elif currentState == States.BANK_POINTS:
-        x2 = y2 = None
-
-        # choose nearest point (coord x) on goal zone
-        if info.myTank['X'] > 10:
-            x2 = 10
-        elif info.myTank['X'] < -10:
-            x2 = -10
-        else:
-            x2 = info.myTank['X']
-
-        # left or right zone
-        if info.myTank['Y'] > 0:
-            y2 = 105
-        else:
-            y2 = -105
-
+        # nearest point of the goal zone on our side
+        x2 = min(max(info.myTank.X, -10), 10)
+        y2 = 105 if info.myTank.Y > 0 else -105
         tryMove(info.myTank, x2, y2)
 
     else:
@@ -537,20 +412,21 @@ def performAction(currentState, info):
 
 currentState = States.SCAN
 info = Info()
+Commands.observers.append(info.selfState.onCommands)
+fireControl = FireControl(FiringTable.load(), tickTime=waitTime * 0.001, hitEstimator=HitEstimator(),
+                          leadCorrector=info.leadCorrector, minProbability=fireProbability)
 
 while True:
     info.next()
+    # one decision every waitTime ms, between server updates too
+    tickEnd = time.time() + waitTime * 0.001
     while True:
-        startTime = time.time()
-        message = GameServer.readMessage()
-        # try:
-        # 	message = GameServer.readMessage()
-        # except struct.error:
-        # 	print('struct.error')
-        # 	continue
-        info.update(message)
-        if time.time() - startTime > waitTime * 0.001:
+        info.updateAll(GameServer.readMessages(timeout=max(tickEnd - time.time(), 0)))
+        if time.time() >= tickEnd:
             break
+    info.enemies.step()
+    if info.myTank is not None:
+        info.selfState.refresh(info.myTank, time.time())
 
     # Add stationaryTime
     stationaryTime += waitTime
@@ -561,7 +437,7 @@ while True:
         continue
 
     # Check required info (shouldn't be required now)
-    if info.myTank is None or info.myTank['Health'] == 0:
+    if info.myTank is None or info.myTank.Health == 0:
         continue
 
     # State transition
@@ -572,5 +448,6 @@ while True:
 
     # Perform action
     performAction(currentState, info)
+    Commands.flush()
 
     print()
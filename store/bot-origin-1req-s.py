@@ -1,158 +1,15 @@
 #!/usr/bin/python
 import time
-import json
-import socket
 import logging
-import binascii
-import struct
 import argparse
 import random
-import math
+import os
+import sys
 
-
-class ServerMessageTypes(object):
-    TEST = 0
-    CREATETANK = 1
-    DESPAWNTANK = 2
-    FIRE = 3
-    TOGGLEFORWARD = 4
-    TOGGLEREVERSE = 5
-    TOGGLELEFT = 6
-    TOGGLERIGHT = 7
-    TOGGLETURRETLEFT = 8
-    TOGGLETURRETRIGHT = 9
-    TURNTURRETTOHEADING = 10
-    TURNTOHEADING = 11
-    MOVEFORWARDDISTANCE = 12
-    MOVEBACKWARSDISTANCE = 13
-    STOPALL = 14
-    STOPTURN = 15
-    STOPMOVE = 16
-    STOPTURRET = 17
-    OBJECTUPDATE = 18
-    HEALTHPICKUP = 19
-    AMMOPICKUP = 20
-    SNITCHPICKUP = 21
-    DESTROYED = 22
-    ENTEREDGOAL = 23
-    KILL = 24
-    SNITCHAPPEARED = 25
-    GAMETIMEUPDATE = 26
-    HITDETECTED = 27
-    SUCCESSFULLHIT = 28
-
-    strings = {
-        TEST: "TEST",
-        CREATETANK: "CREATETANK",
-        DESPAWNTANK: "DESPAWNTANK",
-        FIRE: "FIRE",
-        TOGGLEFORWARD: "TOGGLEFORWARD",
-        TOGGLEREVERSE: "TOGGLEREVERSE",
-        TOGGLELEFT: "TOGGLELEFT",
-        TOGGLERIGHT: "TOGGLERIGHT",
-        TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
-        TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
-        TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
-        TURNTOHEADING: "TURNTOHEADING",
-        MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
-        MOVEBACKWARSDISTANCE: "MOVEBACKWARDSDISTANCE",
-        STOPALL: "STOPALL",
-        STOPTURN: "STOPTURN",
-        STOPMOVE: "STOPMOVE",
-        STOPTURRET: "STOPTURRET",
-        OBJECTUPDATE: "OBJECTUPDATE",
-        HEALTHPICKUP: "HEALTHPICKUP",
-        AMMOPICKUP: "AMMOPICKUP",
-        SNITCHPICKUP: "SNITCHPICKUP",
-        DESTROYED: "DESTROYED",
-        ENTEREDGOAL: "ENTEREDGOAL",
-        KILL: "KILL",
-        SNITCHAPPEARED: "SNITCHAPPEARED",
-        GAMETIMEUPDATE: "GAMETIMEUPDATE",
-        HITDETECTED: "HITDETECTED",
-        SUCCESSFULLHIT: "SUCCESSFULLHIT"
-    }
-
-    def toString(self, id):
-        if id in self.strings.keys():
-            return self.strings[id]
-        else:
-            return "??UNKNOWN??"
-
-
-class ServerComms(object):
-    '''
-	TCP comms handler
-
-	Server protocol is simple:
-
-	* 1st byte is the message type - see ServerMessageTypes
-	* 2nd byte is the length in bytes of the payload (so max 255 byte payload)
-	* 3rd byte onwards is the payload encoded in JSON
-	'''
-    ServerSocket = None
-    MessageTypes = ServerMessageTypes()
-
-    def __init__(self, hostname, port):
-        self.ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.ServerSocket.connect((hostname, port))
-
-    def readMessage(self):
-        '''
-		Read a message from the server
-		'''
-        messageTypeRaw = self.ServerSocket.recv(1)
-        messageLenRaw = self.ServerSocket.recv(1)
-        messageType = struct.unpack('>B', messageTypeRaw)[0]
-        messageLen = struct.unpack('>B', messageLenRaw)[0]
-
-        if messageLen == 0:
-            messageData = bytearray()
-            messagePayload = {'messageType': messageType}
-        else:
-            messageData = self.ServerSocket.recv(messageLen)
-            logging.debug("*** {}".format(messageData))
-            messagePayload = json.loads(messageData.decode('utf-8'))
-            messagePayload['messageType'] = messageType
-
-        logging.debug('Turned message {} into type {} payload {}'.format(
-            binascii.hexlify(messageData),
-            self.MessageTypes.toString(messageType),
-            messagePayload))
-        return messagePayload
-
-    def sendMessage(self, messageType=None, messagePayload=None):
-        '''
-		Send a message to the server
-		'''
-        message = bytearray()
-
-        if messageType is not None:
-            message.append(messageType)
-        else:
-            message.append(0)
-
-        if messagePayload is not None:
-            messageString = json.dumps(messagePayload)
-            message.append(len(messageString))
-            message.extend(str.encode(messageString))
-
-        else:
-            message.append(0)
-
-        logging.debug('Turned message type {} payload {} into {}'.format(
-            self.MessageTypes.toString(messageType),
-            messagePayload,
-            binascii.hexlify(message)))
-        return self.ServerSocket.send(message)
-
-
-# COMMMEEMENT METHOD TO CALCULATE HEADING
-def GetHeading(x1, y1, x2, y2):
-    heading = (float)(math.atan2(y2 - y1, x2 - x1))
-    heading = (float)(heading * (180.0 / math.pi))
-    heading = math.fmod(360 - heading, 360)
-    return abs(heading)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.comms import ServerMessageTypes, ServerComms
+from tankbot.tracing import FrameTrace
+from tankbot.geometry import heading
 
 
 # Parse command line args
@@ -171,6 +28,9 @@ else:
 
 # Connect to game server
 GameServer = ServerComms(args.hostname, args.port)
+if args.debug:
+    GameServer.trace = FrameTrace()
+    GameServer.trace.installCrashHandler()
 
 # Spawn our tank
 # logging.info("Creating tank with name '{}'".format(args.name))
@@ -209,5 +69,5 @@ while True:
                 print(tankY)
     if int(round(time.time() * 1000)) - control >= 1000:
         control = int(round(time.time() * 1000))
-        GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': GetHeading(tankX, tankY, 0, 0)})
+        GameServer.sendMessage(ServerMessageTypes.TURNTOHEADING, {'Amount': heading(tankX, tankY, 0, 0)})
         GameServer.sendMessage(ServerMessageTypes.MOVEFORWARDDISTANCE, {'Amount': 50})
@@ -1,43 +1,24 @@
 #!/bin/python
-from numpy import *
-from scipy.optimize import *
 from math import *
-
-def getLine(x, y, b):
-    m = (b - 90) / 360
-    c = y - m * x
-    return m, c
-
-def target(a, b, c, d, speed_e, speed_b, m, k):
-    # a enemy_x
-    # b enemy_y
-    # c me_x
-    # d me_y
-
-    x = 0.0
-    y = 0.0
-
-    a = ( m**2 + 1 ) * ( speed_b - speed_e )
-    b = speed_b * ( -2*c + 2*m*g - 2*m*d ) - speed_e * ( -2*a + 2*m*g - 2*m*b )
-    c = speed_b * ( a**2 + g**2 - 2*g*b + b**2 ) - speed_b * ( a**2 + g**2 - 2*g*d + d**2 )
-
-    x = quadratic(a, b, c)
-    y = m * x + k
-    return x, y
-
-
-def quadratic(a, b, c):
-    return -2*b + Math.sqrt(b**2 - 4*a*c)
-
-def equation(p, a, b, c, d, speed_enemy, speed_bullet, r):
-    x, y = p
-
-    F[0] = sqrt((x-a)**2 + (y-b)) / speed_bullet - ( r * arccos( 1 - (x-c)**2 - (y-d)**2 ) / (2 * r**2) ) / speed_enemy
-    F[1] = (x-a)**2 + (y-b)**2 - r**2
-    return F;
-
-
-def curvedTarget(F):
-    zGuess = array([1,1])
-    z = fsolve(equation, zGuess)
-    return z
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tankbot.geometry import velocities
+from tankbot.intercept import interceptStraight, interceptTurning
+
+def target(enemy_x, enemy_y, me_x, me_y, speed_e, speed_b, heading):
+    # point where a projectile at speed_b meets an enemy driving straight
+    # along heading at speed_e, NaN if it never can
+    vx, vy = velocities(heading, speed_e)
+    _, t = interceptStraight(me_x, me_y, enemy_x, enemy_y, vx, vy, speed_b)
+    return enemy_x + vx * t, enemy_y + vy * t
+
+def curvedTarget(enemy_x, enemy_y, me_x, me_y, speed_e, speed_b, heading, r):
+    # point where a projectile at speed_b meets an enemy driving a circle of
+    # radius r (positive turning right) at speed_e, NaN if it never can
+    turn = degrees(speed_e / r)
+    _, t = interceptTurning(me_x, me_y, enemy_x, enemy_y, heading, speed_e, turn, speed_b)
+    h = radians(heading)
+    w = radians(turn)
+    return enemy_x + r * (sin(h + w * t) - sin(h)), enemy_y + r * (cos(h + w * t) - cos(h))
@@ -0,0 +1,3 @@
+'''
+Shared client code for the TankBot scripts
+'''
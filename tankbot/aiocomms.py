@@ -0,0 +1,134 @@
+import asyncio
+
+from tankbot.comms import FrameBuffer, CommandEncoder, CommandBuffer
+
+
+class ServerProtocol(asyncio.BufferedProtocol, FrameBuffer):
+    '''
+    asyncio protocol speaking the same framing as ServerComms
+
+    The event loop writes straight into the FrameBuffer through get_buffer,
+    and every complete frame is queued for AsyncServerComms.readMessage. A
+    None on the queue marks the end of the connection.
+    '''
+    def __init__(self):
+        self.initReadBuffer()
+        self.messages = asyncio.Queue()
+        self.transport = None
+        self.writable = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.messages.put_nowait(None)
+        self.resume_writing()
+
+    def get_buffer(self, sizehint):
+        return self.writableView()
+
+    def buffer_updated(self, nbytes):
+        self.readEnd += nbytes
+        messages = []
+        self.splitFrames(messages)
+        for message in messages:
+            self.messages.put_nowait(message)
+
+    def pause_writing(self):
+        self.writable = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        if self.writable is not None and not self.writable.done():
+            self.writable.set_result(None)
+        self.writable = None
+
+
+class AsyncServerComms(object):
+    '''
+    Event loop counterpart of ServerComms
+
+    Lets a bot's Main() run as a coroutine next to timers and solvers:
+
+        GameServer = await AsyncServerComms.connect(args.hostname, args.port)
+        Commands = AsyncCommandBuffer(GameServer)
+        await GameServer.sendMessage(ServerMessageTypes.CREATETANK, {'Name': args.name})
+        while True:
+            for message in await GameServer.readMessages():
+                info.update(message)
+            ...
+            await Commands.flush()
+    '''
+    def __init__(self, transport, protocol, encoder=None):
+        self.transport = transport
+        self.protocol = protocol
+        self.encoder = encoder or CommandEncoder()
+
+    @classmethod
+    async def connect(cls, hostname, port, encoder=None):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_connection(ServerProtocol, hostname, port)
+        return cls(transport, protocol, encoder)
+
+    async def readMessage(self):
+        '''
+        Wait for the next message from the server
+        '''
+        message = await self.protocol.messages.get()
+        if message is None:
+            self.protocol.messages.put_nowait(None)
+            raise ConnectionError('Server closed the connection')
+        return message
+
+    async def readMessages(self):
+        '''
+        Wait for at least one message and return every message queued so far
+        '''
+        messages = [await self.readMessage()]
+        queue = self.protocol.messages
+        while not queue.empty():
+            message = queue.get_nowait()
+            if message is None:
+                queue.put_nowait(None)
+                break
+            messages.append(message)
+        return messages
+
+    async def sendMessage(self, messageType=None, messagePayload=None):
+        '''
+        Send a message to the server, waiting only if the transport is backed up
+        '''
+        message = self.encoder.encode(messageType, messagePayload)
+        if self.protocol.trace is not None:
+            self.protocol.trace.record(self.protocol.trace.Sent, message)
+        self.transport.write(message)
+        if self.protocol.writable is not None:
+            await self.protocol.writable
+
+    async def sendFrames(self, frames):
+        '''
+        Send a batch of already encoded frames with a single write
+        '''
+        if self.protocol.trace is not None:
+            for frame in frames:
+                self.protocol.trace.record(self.protocol.trace.Sent, frame)
+        data = b''.join(frames)
+        self.transport.write(data)
+        if self.protocol.writable is not None:
+            await self.protocol.writable
+        return len(data)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCommandBuffer(CommandBuffer):
+    '''
+    CommandBuffer for AsyncServerComms, whose flush() is a coroutine
+    '''
+    async def flush(self):
+        if not self.commands:
+            return 0
+        commands, frames = self.take()
+        sent = await self.comms.sendFrames(frames)
+        self.notify(commands)
+        return sent
@@ -0,0 +1,307 @@
+'''
+Fit the constants in tankbot.physics to recorded matches
+
+Run any bot with -d, stop it with Ctrl-C so it dumps its FrameTrace, and
+feed one or more dumps to
+
+    python -m tankbot.calibrate trace1.txt trace2.txt
+
+Every tank in the OBJECTUPDATE stream contributes. Its updates are cut
+into runs during which it kept driving straight, turning, or slewing its
+turret with the body still; the first and last interval of a run are
+dropped since the motion starts or stops somewhere inside them, and so
+are runs clearly slower than the rest (see saturated()). Each run gives
+one sample, and each constant is the least-squares slope through all of
+them at once:
+
+    tankSpeed         distance driven against time, straight runs
+    turnRate          heading change against time, turning runs
+    turnRadius        distance driven against heading change in radians,
+                      runs both driving and turning
+    turretTurnRate    turret heading change against time, body still
+
+Summing whole runs rather than fitting update to update keeps the jitter
+in when frames arrive from swamping the short intervals.
+
+projectileSpeed comes from our own shots. Every SUCCESSFULLHIT is paired
+with one of the FIREs sent in the maxFlight seconds before it whose line,
+from where we were along the turret heading, passes within hitRadius of
+an enemy where that enemy is when the hit arrives (see flights() for how
+one is picked), and flight times are fitted as distance /
+projectileSpeed plus a constant latency.
+
+Every fit drops samples whose residual exceeds outlier times the median
+absolute residual once and solves again. Constants with at least
+minSamples samples are merged into tankbot.physics.Parameters, which
+tankbot.physics reads on import; the firing table notices the new
+constants and rebuilds itself on the next FiringTable.load().
+'''
+
+import json
+import logging
+import argparse
+import collections
+
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.comms import ServerMessageTypes, decodeMessage
+from tankbot.tracing import FrameTrace, readTrace
+from tankbot.geometry import angleDifferences
+
+numpy = lazyImport('numpy')
+
+
+Fit = collections.namedtuple('Fit', 'value samples rms')
+
+
+class Recording(object):
+    '''
+    Tank poses and our own shots and hits from one FrameTrace dump
+
+    poses maps tank Id to a (samples, 5) array of receive time, X, Y,
+    Heading and TurretHeading. ownId is our tank's Id, found by the name
+    in the CREATETANK we sent (or name, for dumps whose ring has already
+    dropped it), None if neither shows up. fires and hits are the times
+    FIRE was sent and SUCCESSFULLHIT received.
+    '''
+    def __init__(self, path, name=None):
+        samples = collections.defaultdict(list)
+        names = {}
+        self.fires = []
+        self.hits = []
+        for t, direction, messageType, payload in readTrace(path):
+            if direction == FrameTrace.Sent:
+                if messageType == ServerMessageTypes.CREATETANK and name is None:
+                    name = decodeMessage(messageType, payload).get('Name')
+                elif messageType == ServerMessageTypes.FIRE:
+                    self.fires.append(t)
+            elif messageType == ServerMessageTypes.SUCCESSFULLHIT:
+                self.hits.append(t)
+            elif messageType == ServerMessageTypes.OBJECTUPDATE:
+                message = decodeMessage(messageType, payload)
+                if message.get('Type') == 'Tank':
+                    names[message['Id']] = message.get('Name')
+                    samples[message['Id']].append(
+                        (t, message['X'], message['Y'], message['Heading'], message['TurretHeading']))
+        self.poses = dict((tankId, numpy.array(rows, dtype=float)) for tankId, rows in samples.items())
+        self.ownId = next((tankId for tankId, tankName in names.items() if tankName == name), None)
+
+    def at(self, tankId, t, maxGap=0.5):
+        '''
+        (X, Y, TurretHeading) of a tank at time t, interpolated between the
+        updates either side; None unless those are at most maxGap apart
+        '''
+        poses = self.poses[tankId]
+        after = numpy.searchsorted(poses[:, 0], t)
+        if after == 0 or after == len(poses) or poses[after, 0] - poses[after - 1, 0] > maxGap:
+            return None
+        before = poses[after - 1]
+        share = (t - before[0]) / (poses[after, 0] - before[0])
+        x, y = before[1:3] + share * (poses[after, 1:3] - before[1:3])
+        return x, y, before[4] + share * angleDifferences(poses[after, 4], before[4])
+
+
+class Calibrator(object):
+    '''
+    Least-squares fits of the tankbot.physics constants over Recordings
+
+    moveEpsilon (units) and turnEpsilon (degrees) are the smallest changes
+    between two updates that count as moving or turning; runs shorter
+    than minRun seconds after trimming are not used.
+    '''
+    def __init__(self, moveEpsilon=0.01, turnEpsilon=0.01, minRun=0.3, maxFlight=3.0, hitRadius=physics.hitRadius,
+                 speedWindow=0.1, saturation=0.9, outlier=3.0, minSamples=3):
+        self.moveEpsilon = moveEpsilon
+        self.turnEpsilon = turnEpsilon
+        self.minRun = minRun
+        self.maxFlight = maxFlight
+        self.hitRadius = hitRadius
+        self.speedWindow = speedWindow
+        self.saturation = saturation
+        self.outlier = outlier
+        self.minSamples = minSamples
+
+    def runs(self, mask, dt, *values):
+        '''
+        Sums of dt and of each of values over every run of True in mask,
+        less its first and last interval, that is at least minRun long
+        '''
+        edges = numpy.flatnonzero(numpy.diff(numpy.concatenate([[0], mask.astype(int), [0]])))
+        sums = [[] for _ in range(len(values) + 1)]
+        for start, stop in zip(edges[::2] + 1, edges[1::2] - 1):
+            if stop > start and dt[start:stop].sum() >= self.minRun:
+                for column, series in zip(sums, (dt,) + values):
+                    column.append(series[start:stop].sum())
+        return [numpy.array(column) for column in sums]
+
+    def kinematics(self, recordings):
+        '''
+        Per-run samples for the four kinematic fits, as (x, y) arrays keyed
+        by constant
+        '''
+        samples = collections.defaultdict(list)
+        for recording in recordings:
+            for poses in recording.poses.values():
+                dt = numpy.diff(poses[:, 0])
+                moved = numpy.hypot(numpy.diff(poses[:, 1]), numpy.diff(poses[:, 2]))
+                turned = numpy.abs(angleDifferences(poses[1:, 3], poses[:-1, 3]))
+                slewed = numpy.abs(angleDifferences(poses[1:, 4], poses[:-1, 4]))
+                # a gap in the updates breaks every run
+                valid = (dt > 0) & (dt < 0.5)
+                moving = valid & (moved > self.moveEpsilon)
+                turning = valid & (turned > self.turnEpsilon)
+                still = valid & ~turning
+                samples['tankSpeed'].append(self.runs(moving & ~turning, dt, moved))
+                samples['turnRate'].append(self.runs(turning, dt, turned))
+                _, arc, angle = self.runs(moving & turning, dt, moved, numpy.radians(turned))
+                samples['turnRadius'].append((angle, arc))
+                samples['turretTurnRate'].append(self.runs(still & (slewed > self.turnEpsilon), dt, slewed))
+        samples = dict((name, tuple(numpy.concatenate(column) for column in zip(*runs)))
+                       for name, runs in samples.items())
+        for name in ('tankSpeed', 'turnRate', 'turretTurnRate'):
+            # a recording without tank updates has no samples at all
+            if name in samples:
+                samples[name] = self.saturated(*samples[name])
+        return samples
+
+    def saturated(self, time, change):
+        '''
+        The runs that went at close to full rate
+
+        A turret tracking a moving aim, or a tank sent short distances,
+        reaches its target inside most intervals and so looks slower than
+        it is for whole runs. Nothing looks faster, so only runs within
+        saturation of the rate most runs reach (the 90th percentile) are
+        kept.
+        '''
+        rate = change / time
+        keep = rate >= self.saturation * numpy.percentile(rate, 90) if len(rate) else rate > 0
+        return time[keep], change[keep]
+
+    def candidates(self, recording):
+        '''
+        (hit, fire, distance, flight time) for every FIRE in the last
+        maxFlight seconds before a hit whose line passes within hitRadius
+        of an enemy
+        '''
+        if recording.ownId is None:
+            return []
+        shooters = [recording.at(recording.ownId, fired) for fired in recording.fires]
+        fires = numpy.array(recording.fires)
+        found = []
+        for hit, landed in enumerate(recording.hits):
+            targets = [position for position in (recording.at(tankId, landed) for tankId in recording.poses
+                                                 if tankId != recording.ownId) if position is not None]
+            for fire in numpy.flatnonzero((fires > landed - self.maxFlight) & (fires < landed)):
+                reach = None if shooters[fire] is None else self.reach(shooters[fire], targets)
+                if reach is not None:
+                    found.append((hit, fire, reach[0], landed - fires[fire]))
+        return found
+
+    def flights(self, recordings):
+        '''
+        (distance, flight time) of every shot matched to a hit
+
+        A target that holds still or keeps its line is crossed by every
+        shot aimed at it, so geometry alone leaves most hits with several
+        candidate shots. The right ones agree on the projectile speed
+        they imply, and the wrong ones scatter: each hit takes the
+        candidate closest to the speed most candidates agree on to within
+        speedWindow (as a fraction), and each shot is used once.
+        '''
+        found = [(index,) + candidate for index, recording in enumerate(recordings)
+                 for candidate in self.candidates(recording)]
+        if not found:
+            return numpy.zeros(0), numpy.zeros(0)
+        speeds = numpy.log([reach / flight for _, _, _, reach, flight in found])
+        support = (numpy.abs(speeds[:, None] - speeds[None, :]) < self.speedWindow).sum(axis=1)
+        mode = speeds[support.argmax()]
+        distance, flight, hits, fires = [], [], set(), set()
+        for order in numpy.argsort(numpy.abs(speeds - mode)):
+            index, hit, fire, reach, time = found[order]
+            if abs(speeds[order] - mode) >= self.speedWindow:
+                break
+            if (index, hit) not in hits and (index, fire) not in fires:
+                hits.add((index, hit))
+                fires.add((index, fire))
+                distance.append(reach)
+                flight.append(time)
+        return numpy.array(distance), numpy.array(flight)
+
+    def reach(self, shooter, targets):
+        '''
+        (distance along, distance across) the line of a shot from shooter
+        to the target closest to it, None if none is within hitRadius
+        '''
+        x, y, heading = shooter
+        dx, dy = numpy.cos(numpy.radians(heading)), -numpy.sin(numpy.radians(heading))
+        best = None
+        for targetX, targetY, _ in targets:
+            along = (targetX - x) * dx + (targetY - y) * dy
+            across = abs((targetX - x) * dy - (targetY - y) * dx)
+            if along > 0 and across <= self.hitRadius and (best is None or across < best[1]):
+                best = along, across
+        return best
+
+    def leastSquares(self, design, target):
+        '''
+        Least-squares coefficients of target on the columns of design,
+        refitted once without outliers, with the samples kept and the RMS
+        residual
+        '''
+        keep = numpy.ones(len(target), dtype=bool)
+        for _ in range(2):
+            coefficients = numpy.linalg.lstsq(design[keep], target[keep], rcond=None)[0]
+            residual = numpy.abs(design @ coefficients - target)
+            keep = residual <= max(self.outlier * numpy.median(residual[keep]), 1e-12)
+        return coefficients, int(keep.sum()), float(numpy.sqrt(numpy.mean(numpy.square(residual[keep]))))
+
+    def fit(self, recordings):
+        '''
+        Fit per constant name, for the constants with enough samples
+        '''
+        fits = {}
+        for name, (x, y) in self.kinematics(recordings).items():
+            if len(x) >= self.minSamples:
+                (value,), samples, rms = self.leastSquares(x[:, None], y)
+                fits[name] = Fit(float(value), samples, rms)
+        distance, flight = self.flights(recordings)
+        if len(distance) >= self.minSamples and numpy.ptp(distance) > 0:
+            (slowness, latency), samples, rms = self.leastSquares(
+                numpy.stack([distance, numpy.ones_like(distance)], axis=1), flight)
+            fits['projectileSpeed'] = Fit(float(1.0 / slowness), samples, rms)
+            # round trip latency, less the time the projectile saves by hitting the edge of the tank
+            logging.info('Flight times are off distance / projectileSpeed by a constant %.3f s', latency)
+        return fits
+
+
+def write(fits, path=physics.Parameters):
+    '''
+    Merge fitted constants into the parameter file at path, keeping any
+    constant fitted earlier that these recordings did not cover
+    '''
+    parameters = physics.load(path)
+    parameters.update((name, fit.value) for name, fit in fits.items())
+    with open(path, 'w') as stream:
+        json.dump(parameters, stream, indent=4, sort_keys=True)
+        stream.write('\n')
+    logging.info('Wrote %s', path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('traces', nargs='+', help='FrameTrace dumps')
+    parser.add_argument('-n', '--name', help='Name our tank was created with, if the dumps no longer show it')
+    parser.add_argument('-o', '--output', default=physics.Parameters, help='Parameter file to write')
+    parser.add_argument('--dry-run', action='store_true', help='Report the fits without writing them')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+    fits = Calibrator().fit([Recording(path, args.name) for path in args.traces])
+    for name, fit in sorted(fits.items()):
+        logging.info('%-16s %9.4f (was %9.4f) from %4d samples, RMS residual %.4f',
+                     name, fit.value, getattr(physics, name), fit.samples, fit.rms)
+    if not fits:
+        logging.warning('Nothing to fit in %s', ', '.join(args.traces))
+    elif not args.dry_run:
+        write(fits, args.output)
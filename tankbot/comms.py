@@ -0,0 +1,405 @@
+import json
+import time
+import select
+import socket
+import decimal
+import collections
+
+
+class ServerMessageTypes(object):
+    TEST = 0
+    CREATETANK = 1
+    DESPAWNTANK = 2
+    FIRE = 3
+    TOGGLEFORWARD = 4
+    TOGGLEREVERSE = 5
+    TOGGLELEFT = 6
+    TOGGLERIGHT = 7
+    TOGGLETURRETLEFT = 8
+    TOGGLETURRETRIGHT = 9
+    TURNTURRETTOHEADING = 10
+    TURNTOHEADING = 11
+    MOVEFORWARDDISTANCE = 12
+    MOVEBACKWARSDISTANCE = 13
+    STOPALL = 14
+    STOPTURN = 15
+    STOPMOVE = 16
+    STOPTURRET = 17
+    OBJECTUPDATE = 18
+    HEALTHPICKUP = 19
+    AMMOPICKUP = 20
+    SNITCHPICKUP = 21
+    DESTROYED = 22
+    ENTEREDGOAL = 23
+    KILL = 24
+    SNITCHAPPEARED = 25
+    GAMETIMEUPDATE = 26
+    HITDETECTED = 27
+    SUCCESSFULLHIT = 28
+
+    strings = {
+        TEST: "TEST",
+        CREATETANK: "CREATETANK",
+        DESPAWNTANK: "DESPAWNTANK",
+        FIRE: "FIRE",
+        TOGGLEFORWARD: "TOGGLEFORWARD",
+        TOGGLEREVERSE: "TOGGLEREVERSE",
+        TOGGLELEFT: "TOGGLELEFT",
+        TOGGLERIGHT: "TOGGLERIGHT",
+        TOGGLETURRETLEFT: "TOGGLETURRETLEFT",
+        TOGGLETURRETRIGHT: "TOGGLETURRENTRIGHT",
+        TURNTURRETTOHEADING: "TURNTURRETTOHEADING",
+        TURNTOHEADING: "TURNTOHEADING",
+        MOVEFORWARDDISTANCE: "MOVEFORWARDDISTANCE",
+        MOVEBACKWARSDISTANCE: "MOVEBACKWARDSDISTANCE",
+        STOPALL: "STOPALL",
+        STOPTURN: "STOPTURN",
+        STOPMOVE: "STOPMOVE",
+        STOPTURRET: "STOPTURRET",
+        OBJECTUPDATE: "OBJECTUPDATE",
+        HEALTHPICKUP: "HEALTHPICKUP",
+        AMMOPICKUP: "AMMOPICKUP",
+        SNITCHPICKUP: "SNITCHPICKUP",
+        DESTROYED: "DESTROYED",
+        ENTEREDGOAL: "ENTEREDGOAL",
+        KILL: "KILL",
+        SNITCHAPPEARED: "SNITCHAPPEARED",
+        GAMETIMEUPDATE: "GAMETIMEUPDATE",
+        HITDETECTED: "HITDETECTED",
+        SUCCESSFULLHIT: "SUCCESSFULLHIT"
+    }
+
+    def toString(self, id):
+        if id in self.strings.keys():
+            return self.strings[id]
+        else:
+            return "??UNKNOWN??"
+
+
+def decodeMessage(messageType, messageData):
+    '''
+    Turn the type byte and JSON payload of one frame into a message dict
+
+    messageData may be bytes or a memoryview into the read buffer; it is
+    decoded straight to str without an intermediate bytes copy.
+    '''
+    if len(messageData) == 0:
+        messagePayload = {'messageType': messageType}
+    else:
+        messagePayload = json.loads(str(messageData, 'utf-8'))
+        messagePayload['messageType'] = messageType
+    return messagePayload
+
+
+class CommandEncoder(object):
+    '''
+    Turns outgoing messages into frames, reusing prebuilt ones where it can
+
+    Parameterless commands map to a cached two byte frame. Heading commands
+    come from a table with one frame per quantum step around the circle and
+    distance commands from one covering 0 to maxDistance, so the hot path is
+    a lookup instead of json.dumps. The tables start empty and each frame is
+    built the first time it is asked for, keeping their cost off the path
+    to CREATETANK. Amounts are rounded to the quantum either way. Any other
+    payload, and an Amount that is NaN, infinite or not a number, goes
+    through json.dumps. Every payload is checked against the 255 byte
+    limit of the length byte.
+    '''
+    HeadingCommands = (ServerMessageTypes.TURNTOHEADING, ServerMessageTypes.TURNTURRETTOHEADING)
+    DistanceCommands = (ServerMessageTypes.MOVEFORWARDDISTANCE, ServerMessageTypes.MOVEBACKWARSDISTANCE)
+    MaxPayloadSize = 255
+
+    def __init__(self, quantum=0.1, maxDistance=300):
+        self.quantum = quantum
+        self.decimals = max(0, -decimal.Decimal(str(quantum)).normalize().as_tuple().exponent)
+        self.headingSteps = int(round(360 / quantum))
+        self.fixedFrames = dict((messageType, bytes((messageType, 0)))
+                                for messageType in ServerMessageTypes.strings)
+        self.amountFrames = {}
+        for messageType in self.HeadingCommands:
+            self.amountFrames[messageType] = [None] * self.headingSteps
+        for messageType in self.DistanceCommands:
+            self.amountFrames[messageType] = [None] * (int(round(maxDistance / quantum)) + 1)
+
+    def frame(self, messageType, payload):
+        if len(payload) > self.MaxPayloadSize:
+            raise ValueError('{} payload is {} bytes, the protocol allows at most {}'.format(
+                ServerMessageTypes.strings.get(messageType, messageType), len(payload), self.MaxPayloadSize))
+        return bytes((messageType, len(payload))) + payload
+
+    def amountFrame(self, messageType, step):
+        payload = '{{"Amount": {:.{}f}}}'.format(step * self.quantum, self.decimals)
+        return self.frame(messageType, payload.encode('utf-8'))
+
+    def encode(self, messageType=None, messagePayload=None):
+        '''
+        Build the type/length/payload frame for one outgoing message
+        '''
+        if messageType is None:
+            messageType = 0
+
+        if messagePayload is None:
+            frame = self.fixedFrames.get(messageType)
+            if frame is None:
+                frame = self.frame(messageType, b'')
+            return frame
+
+        table = self.amountFrames.get(messageType)
+        if table is not None and len(messagePayload) == 1 and 'Amount' in messagePayload:
+            try:
+                step = int(round(messagePayload['Amount'] / self.quantum))
+            except (ValueError, OverflowError, TypeError):
+                # NaN, infinite or not a number at all: sent as json.dumps
+                # writes it, as it was before there were tables
+                step = None
+            if step is not None:
+                if messageType in self.HeadingCommands:
+                    step %= self.headingSteps
+                elif not 0 <= step < len(table):
+                    return self.amountFrame(messageType, step)
+                frame = table[step]
+                if frame is None:
+                    frame = table[step] = self.amountFrame(messageType, step)
+                return frame
+
+        return self.frame(messageType, json.dumps(messagePayload).encode('utf-8'))
+
+
+class FrameBuffer(object):
+    '''
+    Preallocated read buffer that incoming bytes are written into in place
+
+    The owner fills readView[readEnd:] and advances readEnd; splitFrames then
+    decodes every complete frame between readStart and readEnd from memoryview
+    slices. A trailing partial frame is moved back to the front only when
+    there is no longer room for a whole frame behind it.
+
+    Set trace to a tankbot.tracing.FrameTrace to record raw frames; nothing
+    is formatted or copied for tracing while it is None.
+    '''
+    MessageTypes = ServerMessageTypes()
+    RecvSize = 65536
+    MaxFrameSize = 2 + 255
+    trace = None
+
+    def initReadBuffer(self):
+        self.readBuffer = bytearray(self.RecvSize)
+        self.readView = memoryview(self.readBuffer)
+        self.readStart = 0
+        self.readEnd = 0
+
+    def writableView(self):
+        '''
+        Return the free tail of the buffer, compacting first if it is too short
+        '''
+        if self.RecvSize - self.readEnd < self.MaxFrameSize:
+            remaining = self.readEnd - self.readStart
+            self.readView[:remaining] = self.readView[self.readStart:self.readEnd]
+            self.readStart = 0
+            self.readEnd = remaining
+        return self.readView[self.readEnd:]
+
+    def splitFrames(self, messages):
+        '''
+        Decode every complete frame in the read buffer into messages
+        '''
+        buffer = self.readBuffer
+        view = self.readView
+        trace = self.trace
+        offset = self.readStart
+        readEnd = self.readEnd
+        while readEnd - offset >= 2:
+            messageType = buffer[offset]
+            end = offset + 2 + buffer[offset + 1]
+            if readEnd < end:
+                break
+
+            if trace is not None:
+                trace.record(trace.Received, view[offset:end])
+            messages.append(decodeMessage(messageType, view[offset + 2:end]))
+            offset = end
+
+        if offset == readEnd:
+            offset = readEnd = 0
+        self.readStart = offset
+        self.readEnd = readEnd
+
+
+class ServerComms(FrameBuffer):
+    '''
+    TCP comms handler
+
+    Server protocol is simple:
+
+    * 1st byte is the message type - see ServerMessageTypes
+    * 2nd byte is the length in bytes of the payload (so max 255 byte payload)
+    * 3rd byte onwards is the payload encoded in JSON
+
+    Reads go through the FrameBuffer with recv_into, so one syscall can
+    deliver any number of frames.
+    '''
+    ServerSocket = None
+
+    def __init__(self, hostname, port, encoder=None):
+        self.ServerSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.ServerSocket.connect((hostname, port))
+        self.encoder = encoder or CommandEncoder()
+        self.initReadBuffer()
+        self.pending = collections.deque()
+
+    def readMessages(self, timeout=None):
+        '''
+        Read every message the server has sent so far
+
+        Blocks until at least one complete frame has arrived and returns all
+        complete frames as a list of decoded payloads, oldest first. With a
+        timeout (seconds) it gives up after that long and returns whatever it
+        has, possibly nothing, so a caller can run its own fixed tick.
+        '''
+        if self.pending:
+            messages = list(self.pending)
+            self.pending.clear()
+            return messages
+
+        messages = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not messages:
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+                if not select.select([self.ServerSocket], [], [], remaining)[0]:
+                    break
+            received = self.ServerSocket.recv_into(self.writableView())
+            if received == 0:
+                raise ConnectionError('Server closed the connection')
+            self.readEnd += received
+            self.splitFrames(messages)
+        return messages
+
+    def readMessage(self):
+        '''
+        Read a message from the server
+        '''
+        if not self.pending:
+            self.pending.extend(self.readMessages())
+        return self.pending.popleft()
+
+    def sendMessage(self, messageType=None, messagePayload=None):
+        '''
+        Send a message to the server
+        '''
+        message = self.encoder.encode(messageType, messagePayload)
+        if self.trace is not None:
+            self.trace.record(self.trace.Sent, message)
+        return self.ServerSocket.send(message)
+
+    def sendFrames(self, frames):
+        '''
+        Send a batch of already encoded frames with a single sendall
+        '''
+        if self.trace is not None:
+            for frame in frames:
+                self.trace.record(self.trace.Sent, frame)
+        data = b''.join(frames)
+        self.ServerSocket.sendall(data)
+        return len(data)
+
+
+class CommandBuffer(object):
+    '''
+    Collects one tick's commands and sends them to the server in one go
+
+    Drop-in for ServerComms.sendMessage: commands are queued until flush(),
+    which encodes whatever is still pending and hands it to sendFrames. A
+    queued command is dropped as soon as a later one in the same tick makes
+    it redundant, e.g. a second TURNTOHEADING or a STOPALL. Toggles and FIRE
+    are never dropped by a command of their own type, since repeating them
+    is not a no-op, and nothing that moves the turret is dropped once a
+    FIRE has been queued after it: that shot leaves along the heading it
+    set.
+
+    Callables in observers are called after every flush with the commands
+    that were actually sent and the time they went out, e.g. to dead-reckon
+    our own tank from them.
+    '''
+    Supersedes = {
+        ServerMessageTypes.TURNTOHEADING: (
+            ServerMessageTypes.TURNTOHEADING,),
+        ServerMessageTypes.TURNTURRETTOHEADING: (
+            ServerMessageTypes.TURNTURRETTOHEADING,),
+        ServerMessageTypes.MOVEFORWARDDISTANCE: (
+            ServerMessageTypes.MOVEFORWARDDISTANCE,
+            ServerMessageTypes.MOVEBACKWARSDISTANCE),
+        ServerMessageTypes.MOVEBACKWARSDISTANCE: (
+            ServerMessageTypes.MOVEFORWARDDISTANCE,
+            ServerMessageTypes.MOVEBACKWARSDISTANCE),
+        ServerMessageTypes.STOPTURN: (
+            ServerMessageTypes.TURNTOHEADING,
+            ServerMessageTypes.TOGGLELEFT,
+            ServerMessageTypes.TOGGLERIGHT,
+            ServerMessageTypes.STOPTURN),
+        ServerMessageTypes.STOPMOVE: (
+            ServerMessageTypes.MOVEFORWARDDISTANCE,
+            ServerMessageTypes.MOVEBACKWARSDISTANCE,
+            ServerMessageTypes.TOGGLEFORWARD,
+            ServerMessageTypes.TOGGLEREVERSE,
+            ServerMessageTypes.STOPMOVE),
+        ServerMessageTypes.STOPTURRET: (
+            ServerMessageTypes.TURNTURRETTOHEADING,
+            ServerMessageTypes.TOGGLETURRETLEFT,
+            ServerMessageTypes.TOGGLETURRETRIGHT,
+            ServerMessageTypes.STOPTURRET),
+    }
+    Supersedes[ServerMessageTypes.STOPALL] = tuple(set(
+        Supersedes[ServerMessageTypes.STOPTURN] +
+        Supersedes[ServerMessageTypes.STOPMOVE] +
+        Supersedes[ServerMessageTypes.STOPTURRET] +
+        (ServerMessageTypes.STOPALL,)))
+    Aiming = (
+        ServerMessageTypes.TURNTURRETTOHEADING,
+        ServerMessageTypes.TOGGLETURRETLEFT,
+        ServerMessageTypes.TOGGLETURRETRIGHT,
+        ServerMessageTypes.STOPTURRET)
+
+    def __init__(self, comms):
+        self.comms = comms
+        self.commands = []
+        self.observers = []
+
+    def sendMessage(self, messageType=None, messagePayload=None):
+        '''
+        Queue a message for the next flush
+        '''
+        redundant = self.Supersedes.get(messageType)
+        if redundant:
+            fired = max((index for index, command in enumerate(self.commands)
+                         if command[0] == ServerMessageTypes.FIRE), default=-1)
+            self.commands = [command for index, command in enumerate(self.commands)
+                             if command[0] not in redundant or (index < fired and command[0] in self.Aiming)]
+        self.commands.append((messageType, messagePayload))
+
+    def flush(self):
+        '''
+        Send every queued message in one write and start a new tick
+        '''
+        if not self.commands:
+            return 0
+        commands, frames = self.take()
+        sent = self.comms.sendFrames(frames)
+        self.notify(commands)
+        return sent
+
+    def take(self):
+        '''
+        The queued commands and their frames, leaving the queue empty
+        '''
+        encode = self.comms.encoder.encode
+        frames = [encode(messageType, messagePayload) for messageType, messagePayload in self.commands]
+        commands = self.commands
+        self.commands = []
+        return commands, frames
+
+    def notify(self, commands):
+        if self.observers:
+            now = time.time()
+            for observer in self.observers:
+                observer(commands, now)
@@ -0,0 +1,158 @@
+import math
+
+from tankbot import physics
+from tankbot.comms import ServerMessageTypes
+from tankbot.geometry import angleDifference, normalizeHeading
+
+
+class SelfPredictor(object):
+    '''
+    Best guess of our own tank's pose between server updates
+
+    Every OBJECTUPDATE for our tank (correct()) resets the pose to what the
+    server reported. Every batch of commands flushed by a CommandBuffer
+    (onCommands(), meant to be added to its observers) changes what the
+    tank is doing: driving a distance or until stopped, turning towards a
+    heading or until stopped, and likewise for the turret. advance() plays
+    those motions forward with the calibrated speeds from tankbot.physics,
+    so refresh() can move a Tank record on to any instant.
+
+    Motion is piecewise constant: between the moments a turn reaches its
+    heading or a drive uses up its distance the body moves on an arc (or a
+    straight line), which is integrated exactly rather than in small steps.
+    Headings follow tankbot.geometry, so turning right increases heading.
+    '''
+    def __init__(self, tankSpeed=physics.tankSpeed, turnRate=physics.turnRate, turretTurnRate=physics.turretTurnRate):
+        self.tankSpeed = tankSpeed
+        self.turnRate = turnRate
+        self.turretTurnRate = turretTurnRate
+
+        self.t = None
+        self.known = False  # no server update seen yet
+        self.X = self.Y = self.Heading = self.TurretHeading = 0.0
+        self.velocity = 0.0  # signed units per second
+        self.distance = 0.0  # left to drive; math.inf while toggled
+        self.turn = 0  # +1 right, -1 left, 0 still
+        self.turnTarget = None  # heading the turn stops at, None while toggled
+        self.turretTurn = 0
+        self.turretTarget = None
+
+        self.handlers = {
+            ServerMessageTypes.TOGGLEFORWARD: lambda amount: self.drive(1, math.inf),
+            ServerMessageTypes.TOGGLEREVERSE: lambda amount: self.drive(-1, math.inf),
+            ServerMessageTypes.MOVEFORWARDDISTANCE: lambda amount: self.drive(1, amount),
+            ServerMessageTypes.MOVEBACKWARSDISTANCE: lambda amount: self.drive(-1, amount),
+            ServerMessageTypes.STOPMOVE: lambda amount: self.drive(0, 0.0),
+            ServerMessageTypes.TOGGLELEFT: lambda amount: self.turnBody(-1, None),
+            ServerMessageTypes.TOGGLERIGHT: lambda amount: self.turnBody(1, None),
+            ServerMessageTypes.TURNTOHEADING: self.turnBodyTo,
+            ServerMessageTypes.STOPTURN: lambda amount: self.turnBody(0, None),
+            ServerMessageTypes.TOGGLETURRETLEFT: lambda amount: self.turnTurret(-1, None),
+            ServerMessageTypes.TOGGLETURRETRIGHT: lambda amount: self.turnTurret(1, None),
+            ServerMessageTypes.TURNTURRETTOHEADING: self.turnTurretTo,
+            ServerMessageTypes.STOPTURRET: lambda amount: self.turnTurret(0, None),
+            ServerMessageTypes.STOPALL: self.stop,
+        }
+
+    def correct(self, tank, now):
+        '''
+        Take the server's word for the pose; commands in progress carry on
+        '''
+        self.advance(now)
+        self.X = tank.X
+        self.Y = tank.Y
+        self.Heading = tank.Heading
+        self.TurretHeading = tank.TurretHeading
+        self.known = True
+
+    def onCommands(self, commands, now):
+        self.advance(now)
+        for messageType, messagePayload in commands:
+            handler = self.handlers.get(messageType)
+            if handler is not None:
+                handler(messagePayload['Amount'] if messagePayload else None)
+
+    def drive(self, direction, distance):
+        self.velocity = direction * self.tankSpeed
+        self.distance = distance
+
+    def turnBody(self, direction, target):
+        self.turn = direction
+        self.turnTarget = target
+
+    def turnBodyTo(self, heading):
+        self.turnBody(1 if angleDifference(heading, self.Heading) > 0 else -1, normalizeHeading(heading))
+
+    def turnTurret(self, direction, target):
+        self.turretTurn = direction
+        self.turretTarget = target
+
+    def turnTurretTo(self, heading):
+        self.turnTurret(1 if angleDifference(heading, self.TurretHeading) > 0 else -1, normalizeHeading(heading))
+
+    def stop(self, amount=None):
+        self.drive(0, 0.0)
+        self.turnBody(0, None)
+        self.turnTurret(0, None)
+
+    def advance(self, now):
+        '''
+        Move the pose and the commands in progress on to now
+        '''
+        if self.t is not None and now > self.t:
+            self.advanceBody(now - self.t)
+            self.advanceTurret(now - self.t)
+        self.t = now
+
+    def advanceBody(self, dt):
+        while dt > 0 and (self.velocity or self.turn):
+            step = dt
+            if self.velocity:
+                step = min(step, self.distance / abs(self.velocity))
+            if self.turn and self.turnTarget is not None:
+                step = min(step, abs(angleDifference(self.turnTarget, self.Heading)) / self.turnRate)
+
+            rate = math.radians(self.turn * self.turnRate)
+            h0 = math.radians(self.Heading)
+            h1 = h0 + rate * step
+            # heading h moves along (cos h, -sin h)
+            if rate:
+                self.X += self.velocity / rate * (math.sin(h1) - math.sin(h0))
+                self.Y += self.velocity / rate * (math.cos(h1) - math.cos(h0))
+            else:
+                self.X += self.velocity * math.cos(h0) * step
+                self.Y -= self.velocity * math.sin(h0) * step
+            self.Heading = normalizeHeading(math.degrees(h1))
+            self.distance -= abs(self.velocity) * step
+            dt -= step
+
+            if self.velocity and self.distance <= 1e-9:
+                self.drive(0, 0.0)
+            if self.turnTarget is not None and abs(angleDifference(self.turnTarget, self.Heading)) <= 1e-9:
+                self.Heading = self.turnTarget
+                self.turnBody(0, None)
+
+    def advanceTurret(self, dt):
+        if not self.turretTurn:
+            return
+        swept = self.turretTurnRate * dt
+        if self.turretTarget is not None:
+            left = abs(angleDifference(self.turretTarget, self.TurretHeading))
+            if swept >= left:
+                self.TurretHeading = self.turretTarget
+                self.turnTurret(0, None)
+                return
+        self.TurretHeading = normalizeHeading(self.TurretHeading + self.turretTurn * swept)
+
+    def refresh(self, tank, now):
+        '''
+        Write the pose predicted for now into tank (a Tank record)
+        '''
+        if not self.known:
+            return tank
+        self.advance(now)
+        tank.X = self.X
+        tank.Y = self.Y
+        tank.Heading = self.Heading
+        tank.TurretHeading = self.TurretHeading
+        return tank
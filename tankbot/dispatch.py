@@ -0,0 +1,142 @@
+import logging
+
+from tankbot.comms import ServerMessageTypes
+
+ObjectUpdate = ServerMessageTypes.OBJECTUPDATE
+
+# the Type values the server sends in OBJECTUPDATE
+ObjectTypes = ('Tank', 'HealthPickup', 'AmmoPickup', 'Snitch')
+
+
+class MessageDispatcher(object):
+    '''
+    Routes decoded server messages to handlers keyed on (messageType, Type)
+
+    Type is the object type carried by OBJECTUPDATE ('Tank', 'HealthPickup',
+    ...) and None for every other message. Only OBJECTUPDATE looks Type
+    up, in a table of its own; everything else is one lookup on
+    messageType. Subscribing to (OBJECTUPDATE, None) receives every object
+    update whatever its Type.
+
+    Both tables start with an empty entry for every kind the server is
+    known to send, so a kind nobody subscribed to is dropped by the same
+    lookup that finds a handler. Only kinds missing from ObjectTypes or
+    ServerMessageTypes go to unknown(), which logs them at DEBUG.
+
+    A key with several subscribers maps to a small fan-out function
+    instead of a list, keeping the single subscriber case free of any
+    loop. dispatchAll() routes a whole batch from readMessages() in one
+    call, which is what lets it undercut an inline if/elif chain: the
+    chain pays one call per message, dispatchAll one handler call.
+    '''
+    def __init__(self):
+        self.subscribers = {}
+        self.handlers = dict.fromkeys(ServerMessageTypes.strings)  # messageType -> handler
+        self.objectHandlers = dict.fromkeys(ObjectTypes)  # OBJECTUPDATE Type -> handler
+        self.anyObject = None  # handler for (OBJECTUPDATE, None)
+        self.dispatch, self.dispatchAll = self.routers()
+
+    def subscribe(self, messageType, objectType=None, handler=None):
+        '''
+        Call handler(message) for every message of this kind
+
+        Without a handler this returns a decorator, so strategies can write
+
+            @info.dispatcher.subscribe(ServerMessageTypes.KILL)
+            def onKill(message):
+                ...
+        '''
+        if handler is None:
+            def decorator(function):
+                self.subscribe(messageType, objectType, function)
+                return function
+            return decorator
+
+        key = (messageType, objectType)
+        self.subscribers.setdefault(key, []).append(handler)
+        self.rebuild(key)
+        return handler
+
+    def unsubscribe(self, messageType, objectType, handler):
+        key = (messageType, objectType)
+        handlers = self.subscribers.get(key, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        self.rebuild(key)
+
+    def combine(self, *keys):
+        '''
+        One callable for every subscriber of keys, or None if there are none
+        '''
+        handlers = tuple(handler for key in keys for handler in self.subscribers.get(key, ()))
+        if not handlers:
+            return None
+        if len(handlers) == 1:
+            return handlers[0]
+
+        def fanOut(message):
+            for handler in handlers:
+                handler(message)
+        return fanOut
+
+    def rebuild(self, key):
+        if not self.subscribers.get(key):
+            self.subscribers.pop(key, None)
+        messageType, objectType = key
+        if messageType != ObjectUpdate:
+            self.handlers[messageType] = self.combine(key)
+            return
+        wildcard = (ObjectUpdate, None)
+        self.anyObject = self.combine(wildcard)
+        objectTypes = set(ObjectTypes).union(self.objectHandlers)
+        for entry in objectTypes if objectType is None else (objectType,):
+            handler = self.combine((ObjectUpdate, entry), wildcard)
+            if handler is None and entry not in ObjectTypes:
+                self.objectHandlers.pop(entry, None)
+            else:
+                self.objectHandlers[entry] = handler
+
+    def unknown(self, message):
+        '''
+        A messageType or object Type the dispatcher has never heard of
+        '''
+        if message['messageType'] == ObjectUpdate and self.anyObject is not None:
+            self.anyObject(message)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug('Unrecognized message type: %s', message)
+
+    def routers(self):
+        '''
+        (dispatch, dispatchAll) as closures over the handler tables
+
+        rebuild() only ever changes the tables in place, so the closures
+        built once in __init__ stay current and every lookup they make is a
+        local or a closure variable rather than an attribute of self.
+        '''
+        handlers = self.handlers.get
+        objectHandlers = self.objectHandlers.get
+        unknown = self.unknown
+
+        def dispatch(message):
+            messageType = message['messageType']
+            if messageType == ObjectUpdate:
+                handler = objectHandlers(message['Type'], unknown)
+            else:
+                handler = handlers(messageType, unknown)
+            if handler is not None:
+                handler(message)
+
+        def dispatchAll(messages):
+            '''
+            dispatch() every message of a batch, oldest first
+            '''
+            for message in messages:
+                messageType = message['messageType']
+                if messageType == ObjectUpdate:
+                    handler = objectHandlers(message['Type'], unknown)
+                else:
+                    handler = handlers(messageType, unknown)
+                if handler is not None:
+                    handler(message)
+
+        return dispatch, dispatchAll
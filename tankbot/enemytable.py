@@ -0,0 +1,160 @@
+import time
+
+from tankbot.lazy import lazyImport
+from tankbot.geometry import headings, distances, angleDifferences
+from tankbot.history import MotionHistory
+from tankbot.tracker import MotionTracker
+from tankbot.motion import MotionClassifier
+
+numpy = lazyImport('numpy')
+
+
+class EnemyTable(object):
+    '''
+    Struct-of-arrays store for enemy tanks
+
+    Every tracked tank owns one row across the column arrays below, found
+    through rowOf (Id -> row). Rows of removed tanks go on a free list and
+    are handed out again before the table grows, and active marks which
+    rows hold a live tank. Per-enemy questions (distance, bearing, threat)
+    are answered for all rows in one NumPy pass; rows() gives the active
+    row indices those results should be read at.
+
+    history keeps each row's recent timestamped poses (see MotionHistory),
+    tracker filters them into smoothed state estimates (see MotionTracker)
+    and motion labels how each tank is moving (see MotionClassifier); all
+    three are reset whenever a row is handed to a new tank, and step()
+    brings the last two up to date once a tick.
+
+    It also behaves enough like the old Id -> message dict for the bots:
+    len(), truthiness, `Id in table` and iteration over Ids all work.
+    '''
+    Columns = ('X', 'Y', 'Heading', 'TurretHeading', 'Health', 'Ammo', 'lastSeen')
+
+    def __init__(self, capacity=16, historyLength=16):
+        self.capacity = 0
+        self.history = MotionHistory(0, historyLength)
+        self.tracker = MotionTracker(0)
+        self.motion = MotionClassifier(0)
+        self.active = numpy.zeros(0, dtype=bool)
+        for column in self.Columns:
+            setattr(self, column, numpy.zeros(0))
+        self.ids = []
+        self.rowOf = {}
+        self.freeRows = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        self.active = numpy.concatenate([self.active, numpy.zeros(extra, dtype=bool)])
+        for column in self.Columns:
+            setattr(self, column, numpy.concatenate([getattr(self, column), numpy.zeros(extra)]))
+        self.ids.extend([None] * extra)
+        self.freeRows.extend(reversed(range(self.capacity, capacity)))
+        self.history.grow(capacity)
+        self.tracker.grow(capacity)
+        self.motion.grow(capacity)
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.rowOf)
+
+    def __bool__(self):
+        return bool(self.rowOf)
+
+    def __contains__(self, Id):
+        return Id in self.rowOf
+
+    def __iter__(self):
+        return iter(list(self.rowOf))
+
+    def update(self, message, now=None):
+        '''
+        Write an OBJECTUPDATE for a tank into its row, returning the row
+        '''
+        row = self.rowOf.get(message['Id'])
+        if row is None:
+            row = self.allocate(message['Id'])
+        if now is None:
+            now = time.time()
+        self.X[row] = message['X']
+        self.Y[row] = message['Y']
+        self.Heading[row] = message['Heading']
+        self.TurretHeading[row] = message['TurretHeading']
+        self.Health[row] = message['Health']
+        self.Ammo[row] = message['Ammo']
+        self.lastSeen[row] = now
+        self.history.push(row, now, message['X'], message['Y'], message['Heading'])
+        self.tracker.observe(row, now, message['X'], message['Y'], message['Heading'])
+        return row
+
+    def step(self):
+        '''
+        Fold the updates since the last step into the tracker and the
+        motion labels, returning the rows updated
+        '''
+        rows = self.tracker.step()
+        self.motion.update(self.history, rows)
+        return rows
+
+    def allocate(self, Id):
+        if not self.freeRows:
+            self.grow(self.capacity * 2)
+        row = self.freeRows.pop()
+        self.rowOf[Id] = row
+        self.ids[row] = Id
+        self.active[row] = True
+        self.history.reset(row)
+        self.tracker.reset(row)
+        self.motion.reset(row)
+        return row
+
+    def remove(self, Id):
+        row = self.rowOf.pop(Id, None)
+        if row is not None:
+            self.active[row] = False
+            self.ids[row] = None
+            self.freeRows.append(row)
+        return row
+
+    def expire(self, cutoff):
+        '''
+        Remove every tank last seen before cutoff, returning their Ids
+        '''
+        expired = [self.ids[row] for row in numpy.flatnonzero(self.active & (self.lastSeen < cutoff))]
+        for Id in expired:
+            self.remove(Id)
+        return expired
+
+    def rows(self):
+        return numpy.flatnonzero(self.active)
+
+    def distances(self, x, y):
+        return distances(x, y, self.X, self.Y)
+
+    def bearings(self, x, y):
+        '''
+        Heading from (x, y) to every row
+        '''
+        return headings(x, y, self.X, self.Y)
+
+    def threat(self, x, y):
+        '''
+        Rough danger each row poses to a tank at (x, y)
+
+        Health over range (floored at 1), scaled from 1 when its turret points
+        straight at (x, y) down to 0 when it points directly away, and 0 for
+        an enemy without ammo.
+        '''
+        aimError = numpy.radians(angleDifferences(self.TurretHeading, headings(self.X, self.Y, x, y)))
+        aiming = (1.0 + numpy.cos(aimError)) / 2.0
+        return aiming * (self.Ammo > 0) * self.Health / numpy.maximum(self.distances(x, y), 1.0)
+
+    def nearest(self, x, y):
+        '''
+        Id of the closest tracked tank, or None if the table is empty
+        '''
+        rows = self.rows()
+        if len(rows) == 0:
+            return None
+        return self.ids[rows[numpy.argmin(self.distances(x, y)[rows])]]
@@ -0,0 +1,69 @@
+import time
+
+
+class Entity(object):
+    '''
+    Last known state of one object from OBJECTUPDATE messages
+
+    Records are created once per Id and then updated in place, so reading a
+    field is an attribute load rather than a dict lookup. Field names match
+    the server's JSON keys. lastSeen is the local time.time() of the last
+    update.
+    '''
+    __slots__ = ('Id', 'X', 'Y', 'lastSeen')
+
+    def __init__(self, message, now=None):
+        self.Id = message['Id']
+        self.update(message, now)
+
+    def update(self, message, now=None):
+        self.X = message['X']
+        self.Y = message['Y']
+        self.lastSeen = time.time() if now is None else now
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name, None)) for name in self.fields()))
+
+    @classmethod
+    def fields(cls):
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(getattr(klass, '__slots__', ()))
+        return names
+
+
+class Tank(Entity):
+    __slots__ = ('Name', 'Heading', 'TurretHeading', 'Health', 'Ammo')
+
+    def update(self, message, now=None):
+        Entity.update(self, message, now)
+        self.Name = message['Name']
+        self.Heading = message['Heading']
+        self.TurretHeading = message['TurretHeading']
+        self.Health = message['Health']
+        self.Ammo = message['Ammo']
+
+
+class Pickup(Entity):
+    __slots__ = ('Type',)
+
+    def update(self, message, now=None):
+        Entity.update(self, message, now)
+        self.Type = message['Type']
+
+
+class Snitch(Entity):
+    __slots__ = ()
+
+
+def track(records, recordType, message, now=None):
+    '''
+    Update the record for message['Id'] in records, creating it if needed
+    '''
+    record = records.get(message['Id'])
+    if record is None:
+        record = records[message['Id']] = recordType(message, now)
+    else:
+        record.update(message, now)
+    return record
@@ -0,0 +1,64 @@
+import heapq
+import itertools
+
+
+class ExpiryIndex(object):
+    '''
+    Forgets keys that have not been touched for lifetime seconds
+
+    Deadlines live in a min-heap with at most one entry per key. touch()
+    only moves the key's real deadline in a dict, it does not touch the
+    heap; when the heap entry comes due, expire() either finds the real
+    deadline has moved on and re-arms it, or reports the key as expired.
+    A tick where nothing is due costs one comparison, and otherwise only
+    the due entries are visited, each at most once per lifetime.
+    '''
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.heap = []
+        self.deadlines = {}
+        self.armed = set()
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def touch(self, key, now, lifetime=None):
+        '''
+        Push key's deadline to now + lifetime (default self.lifetime). A key
+        should keep the same lifetime across touches: the heap entry is only
+        re-armed later, never earlier.
+        '''
+        deadline = now + (self.lifetime if lifetime is None else lifetime)
+        self.deadlines[key] = deadline
+        if key not in self.armed:
+            self.armed.add(key)
+            heapq.heappush(self.heap, (deadline, next(self.sequence), key))
+
+    def remove(self, key):
+        '''
+        Stop tracking key; its heap entry is dropped when it comes due
+        '''
+        self.deadlines.pop(key, None)
+
+    def expire(self, now):
+        '''
+        Return every key whose deadline has passed and stop tracking them
+        '''
+        expired = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            _, _, key = heapq.heappop(heap)
+            deadline = self.deadlines.get(key)
+            if deadline is None:
+                self.armed.discard(key)
+            elif deadline > now:
+                heapq.heappush(heap, (deadline, next(self.sequence), key))
+            else:
+                del self.deadlines[key]
+                self.armed.discard(key)
+                expired.append(key)
+        return expired
@@ -0,0 +1,157 @@
+import math
+import collections
+
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.geometry import headings, distances, angleDifferences, normalizeHeadings
+from tankbot.turret import TurretModel
+from tankbot.motion import MotionClassifier
+from tankbot.intercept import interceptTurning
+
+numpy = lazyImport('numpy')
+
+
+Shot = collections.namedtuple('Shot', 'row heading flightTime probability fireIn turn fire')
+
+
+class FireControl(object):
+    '''
+    Picks one enemy to shoot at per tick from all tracked enemies at once
+
+    For every EnemyTable row it looks up a firing solution (FiringTable),
+    the time the turret needs to slew onto it, and the probability of a
+    hit: the chance that the target ends up within hitRadius of where we
+    aim, taking the tracker's position uncertainty at the moment of impact
+    (now + slew + flight) as a circular Gaussian error around it. Each
+    enemy is scored by expected hits per second spent on it, probability /
+    (slew + flight + reactionTime), and the best one wins.
+
+    For the winner the firing solution is looked up once more a moment
+    later to get how fast the aim point swings, and a TurretModel works
+    out where the turret should wait for it and when the turret comes
+    within the angle the target's hit circle covers at that range. aim()
+    returns a Shot: the row, the turret heading to command, the flight
+    time, the hit probability, the seconds until the turret is within that
+    angle, whether TURNTURRETTOHEADING needs (re)sending and whether to
+    fire this tick.
+    '''
+    def __init__(self, firingTable, hitRadius=physics.hitRadius, turretTurnRate=physics.turretTurnRate,
+                 reactionTime=0.1, minProbability=0.1, tickTime=0.05, hitEstimator=None, leadCorrector=None):
+        '''
+        reactionTime keeps near-instant shots from dominating the score.
+        tickTime is how often aim() gets called, in seconds. With a
+        HitEstimator, hit probabilities are sampled rather than taken from
+        the Gaussian approximation, and the fire gate is the probability
+        that a shot along the turret's actual heading hits instead of an
+        angle tolerance. With a LeadCorrector, every lead goes through its
+        learned corrections and every shot fired is reported to it.
+        '''
+        self.firingTable = firingTable
+        self.hitEstimator = hitEstimator
+        self.leadCorrector = leadCorrector
+        self.hitRadius = hitRadius
+        self.turret = TurretModel(turretTurnRate)
+        self.reactionTime = reactionTime
+        self.minProbability = minProbability
+        self.tickTime = tickTime
+
+    def leads(self, enemies, tank, rows, now):
+        '''
+        (headings, flight times, shifts) to hit rows from tank when fired
+        at now, shifts being what the LeadCorrector added to each heading
+
+        Tanks the EnemyTable's MotionClassifier calls still, straight or
+        turning on full lock are looked up in the firing table; only the
+        erratic ones are solved with interceptTurning on the tracker's own
+        turn rate. A LeadCorrector then adjusts every lead.
+        '''
+        xs, ys, speeds, enemyHeadings, turnRates, _ = enemies.tracker.estimate(rows, now)
+        motion = enemies.motion.label[rows]
+        speeds = numpy.where(motion == MotionClassifier.Still, 0.0, speeds)
+        turns = numpy.select([motion == MotionClassifier.Left, motion == MotionClassifier.Right], [-1, 1], 0)
+        aims, flights = self.firingTable.solve(tank.X, tank.Y, xs, ys, enemyHeadings, speeds, turns)
+        erratic = motion == MotionClassifier.Erratic
+        if erratic.any():
+            aims[erratic], flights[erratic] = interceptTurning(tank.X, tank.Y, xs[erratic], ys[erratic],
+                                                               enemyHeadings[erratic], speeds[erratic],
+                                                               turnRates[erratic])
+        if self.leadCorrector is None:
+            return aims, flights, numpy.zeros_like(aims)
+        bearings = headings(tank.X, tank.Y, xs, ys)
+        leads = angleDifferences(aims, bearings)
+        shifts = self.leadCorrector.apply(leads, distances(tank.X, tank.Y, xs, ys), motion) - leads
+        return normalizeHeadings(aims + shifts), flights, shifts
+
+    def solutions(self, enemies, tank, now, rows=None):
+        '''
+        (rows, headings, flight times, slew times, hit probabilities,
+        correction shifts) for rows (every tracked enemy by default), NaN
+        where there is no solution
+        '''
+        rows = enemies.rows() if rows is None else numpy.asarray(rows, dtype=int)
+        aims, flights, shifts = self.leads(enemies, tank, rows, now)
+        slews = self.turret.convergence(tank.TurretHeading, aims, 0.0)
+        if self.hitEstimator is not None:
+            # rows without a solution are sampled as of now; they score NaN anyway
+            cloud = self.hitEstimator.cloud(enemies.tracker, tank.X, tank.Y, rows, now + numpy.nan_to_num(slews), flights)
+            # the cloud knows nothing of corrections, so undo them to compare
+            return rows, aims, flights, slews, self.hitEstimator.probability(cloud, aims - shifts), shifts
+        sigma = enemies.tracker.estimate(rows, now + slews + flights)[5]
+        # sigma² sums both axes' variances, so each axis has sigma² / 2 and
+        # P(|error| < r) = 1 - exp(-r² / sigma²)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            probability = 1.0 - numpy.exp(-self.hitRadius ** 2 / sigma ** 2)
+        return rows, aims, flights, slews, probability, shifts
+
+    def aim(self, enemies, tank, now, commanded=None, rows=None):
+        '''
+        The Shot to take from tank (a Tank record) this tick, or None if no
+        tracked enemy has a solution
+
+        commanded is the heading the turret is still turning to from an
+        earlier command (SelfPredictor.turretTarget), None once it is idle;
+        rows limits the choice to some enemies.
+        '''
+        rows, aims, flights, slews, probability, shifts = self.solutions(enemies, tank, now, rows)
+        score = probability / (slews + flights + self.reactionTime)
+        if not numpy.isfinite(score).any():
+            return None
+        best = numpy.nanargmax(score)
+        row, aim = rows[best], aims[best]
+
+        later, _, _ = self.leads(enemies, tank, rows[best:best + 1], now + self.tickTime)
+        aimRate = numpy.nan_to_num(angleDifferences(later[0], aim) / self.tickTime)
+        xs, ys = enemies.tracker.estimate(rows[best:best + 1], now)[:2]
+        distance = distances(tank.X, tank.Y, xs[0], ys[0])
+        tolerance = math.degrees(math.atan2(self.hitRadius, distance))
+        heading, _ = self.turret.meeting(tank.TurretHeading, aim, aimRate, tolerance)
+        fireIn = self.turret.convergence(tank.TurretHeading, aim, aimRate, tolerance)
+
+        aimNext = aim + aimRate * self.tickTime
+        gap = angleDifferences(aim, tank.TurretHeading)
+        if commanded is None:
+            # an idle turret is only sent off again when the aim point will
+            # not sweep into tolerance by itself before the next tick
+            turn = abs(gap) > tolerance and abs(angleDifferences(aimNext, tank.TurretHeading)) > tolerance
+        else:
+            turn = abs(angleDifferences(heading, commanded)) > tolerance
+        # fire inside tolerance on the tick closest to where the gap crosses
+        # zero, or on any tick where waiting would not bring it closer: once
+        # the aim has swept past, or while the turret holds it steady
+        gapNext = angleDifferences(aimNext, self.turret.advance(tank.TurretHeading, heading if turn else commanded,
+                                                               self.tickTime))
+        aligned = abs(gapNext) >= abs(gap) or abs(gap / (gap - gapNext)) <= 0.5
+        if self.hitEstimator is None:
+            onTarget = probability[best] >= self.minProbability and abs(gap) <= tolerance
+        else:
+            cloud = self.hitEstimator.cloud(enemies.tracker, tank.X, tank.Y, rows[best:best + 1], now,
+                                            flights[best:best + 1])
+            chance = self.hitEstimator.probability(cloud, [tank.TurretHeading - shifts[best]])[0]
+            onTarget = chance >= self.minProbability
+        fire = tank.Ammo > 0 and onTarget and aligned
+        if self.leadCorrector is not None:
+            self.leadCorrector.resolve(now)
+            if fire:
+                self.leadCorrector.fired(now, flights[best], distance, enemies.motion.label[row])
+        return Shot(int(row), float(heading), float(flights[best]), float(probability[best]), float(fireIn),
+                    bool(turn), bool(fire))
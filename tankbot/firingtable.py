@@ -0,0 +1,164 @@
+'''
+Precomputed firing solutions, memory-mapped from disk
+
+The intercept problem only depends on where the target is and how it
+moves relative to the line of sight, so one table covers every shot: it
+is keyed by turn direction (left, straight, right on full lock), target
+speed, the target's heading relative to the line of sight and range, and
+holds the lead (firing heading minus line-of-sight heading) and the time
+to impact. Lookups interpolate linearly between grid points on every
+continuous axis, which makes a tick's worth of enemies one gather and a
+weighted sum.
+
+Tables are generated with tankbot.intercept from the constants in
+tankbot.physics. The file name carries a digest of those constants and
+the grid, so a change to either builds a fresh table on the next load.
+Build one ahead of time with
+
+    python -m tankbot.firingtable
+'''
+
+import os
+import hashlib
+import logging
+
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.geometry import headings, distances, angleDifferences, normalizeHeadings
+from tankbot.intercept import interceptStraight, interceptTurning
+
+numpy = lazyImport('numpy')
+
+
+class FiringTable(object):
+    Directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+    Turns = (-1, 0, 1)
+
+    def __init__(self, values, maxRange, rangeStep, bearingStep, speedStep):
+        '''
+        values is the (turn, speed, bearing, range, 2) array of lead and time
+        '''
+        self.values = values
+        self.maxRange = maxRange
+        self.rangeStep = rangeStep
+        self.bearingStep = bearingStep
+        self.speedStep = speedStep
+        self.offsets = self.cornerOffsets(values.shape[2], values.shape[3])
+
+    @staticmethod
+    def grid(maxRange, rangeStep, bearingStep, speedStep):
+        ranges = numpy.arange(0.0, maxRange + rangeStep / 2.0, rangeStep)
+        bearings = numpy.arange(-180.0, 180.0 + bearingStep / 2.0, bearingStep)
+        speeds = numpy.arange(0.0, physics.tankSpeed + speedStep / 2.0, speedStep)
+        return ranges, bearings, speeds
+
+    @classmethod
+    def build(cls, maxRange=250.0, rangeStep=2.5, bearingStep=5.0, speedStep=1.0):
+        '''
+        Solve every grid point: shooter at the origin, target range units
+        along heading 0, driving at bearing relative to that line
+        '''
+        ranges, bearings, speeds = cls.grid(maxRange, rangeStep, bearingStep, speedStep)
+        turn, speed, bearing, distance = numpy.meshgrid(
+            numpy.array(cls.Turns, dtype=float), speeds, bearings, ranges, indexing='ij')
+        heading, time = interceptTurning(0.0, 0.0, distance, 0.0, bearing, speed, turn * physics.turnRate)
+        values = numpy.stack([angleDifferences(heading, 0.0), time], axis=-1)
+        # the turning solver approximates a straight line with a very slow
+        # turn; the straight rows get the exact closed form instead
+        straight = cls.Turns.index(0)
+        vx, vy = numpy.cos(numpy.radians(bearing[straight])) * speed[straight], \
+            -numpy.sin(numpy.radians(bearing[straight])) * speed[straight]
+        heading, time = interceptStraight(0.0, 0.0, distance[straight], 0.0, vx, vy)
+        values[straight] = numpy.stack([angleDifferences(heading, 0.0), time], axis=-1)
+        return cls(values.astype(numpy.float32), maxRange, rangeStep, bearingStep, speedStep)
+
+    @classmethod
+    def path(cls, maxRange, rangeStep, bearingStep, speedStep, directory=None):
+        key = repr((physics.tankSpeed, physics.projectileSpeed, physics.turnRate,
+                    maxRange, rangeStep, bearingStep, speedStep)).encode()
+        return os.path.join(directory or cls.Directory,
+                            'firing-{}.npy'.format(hashlib.sha1(key).hexdigest()[:12]))
+
+    @classmethod
+    def load(cls, maxRange=250.0, rangeStep=2.5, bearingStep=5.0, speedStep=1.0, directory=None):
+        '''
+        Memory-map the table for the current physics, building it first if
+        there is none on disk yet
+        '''
+        path = cls.path(maxRange, rangeStep, bearingStep, speedStep, directory)
+        if not os.path.exists(path):
+            logging.info('Building firing table %s', path)
+            table = cls.build(maxRange, rangeStep, bearingStep, speedStep)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write under a temporary name so a concurrent load never maps half a file
+            partial = '{}.{}.partial'.format(path, os.getpid())
+            with open(partial, 'wb') as stream:
+                numpy.save(stream, table.values)
+            os.replace(partial, path)
+        return cls(numpy.load(path, mmap_mode='r'), maxRange, rangeStep, bearingStep, speedStep)
+
+    def solve(self, shooterX, shooterY, targetX, targetY, targetHeading, targetSpeed, turn):
+        '''
+        (heading, time) to fire along and until impact, like
+        tankbot.intercept, for targets turning on full lock in direction
+        turn (-1 left, 0 straight, 1 right); NaN beyond the table's range
+        '''
+        bearing = headings(shooterX, shooterY, targetX, targetY)
+        distance = distances(shooterX, shooterY, targetX, targetY)
+        targetSpeed = numpy.asarray(targetSpeed, dtype=float)
+        # a tank in reverse traces the same curve as one driving forwards
+        # facing the other way, turning the same way
+        targetHeading = numpy.where(targetSpeed < 0, numpy.add(targetHeading, 180.0), targetHeading)
+        relative = angleDifferences(targetHeading, bearing)
+        turn = numpy.rint(numpy.nan_to_num(turn)).astype(int) + 1
+        lead, time = self.lookup(turn, numpy.abs(targetSpeed), relative, distance)
+        return normalizeHeadings(bearing + lead), time
+
+    def lookup(self, turn, speed, relative, distance):
+        '''
+        Interpolated (lead, time) at grid coordinates, NaN for queries
+        that are out of range or incomplete
+
+        The 8 surrounding grid points of every query are gathered from the
+        flattened table in one take and blended in one einsum.
+        '''
+        turn, speed, relative, distance = numpy.broadcast_arrays(turn, speed, relative, distance)
+        shape = distance.shape
+        _, speeds, bearings, ranges, _ = self.values.shape
+        valid = numpy.isfinite(speed) & numpy.isfinite(relative) & (distance <= self.maxRange)
+        turn, speed, relative, distance = (numpy.where(valid, column, 0) for column in (turn, speed, relative, distance))
+        s, sw = self.split(speed.ravel() / self.speedStep, speeds)
+        b, bw = self.split((relative.ravel() + 180.0) / self.bearingStep, bearings)
+        r, rw = self.split(distance.ravel() / self.rangeStep, ranges)
+        base = ((turn.ravel() * speeds + s) * bearings + b) * ranges + r
+        corners = self.values.reshape(-1, 2)[base[:, None] + self.offsets]
+        weights = (numpy.stack([1.0 - sw, sw], axis=1)[:, :, None, None] *
+                   numpy.stack([1.0 - bw, bw], axis=1)[:, None, :, None] *
+                   numpy.stack([1.0 - rw, rw], axis=1)[:, None, None, :]).reshape(-1, 8)
+        result = numpy.einsum('nk,nkc->nc', weights, corners)
+        return (numpy.where(valid, result[:, 0].reshape(shape), numpy.nan),
+                numpy.where(valid, result[:, 1].reshape(shape), numpy.nan))
+
+    @staticmethod
+    def cornerOffsets(bearings, ranges):
+        '''
+        Flat offsets from a grid point to the 8 corners of its cell, in the
+        (speed, bearing, range) order lookup() builds its weights in
+        '''
+        return numpy.array([(ds * bearings + db) * ranges + dr
+                            for ds in (0, 1) for db in (0, 1) for dr in (0, 1)])
+
+    @staticmethod
+    def split(position, size):
+        '''
+        Lower grid index and fraction towards the next, clamped to the grid
+        '''
+        position = numpy.clip(position, 0.0, size - 1.0)
+        index = numpy.minimum(position.astype(int), size - 2)
+        return index, position - index
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='[%(asctime)s] %(message)s', level=logging.INFO)
+    table = FiringTable.load()
+    logging.info('Firing table %s ready', table.values.shape)
@@ -0,0 +1,77 @@
+'''
+Angle convention: headings are in degrees in [0, 360), measured the way the
+server does it, i.e. clockwise from the +X axis, so a heading h points
+along (cos h, -sin h). Differences between headings are in [-180, 180),
+positive when getting from the second heading to the first means turning
+right (clockwise).
+
+Every function comes in two forms. The plural one (headings, distances,
+...) accepts scalars or NumPy arrays and broadcasts; the singular one
+(heading, distance, ...) takes plain floats and uses math, which is
+what a bot script wants for one pair of points, since a NumPy call on
+scalars costs an order of magnitude more. Both give the same results.
+'''
+
+import math
+
+from tankbot.lazy import lazyImport
+
+numpy = lazyImport('numpy')
+
+
+def normalizeHeadings(heading):
+    '''
+    heading wrapped into [0, 360)
+    '''
+    heading = numpy.mod(heading, 360.0)
+    # the modulo of a tiny negative rounds up to 360 itself
+    return numpy.where(heading < 360.0, heading, 0.0)
+
+
+def normalizeHeading(heading):
+    heading = heading % 360.0
+    return heading if heading < 360.0 else 0.0
+
+
+def headings(x1, y1, x2, y2):
+    '''
+    Heading from (x1, y1) towards (x2, y2)
+    '''
+    return normalizeHeadings(-numpy.degrees(numpy.arctan2(numpy.subtract(y2, y1), numpy.subtract(x2, x1))))
+
+
+def heading(x1, y1, x2, y2):
+    return normalizeHeading(-math.degrees(math.atan2(y2 - y1, x2 - x1)))
+
+
+def distances(x1, y1, x2, y2):
+    return numpy.hypot(numpy.subtract(x2, x1), numpy.subtract(y2, y1))
+
+
+def distance(x1, y1, x2, y2):
+    return math.hypot(x2 - x1, y2 - y1)
+
+
+def angleDifferences(a, b):
+    '''
+    Signed smallest rotation from heading b to heading a, in [-180, 180)
+    '''
+    return normalizeHeadings(numpy.subtract(a, b) + 180.0) - 180.0
+
+
+def angleDifference(a, b):
+    return normalizeHeading(a - b + 180.0) - 180.0
+
+
+def velocities(heading, speed):
+    '''
+    (vx, vy) of something moving at speed along heading; with speed a
+    distance, the offset of the point that far along heading
+    '''
+    h = numpy.radians(heading)
+    return numpy.multiply(speed, numpy.cos(h)), -numpy.multiply(speed, numpy.sin(h))
+
+
+def velocity(heading, speed):
+    h = math.radians(heading)
+    return speed * math.cos(h), -speed * math.sin(h)
@@ -0,0 +1,137 @@
+from tankbot.lazy import lazyImport
+from tankbot.geometry import angleDifferences
+
+numpy = lazyImport('numpy')
+
+
+class MotionHistory(object):
+    '''
+    The last `length` timestamped poses of every tracked tank
+
+    One ring per row, stored as (rows, length) arrays for t, X, Y and
+    Heading, so memory is fixed no matter how long a match runs. Rows line
+    up with EnemyTable rows. head[row] is where the next sample goes and
+    count[row] how many of the slots hold real samples.
+
+    The estimators fit least-squares lines through each row's most recent
+    samples (fewer if the row has fewer), all rows in one NumPy pass, and
+    return NaN for rows without enough samples.
+    '''
+    Columns = ('t', 'X', 'Y', 'Heading')
+
+    def __init__(self, rows=16, length=16):
+        self.length = length
+        self.rows = 0
+        for column in self.Columns:
+            setattr(self, column, numpy.zeros((0, length)))
+        self.head = numpy.zeros(0, dtype=int)
+        self.count = numpy.zeros(0, dtype=int)
+        self.grow(rows)
+
+    def grow(self, rows):
+        extra = rows - self.rows
+        for column in self.Columns:
+            setattr(self, column, numpy.concatenate([getattr(self, column), numpy.zeros((extra, self.length))]))
+        self.head = numpy.concatenate([self.head, numpy.zeros(extra, dtype=int)])
+        self.count = numpy.concatenate([self.count, numpy.zeros(extra, dtype=int)])
+        self.rows = rows
+
+    def reset(self, row):
+        self.head[row] = 0
+        self.count[row] = 0
+
+    def push(self, row, t, x, y, heading):
+        slot = self.head[row]
+        self.t[row, slot] = t
+        self.X[row, slot] = x
+        self.Y[row, slot] = y
+        self.Heading[row, slot] = heading
+        self.head[row] = (slot + 1) % self.length
+        if self.count[row] < self.length:
+            self.count[row] += 1
+
+    def recent(self, rows, window, skip=0):
+        '''
+        Slot indices of `window` samples per row, oldest first, ending `skip`
+        samples before the newest, and a mask of which hold real samples
+        '''
+        steps = numpy.arange(-window, 0) - skip
+        slots = (self.head[rows, None] + steps) % self.length
+        valid = steps >= -self.count[rows, None]
+        return slots, valid
+
+    def samples(self, row):
+        '''
+        (t, X, Y, Heading) arrays for one row, oldest first
+        '''
+        slots, valid = self.recent(numpy.array([row]), self.length)
+        slots = slots[0][valid[0]]
+        return self.t[row, slots], self.X[row, slots], self.Y[row, slots], self.Heading[row, slots]
+
+    def fit(self, rows, slots, valid, values):
+        '''
+        Least-squares slope of each row of values against time, and the mean
+        sample time it is centred on
+        '''
+        weight = valid.astype(float)
+        n = weight.sum(axis=1)
+        t = self.t[rows[:, None], slots]
+        tMean = (weight * t).sum(axis=1) / numpy.maximum(n, 1)
+        dt = (t - tMean[:, None]) * weight
+        spread = (dt * dt).sum(axis=1)
+        ok = (n >= 2) & (spread > 0)
+        slope = (dt * values).sum(axis=1) / numpy.where(ok, spread, 1.0)
+        return numpy.where(ok, slope, numpy.nan), tMean
+
+    def velocity(self, rows, window=4, skip=0):
+        '''
+        (vx, vy) in units per second
+        '''
+        rows = numpy.asarray(rows)
+        slots, valid = self.recent(rows, window, skip)
+        vx, _ = self.fit(rows, slots, valid, self.X[rows[:, None], slots])
+        vy, _ = self.fit(rows, slots, valid, self.Y[rows[:, None], slots])
+        return vx, vy
+
+    def turnRate(self, rows, window=4):
+        '''
+        Heading change in degrees per second, positive for clockwise
+        '''
+        return self.turnFit(rows, window)[0]
+
+    def turnFit(self, rows, window=4):
+        '''
+        (turnRate, residual): the heading change like turnRate() and the
+        root mean square distance in degrees of the samples from that
+        straight line, i.e. how badly a constant turn explains them
+        '''
+        rows = numpy.asarray(rows)
+        slots, valid = self.recent(rows, window)
+        heading = self.Heading[rows[:, None], slots]
+        # unwrap across the 0/360 seam relative to the oldest sample
+        steps = angleDifferences(heading[:, 1:], heading[:, :-1])
+        unwrapped = numpy.concatenate([heading[:, :1], heading[:, :1] + numpy.cumsum(steps, axis=1)], axis=1)
+        rate, tMean = self.fit(rows, slots, valid, unwrapped)
+        weight = valid.astype(float)
+        n = numpy.maximum(weight.sum(axis=1), 1)
+        mean = (weight * unwrapped).sum(axis=1) / n
+        line = mean[:, None] + rate[:, None] * (self.t[rows[:, None], slots] - tMean[:, None])
+        residual = numpy.sqrt((weight * (unwrapped - line) ** 2).sum(axis=1) / n)
+        return rate, residual
+
+    def acceleration(self, rows, window=8):
+        '''
+        (ax, ay) in units per second squared, from the change in velocity
+        between the older and the newer half of the window
+        '''
+        rows = numpy.asarray(rows)
+        half = window // 2
+        newSlots, newValid = self.recent(rows, half)
+        oldSlots, oldValid = self.recent(rows, half, skip=half)
+        result = []
+        for column in (self.X, self.Y):
+            newRate, newTime = self.fit(rows, newSlots, newValid, column[rows[:, None], newSlots])
+            oldRate, oldTime = self.fit(rows, oldSlots, oldValid, column[rows[:, None], oldSlots])
+            span = newTime - oldTime
+            result.append((newRate - oldRate) / numpy.where(span > 0, span, numpy.nan))
+        return result
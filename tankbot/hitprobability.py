@@ -0,0 +1,90 @@
+import collections
+
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.geometry import angleDifferences
+from tankbot.intercept import interceptTurning
+
+numpy = lazyImport('numpy')
+
+
+Cloud = collections.namedtuple('Cloud', 'rows tracked headings times tolerances')
+
+
+class HitEstimator(object):
+    '''
+    Monte Carlo hit probabilities from the MotionTracker's uncertainty
+
+    cloud() draws `samples` plausible states per enemy from the tracker's
+    Gaussian estimate at the moment of firing and solves every one of them
+    with interceptTurning in one batch, so each sample becomes the heading
+    that would hit it and the angle its hit circle covers at the range the
+    projectile meets it. probability() then says, for any set of candidate
+    turret headings, what fraction of samples a shot along each one hits:
+    a (rows, candidates) comparison against the cloud, which is cheap
+    enough to score every enemy's lead and the turret's actual heading
+    each tick.
+
+    The tracker's covariance only covers what it knows now; while the
+    projectile is in flight the target can still change speed and turn.
+    Each sample's speed and turn rate are spread further by the tracker's
+    own acceleration noise over the expected flight time, treated as a
+    constant change over the flight, which has half the effect of that
+    change arriving at once.
+    '''
+    def __init__(self, samples=1000, hitRadius=physics.hitRadius, projectileSpeed=physics.projectileSpeed, seed=None):
+        self.samples = samples
+        self.hitRadius = hitRadius
+        self.projectileSpeed = projectileSpeed
+        self.rng = numpy.random.default_rng(seed)
+
+    def sample(self, tracker, rows, now, flightTime=0.0):
+        '''
+        (x, y, speed, heading, turnRate) arrays of shape (rows, samples)
+        from a MotionTracker, heading in degrees and turnRate in degrees per second, drawn for
+        now with the in-flight spread for flightTime seconds (scalar or per
+        row) added; rows the tracker has never updated come back NaN
+        '''
+        rows = numpy.asarray(rows, dtype=int)
+        state, covariance = tracker.predict(rows, now - tracker.t[rows])
+        spread = numpy.broadcast_to(numpy.nan_to_num(numpy.asarray(flightTime, dtype=float)), (len(rows),)) / 2.0
+        covariance = covariance.copy()
+        covariance[:, 2, 2] += (tracker.accelerationNoise * spread) ** 2
+        covariance[:, 4, 4] += (tracker.turnNoise * spread) ** 2
+        # a touch of jitter keeps the Cholesky factor defined for rows
+        # whose covariance has collapsed onto a measured axis
+        factor = numpy.linalg.cholesky(covariance + 1e-9 * numpy.eye(tracker.States))
+        noise = self.rng.standard_normal((len(rows), self.samples, tracker.States))
+        draws = state[:, None, :] + numpy.einsum('nij,nkj->nki', factor, noise)
+        draws[~tracker.initialised[rows]] = numpy.nan
+        x, y, v, h, w = numpy.moveaxis(draws, 2, 0)
+        return x, y, v, numpy.degrees(h), numpy.degrees(w)
+
+    def cloud(self, tracker, shooterX, shooterY, rows, now, flightTime=0.0):
+        '''
+        Solve every sample of rows for a shot fired from (shooterX,
+        shooterY) at now
+        '''
+        rows = numpy.asarray(rows, dtype=int)
+        x, y, v, h, w = self.sample(tracker, rows, now, flightTime)
+        aims, times = interceptTurning(shooterX, shooterY, x, y, h, v, w, self.projectileSpeed)
+        with numpy.errstate(invalid='ignore'):
+            tolerances = numpy.degrees(numpy.arctan2(self.hitRadius, self.projectileSpeed * times))
+        return Cloud(rows, tracker.initialised[rows], aims, times, tolerances)
+
+    def probability(self, cloud, candidates):
+        '''
+        Fraction of each row's samples hit by a shot along each candidate
+        heading; candidates is one heading per row (rows,) or several
+        (rows, k), and the result has the same shape. Samples without a
+        solution count as misses; rows never tracked are NaN.
+        '''
+        candidates = numpy.asarray(candidates, dtype=float)
+        # line the samples up behind the candidate axis, if there is one
+        extra = (1,) * (candidates.ndim - 1)
+        aims = cloud.headings.reshape((len(cloud.rows),) + extra + (-1,))
+        tolerances = cloud.tolerances.reshape(aims.shape)
+        with numpy.errstate(invalid='ignore'):
+            hit = numpy.abs(angleDifferences(candidates[..., None], aims)) <= tolerances
+        tracked = cloud.tracked.reshape((-1,) + extra)
+        return numpy.where(tracked, hit.mean(axis=-1), numpy.nan)
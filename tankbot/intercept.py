@@ -0,0 +1,107 @@
+'''
+Where to aim a projectile so it meets a moving target
+'''
+
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.geometry import headings
+
+numpy = lazyImport('numpy')
+
+
+def interceptStraight(shooterX, shooterY, targetX, targetY, targetVx, targetVy,
+                      projectileSpeed=physics.projectileSpeed):
+    '''
+    Aim for a target moving in a straight line at constant velocity
+
+    Returns (heading, time) to fire along and when the projectile arrives,
+    one per target; every argument may be a scalar or an array and they
+    broadcast together. Both are NaN where the projectile can never catch
+    the target.
+
+    With d the offset from shooter to target and v its velocity, the hit
+    time is the smallest t > 0 with |d + v t| = projectileSpeed t, i.e. a
+    root of (v.v - s²) t² + 2 (d.v) t + d.d = 0.
+    '''
+    dx = numpy.subtract(targetX, shooterX)
+    dy = numpy.subtract(targetY, shooterY)
+    a = numpy.square(targetVx) + numpy.square(targetVy) - projectileSpeed ** 2
+    b = 2.0 * (dx * targetVx + dy * targetVy)
+    c = dx * dx + dy * dy
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        root = numpy.sqrt(b * b - 4.0 * a * c)
+        # q-form roots avoid cancellation when b² >> 4ac
+        q = -0.5 * (b + numpy.copysign(root, b))
+        t1 = q / a
+        t2 = c / q
+        # target exactly as fast as the projectile: the equation is linear
+        linear = numpy.abs(a) < 1e-9
+        t1 = numpy.where(linear, -c / b, t1)
+        t2 = numpy.where(linear, numpy.nan, t2)
+        t1 = numpy.where(t1 >= 0, t1, numpy.nan)
+        t2 = numpy.where(t2 >= 0, t2, numpy.nan)
+        t = numpy.fmin(t1, t2)
+
+    heading = headings(shooterX, shooterY, targetX + targetVx * t, targetY + targetVy * t)
+    return numpy.where(numpy.isnan(t), numpy.nan, heading), t
+
+
+def interceptTurning(shooterX, shooterY, targetX, targetY, targetHeading, targetSpeed, targetTurnRate,
+                     projectileSpeed=physics.projectileSpeed, iterations=4):
+    '''
+    Aim for a target driving at constant speed and turn rate (a circle)
+
+    targetHeading is in degrees, targetSpeed may be negative for a tank in
+    reverse, and targetTurnRate is in degrees per second, positive for
+    clockwise; a tank turning on full lock does physics.turnRate. Returns
+    (heading, time) like interceptStraight, NaN where the target is at
+    least as fast as the projectile.
+
+    The miss distance g(t) = |p(t) - shooter| - s t falls at least as fast
+    as s - |v|, so it has exactly one root, and it lies in
+    [r / (s + |v|), r / (s - |v|)] for a target r away. Starting from the
+    flight time to where the target is now, each row takes Newton steps on
+    g, falling back to bisection whenever a step would leave the shrinking
+    bracket. A fixed number of iterations keeps the whole batch to the same
+    few NumPy calls; four already agree with a brute-force search to about
+    1e-13 s at arena ranges (see bench/bench_intercept.py).
+    '''
+    dx, dy, heading, speed, turnRate = numpy.broadcast_arrays(
+        numpy.subtract(targetX, shooterX), numpy.subtract(targetY, shooterY),
+        numpy.radians(targetHeading), numpy.asarray(targetSpeed, dtype=float), numpy.radians(targetTurnRate))
+    # a straight line is a very slow turn; 1e-6 rad/s bends it by well
+    # under a millimetre over any shot in the arena
+    turnRate = numpy.where(numpy.abs(turnRate) < 1e-6, numpy.copysign(1e-6, turnRate), turnRate)
+    radius = speed / turnRate
+    # with heading h moving along (cos h, -sin h), the target is at
+    # (cx + radius sin h(t), cy + radius cos h(t)) around the centre of its turn
+    cx = dx - radius * numpy.sin(heading)
+    cy = dy - radius * numpy.cos(heading)
+
+    distance = numpy.hypot(dx, dy)
+    absSpeed = numpy.abs(speed)
+    reachable = absSpeed < projectileSpeed
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        lo = distance / (projectileSpeed + absSpeed)
+        hi = numpy.where(reachable, distance / (projectileSpeed - absSpeed), numpy.nan)
+        t = distance / projectileSpeed
+
+        for _ in range(iterations):
+            h = heading + turnRate * t
+            sin, cos = numpy.sin(h), numpy.cos(h)
+            ox = cx + radius * sin
+            oy = cy + radius * cos
+            r = numpy.hypot(ox, oy)
+            g = r - projectileSpeed * t
+            # d|o|/dt = o.v / |o| with v = speed (cos h, -sin h)
+            slope = speed * (ox * cos - oy * sin) / numpy.maximum(r, 1e-12) - projectileSpeed
+            ahead = g > 0
+            lo = numpy.where(ahead, t, lo)
+            hi = numpy.where(ahead, hi, t)
+            step = t - g / slope
+            t = numpy.where((step >= lo) & (step <= hi), step, (lo + hi) / 2.0)
+
+        h = heading + turnRate * t
+        heading = headings(0.0, 0.0, cx + radius * numpy.sin(h), cy + radius * numpy.cos(h))
+    return numpy.where(reachable, heading, numpy.nan), numpy.where(reachable, t, numpy.nan)
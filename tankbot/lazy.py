@@ -0,0 +1,59 @@
+'''
+Deferred imports for the heavy numerical backends
+
+Importing NumPy costs on the order of a hundred milliseconds. The bots
+only need it once they start deciding, so that cost should not sit
+between starting the process and sending CREATETANK. lazyImport() hands
+out a stand-in that performs the real import on first attribute access,
+and prewarm() does those imports on a background thread in the meantime.
+'''
+
+import logging
+import importlib
+import threading
+
+
+class LazyModule(object):
+    '''
+    Stand-in for a module that imports it on first attribute access
+
+    After the import the module's namespace is copied into the stand-in,
+    so later attribute lookups are plain dict hits rather than calls.
+    importlib's module locks make a first access from the main thread wait
+    for a prewarm() thread that is already halfway through the import.
+    '''
+    def __init__(self, name):
+        self.__dict__['__name__'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError('lazily imported module {} is read only'.format(self.__name__))
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self.__name__)
+
+
+def lazyImport(name):
+    return LazyModule(name)
+
+
+def prewarm(*names):
+    '''
+    Import names on a daemon thread, returning the thread
+
+    Failures are only logged here; the first real use raises them again.
+    '''
+    def load():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError as error:
+                logging.debug('prewarming %s failed: %s', name, error)
+
+    thread = threading.Thread(target=load, name='prewarm', daemon=True)
+    thread.start()
+    return thread
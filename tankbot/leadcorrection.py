@@ -0,0 +1,118 @@
+import collections
+
+from tankbot.lazy import lazyImport
+from tankbot.motion import MotionClassifier
+
+numpy = lazyImport('numpy')
+
+
+Fired = collections.namedtuple('Fired', 'impact slack cell arm')
+
+
+class LeadCorrector(object):
+    '''
+    Learns during a match how much more or less to lead than the model says
+
+    Leads (firing heading minus line of sight, in degrees) get a scale and
+    a bias per range band and MotionClassifier label, both measured along
+    the lead, so scale 1.15 means fifteen percent more lead and bias 1 one
+    degree further ahead of the target, whichever way it crosses:
+
+        corrected = sign(lead) * (scale * |lead| + bias)
+
+    The server only says that one of our shots hit (SUCCESSFULLHIT), not
+    which or by how much anything missed, and a miss says nothing about
+    which way to move. So every cell keeps hit and shot counts for a short
+    list of candidate (scale, bias) pairs and picks the pair for its next
+    shot by Thompson sampling: one draw from each pair's Beta posterior on
+    its hit rate, highest draw wins. Pairs that hit get used, the rest
+    still get the odd try in case the game changes under us. Exploring
+    costs hits whenever the model is right, so a cell keeps to the
+    identity pair until explore of its shots have been resolved, and the
+    identity pair starts headStart hits up so a cell stays put without
+    evidence.
+
+    fired() records each shot with the pair it used and when it should
+    land; hit() credits the pending shot whose impact time is closest to
+    when the message arrives, within window seconds plus slack times the
+    flight time (a wrong model gets the flight time wrong as well), and
+    resolve() counts shots past that as misses.
+    '''
+    def __init__(self, bands=(20.0, 40.0, 70.0),
+                 pairs=((1.0, 0.0), (0.9, 0.0), (1.15, 0.0), (1.3, 0.0), (1.5, 0.0), (1.0, -1.0), (1.0, 1.0)),
+                 window=0.1, slack=0.5, headStart=20.0, explore=30, seed=None):
+        self.bands = numpy.asarray(bands, dtype=float)
+        self.scales, self.biases = numpy.asarray(pairs, dtype=float).T
+        self.window = window
+        self.slack = slack
+        self.headStart = headStart
+        self.explore = explore
+        self.rng = numpy.random.default_rng(seed)
+
+        shape = (len(bands) + 1, len(MotionClassifier.Names))
+        self.identity = identity = numpy.argmin(numpy.abs(self.scales - 1.0) + numpy.abs(self.biases))
+        self.hits = numpy.zeros(shape + self.scales.shape)
+        self.shots = numpy.zeros(shape + self.scales.shape)
+        self.hits[..., identity] = headStart
+        self.shots[..., identity] = headStart
+        self.resolved = numpy.zeros(shape, dtype=int)
+        self.arm = numpy.full(shape, identity)
+        self.pending = collections.deque()
+
+    def cells(self, distance, motion):
+        return numpy.searchsorted(self.bands, distance), numpy.asarray(motion, dtype=int)
+
+    def apply(self, lead, distance, motion):
+        '''
+        Corrected leads for targets distance away moving like motion; all
+        arguments broadcast together
+        '''
+        arm = self.arm[self.cells(distance, motion)]
+        return numpy.sign(lead) * (self.scales[arm] * numpy.abs(lead) + self.biases[arm])
+
+    def fired(self, now, flightTime, distance, motion):
+        '''
+        Record a shot fired at now, expected to land flightTime later, and
+        draw the pair its cell uses next
+        '''
+        band, motion = self.cells(distance, motion)
+        cell = (int(band), int(motion))
+        self.pending.append(Fired(now + flightTime, self.window + self.slack * flightTime, cell, self.arm[cell]))
+        if self.resolved[cell] < self.explore:
+            return
+        hits, shots = self.hits[cell], self.shots[cell]
+        self.arm[cell] = numpy.argmax(self.rng.beta(1.0 + hits, 1.0 + shots - hits))
+
+    def hit(self, now):
+        '''
+        Credit a SUCCESSFULLHIT received at now to the shot most likely to
+        have caused it
+        '''
+        self.resolve(now)
+        if not self.pending:
+            return
+        best = min(self.pending, key=lambda shot: abs(shot.impact - now) / shot.slack)
+        if abs(best.impact - now) <= best.slack:
+            self.pending.remove(best)
+            self.learn(best, 1.0)
+
+    def resolve(self, now):
+        '''
+        Count every shot whose window has passed without a hit as a miss
+        '''
+        for shot in [shot for shot in self.pending if shot.impact + shot.slack < now]:
+            self.pending.remove(shot)
+            self.learn(shot, 0.0)
+
+    def learn(self, shot, outcome):
+        self.hits[shot.cell + (shot.arm,)] += outcome
+        self.shots[shot.cell + (shot.arm,)] += 1
+        self.resolved[shot.cell] += 1
+
+    def best(self):
+        '''
+        (scales, biases) per range band and motion label of the pairs with
+        the best posterior mean hit rate so far
+        '''
+        arm = numpy.argmax((1.0 + self.hits) / (2.0 + self.shots), axis=-1)
+        return self.scales[arm], self.biases[arm]
@@ -0,0 +1,86 @@
+from tankbot.lazy import lazyImport
+
+numpy = lazyImport('numpy')
+
+
+class MotionClassifier(object):
+    '''
+    Running label of how every tracked tank is moving
+
+    Each update() looks at the last `window` samples of the rows that got
+    new ones (MotionHistory.velocity and turnFit, all rows in one pass) and
+    gives every row a raw label: Still below stillSpeed, Erratic when the
+    heading strays more than erraticResidual degrees (RMS) from a constant
+    turn, else Left or Right when turning faster than straightTurnRate
+    degrees per second and Straight otherwise. Fitting over a window rather
+    than comparing two snapshots is what keeps float jitter in the server's
+    positions and headings from reading as a turn.
+
+    Raw labels feed an exponentially smoothed vote per row (belief, one
+    column per label). The label only changes once another label's vote
+    leads the current one by more than hysteresis, and confidence is the
+    current label's vote, so a single odd update neither flips the label
+    nor goes unnoticed. Rows line up with EnemyTable rows, like
+    MotionHistory; fresh rows start out Erratic with no confidence.
+    '''
+    Still, Straight, Left, Right, Erratic = range(5)
+    Names = ('still', 'straight', 'left', 'right', 'erratic')
+
+    def __init__(self, rows=16, window=6, stillSpeed=0.5, straightTurnRate=10.0, erraticResidual=3.0,
+                 smoothing=0.3, hysteresis=0.2):
+        self.window = window
+        self.stillSpeed = stillSpeed
+        self.straightTurnRate = straightTurnRate
+        self.erraticResidual = erraticResidual
+        self.smoothing = smoothing
+        self.hysteresis = hysteresis
+
+        self.rows = 0
+        self.belief = numpy.zeros((0, len(self.Names)))
+        self.label = numpy.zeros(0, dtype=int)
+        self.grow(rows)
+
+    def grow(self, rows):
+        extra = rows - self.rows
+        self.belief = numpy.concatenate([self.belief, numpy.zeros((extra, len(self.Names)))])
+        self.label = numpy.concatenate([self.label, numpy.full(extra, self.Erratic)])
+        self.rows = rows
+
+    def reset(self, row):
+        self.belief[row] = 0.0
+        self.label[row] = self.Erratic
+
+    def classify(self, history, rows):
+        '''
+        Raw label of rows from their recent samples in history, -1 where
+        there are too few samples to tell
+        '''
+        vx, vy = history.velocity(rows, self.window)
+        speed = numpy.hypot(vx, vy)
+        turnRate, residual = history.turnFit(rows, self.window)
+        label = numpy.where(turnRate <= -self.straightTurnRate, self.Left,
+                            numpy.where(turnRate >= self.straightTurnRate, self.Right, self.Straight))
+        label = numpy.where(residual > self.erraticResidual, self.Erratic, label)
+        label = numpy.where(speed < self.stillSpeed, self.Still, label)
+        return numpy.where(numpy.isnan(speed) | numpy.isnan(turnRate), -1, label)
+
+    def update(self, history, rows):
+        '''
+        Fold the newest samples of rows into their labels
+        '''
+        rows = numpy.asarray(rows, dtype=int)
+        raw = self.classify(history, rows)
+        rows, raw = rows[raw >= 0], raw[raw >= 0]
+        vote = numpy.zeros((len(rows), len(self.Names)))
+        vote[numpy.arange(len(rows)), raw] = 1.0
+        belief = (1.0 - self.smoothing) * self.belief[rows] + self.smoothing * vote
+        leader = belief.argmax(axis=1)
+        current = self.label[rows]
+        index = numpy.arange(len(rows))
+        switch = belief[index, leader] - belief[index, current] > self.hysteresis
+        self.belief[rows] = belief
+        self.label[rows] = numpy.where(switch, leader, current)
+
+    def confidence(self, rows):
+        rows = numpy.asarray(rows, dtype=int)
+        return self.belief[rows, self.label[rows]]
@@ -0,0 +1,43 @@
+'''
+Game constants measured from the server, in arena units, seconds and degrees
+
+The values below are the hand-measured defaults. Anything fitted by
+tankbot.calibrate is read from tankbot/physics.json (or the file named by
+the TANKBOT_PHYSICS environment variable) on import and takes precedence,
+so every bot starts a match with the calibrated numbers without measuring
+anything itself.
+'''
+
+import os
+import json
+import math
+import logging
+
+
+Parameters = os.environ.get('TANKBOT_PHYSICS') or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               'physics.json')
+
+
+def load(path):
+    '''
+    Constants stored in the calibration file at path, {} when there is no
+    usable one
+    '''
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logging.warning('Ignoring unreadable physics parameters in %s', path)
+        return {}
+
+
+calibrated = load(Parameters)
+
+tankSpeed = calibrated.get('tankSpeed', 10)  # units per second, forwards or in reverse
+projectileSpeed = calibrated.get('projectileSpeed', 35)
+turnRadius = calibrated.get('turnRadius', 5.7815)  # radius of the circle a tank drives while moving and turning
+turnRate = calibrated.get('turnRate', math.degrees(tankSpeed / turnRadius))  # degrees per second the body turns
+turretTurnRate = calibrated.get('turretTurnRate', turnRate)  # assumed to match the body until calibrated
+hitRadius = 2.5  # rough distance from a tank's centre within which a projectile hits it, not measured yet
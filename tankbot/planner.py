@@ -0,0 +1,218 @@
+'''
+Where to drive next on the way to a destination, from cached distance
+fields over a grid of the arena
+
+A DistanceField holds, for every cell of an ArenaGrid, the length of the
+shortest 8-connected path to the nearest cell of its destination and
+which neighbour that path goes through. Building one is a search over
+the whole grid; after that the way on from any position is a walk of a
+few cells down those pointers, so a bot that moves and asks again every
+tick pays a lookup, not a search.
+
+Planner keeps the fields for the fixed destinations (the goal zones and
+the middle of the arena) for the whole match, and one per point for the
+last few points asked for, which is what pickups need: they sit still
+until taken. A point in plain sight needs no field at all and is driven
+at directly.
+'''
+
+import math
+import collections
+
+from tankbot.lazy import lazyImport
+
+numpy = lazyImport('numpy')
+
+
+class ArenaGrid(object):
+    '''
+    Square cells of cellSize units over the arena, and which are free
+
+    Row r and column c cover the cell centred on xLimits[0] + (c + 0.5) *
+    cellSize, yLimits[0] + (r + 0.5) * cellSize. The limits are where the
+    bots already drive to (the goal zones are entered at Y = ±105) plus a
+    margin, not measured walls. Nothing inside is blocked to begin with;
+    block() marks obstacles, and fields built afterwards route round them.
+    '''
+    def __init__(self, xLimits=(-70.0, 70.0), yLimits=(-110.0, 110.0), cellSize=2.5):
+        self.xLimits = xLimits
+        self.yLimits = yLimits
+        self.cellSize = cellSize
+        self.shape = (int(math.ceil((yLimits[1] - yLimits[0]) / cellSize)),
+                      int(math.ceil((xLimits[1] - xLimits[0]) / cellSize)))
+        self.free = numpy.ones(self.shape, dtype=bool)
+        self.version = 0  # bumped by block() so cached fields know they are stale
+
+    def cell(self, x, y):
+        '''
+        (row, column) of the cell holding (x, y), clamped into the grid
+        '''
+        row = int((y - self.yLimits[0]) // self.cellSize)
+        column = int((x - self.xLimits[0]) // self.cellSize)
+        return min(max(row, 0), self.shape[0] - 1), min(max(column, 0), self.shape[1] - 1)
+
+    def centre(self, row, column):
+        return (self.xLimits[0] + (column + 0.5) * self.cellSize,
+                self.yLimits[0] + (row + 0.5) * self.cellSize)
+
+    def centres(self):
+        '''
+        (x, y) arrays of every cell centre, shaped like the grid
+        '''
+        rows, columns = numpy.indices(self.shape)
+        return (self.xLimits[0] + (columns + 0.5) * self.cellSize,
+                self.yLimits[0] + (rows + 0.5) * self.cellSize)
+
+    def block(self, mask):
+        self.free &= ~mask
+        self.version += 1
+
+    def clear(self, x1, y1, x2, y2):
+        '''
+        Whether the straight line from (x1, y1) to (x2, y2) only crosses
+        free cells, sampled every half cell
+        '''
+        samples = max(1, int(math.hypot(x2 - x1, y2 - y1) / (0.5 * self.cellSize)))
+        for i in range(samples + 1):
+            share = i / samples
+            if not self.free[self.cell(x1 + share * (x2 - x1), y1 + share * (y2 - y1))]:
+                return False
+        return True
+
+
+class DistanceField(object):
+    '''
+    Shortest driving distance from every cell of grid to the cells of
+    destination (a boolean mask shaped like the grid), and the neighbour
+    each cell's shortest path continues through
+
+    The distances are what Dijkstra's algorithm would give over the
+    8-connected grid, with straight steps costing cellSize and diagonal
+    ones sqrt(2) cellSize. They are computed for all cells at once:
+    every sweep lets each cell take the cheapest of its neighbours plus
+    the step, and the sweeps stop when nothing improves, after as many
+    as the longest path has cells. Blocked and unreachable cells stay
+    infinite, but a blocked cell beside a reachable one still points out
+    of it, for a tank that has clipped an obstacle's corner.
+    '''
+    Steps = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+    def __init__(self, grid, destination):
+        self.grid = grid
+        self.version = grid.version
+        costs = numpy.array([math.hypot(*step) for step in self.Steps]) * grid.cellSize
+        rows, columns = grid.shape
+        distance = numpy.where(destination & grid.free, 0.0, numpy.inf)
+        while True:
+            padded = numpy.pad(distance, 1, constant_values=numpy.inf)
+            through = numpy.stack([padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + columns]
+                                   for dr, dc in self.Steps]) + costs[:, None, None]
+            best = numpy.where(grid.free, numpy.minimum(distance, through.min(axis=0)), numpy.inf)
+            if numpy.array_equal(best, distance):
+                break
+            distance = best
+        self.distance = distance
+        # index into Steps of the way on, -1 at the destination and where
+        # there is no way
+        self.step = numpy.where(numpy.isfinite(through.min(axis=0)) & (distance > 0), through.argmin(axis=0), -1)
+
+    def path(self, row, column, cells):
+        '''
+        Up to cells (row, column) pairs along the shortest path from the
+        given cell, not counting it
+        '''
+        path = []
+        for _ in range(cells):
+            step = self.step[row, column]
+            if step < 0:
+                break
+            dr, dc = self.Steps[step]
+            row, column = row + dr, column + dc
+            path.append((row, column))
+        return path
+
+    def waypoint(self, x, y, lookahead):
+        '''
+        (x, y) to drive straight at from (x, y): the furthest cell centre
+        within lookahead cells along the shortest path that can be seen
+        from there, or None once at the destination or if it cannot be
+        reached; driving at where we already are would only turn us to
+        heading 0
+        '''
+        row, column = self.grid.cell(x, y)
+        path = self.path(row, column, lookahead)
+        if not path:
+            return None
+        for cell in reversed(path):
+            waypoint = self.grid.centre(*cell)
+            if self.grid.clear(x, y, *waypoint):
+                return waypoint
+        return self.grid.centre(*path[0])
+
+
+class Planner(object):
+    '''
+    Waypoints towards the goal zones, the middle of the arena and points,
+    from DistanceFields built once and reused
+
+    goal() and middle() head for the nearest cell of either goal zone (the
+    mouths at |X| <= goalHalfWidth beyond |Y| = goalLine) and of the disc
+    of radius middleRadius around the origin. point() drives straight at
+    points it can see and otherwise keeps a field per destination cell,
+    the last cacheSize of them. Fields are rebuilt when the grid has had
+    obstacles added since. All three return None once there or when
+    there is no way there, for the caller to fall back on its own point.
+
+    Until something calls ArenaGrid.block() every cell is free, and then
+    point() always returns its target and goal() and middle() only walk
+    a straight line to the nearest destination cell. No obstacle layout
+    of the arena is known yet, so no bot uses a Planner.
+    '''
+    def __init__(self, grid=None, lookahead=8, cacheSize=16, goalHalfWidth=10.0, goalLine=105.0,
+                 middleRadius=10.0):
+        self.grid = grid or ArenaGrid()
+        self.lookahead = lookahead
+        self.cacheSize = cacheSize
+        self.goalHalfWidth = goalHalfWidth
+        self.goalLine = goalLine
+        self.middleRadius = middleRadius
+        self.fields = collections.OrderedDict()
+
+    def field(self, key, destination):
+        '''
+        The cached field for key, built from destination() (a function
+        returning the mask) if there is none or the grid has changed
+        '''
+        field = self.fields.get(key)
+        if field is None or field.version != self.grid.version:
+            field = self.fields[key] = DistanceField(self.grid, destination())
+        self.fields.move_to_end(key)
+        while len(self.fields) > self.cacheSize + 2:
+            del self.fields[next(cached for cached in self.fields if cached not in ('goal', 'middle'))]
+        return field
+
+    def goal(self, x, y):
+        def destination():
+            xs, ys = self.grid.centres()
+            return (numpy.abs(xs) <= self.goalHalfWidth) & (numpy.abs(ys) >= self.goalLine)
+        return self.field('goal', destination).waypoint(x, y, self.lookahead)
+
+    def middle(self, x, y):
+        def destination():
+            xs, ys = self.grid.centres()
+            return numpy.hypot(xs, ys) <= self.middleRadius
+        return self.field('middle', destination).waypoint(x, y, self.lookahead)
+
+    def point(self, x, y, targetX, targetY):
+        if self.grid.clear(x, y, targetX, targetY):
+            return targetX, targetY
+        target = self.grid.cell(targetX, targetY)
+
+        def destination():
+            mask = numpy.zeros(self.grid.shape, dtype=bool)
+            mask[target] = True
+            return mask
+        waypoint = self.field(target, destination).waypoint(x, y, self.lookahead)
+        if waypoint is not None and self.grid.cell(*waypoint) == target:
+            return targetX, targetY
+        return waypoint
@@ -0,0 +1,94 @@
+import sys
+import time
+import logging
+import binascii
+
+from tankbot.comms import ServerMessageTypes
+
+
+class FrameTrace(object):
+    '''
+    Fixed-size ring of the raw frames a connection sent and received
+
+    Comms objects only call record() when their trace attribute is set, so
+    an untraced connection pays a single None check per frame. Each entry is
+    a wall clock timestamp, a direction ('<' received, '>' sent) and the
+    frame bytes including the two byte header. dump() writes them oldest
+    first, one tab separated line each, in the format readTrace() parses.
+    '''
+    Received = '<'
+    Sent = '>'
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.times = [0.0] * size
+        self.directions = [None] * size
+        self.frames = [None] * size
+        self.count = 0
+
+    def record(self, direction, frame):
+        index = self.count % self.size
+        self.times[index] = time.time()
+        self.directions[index] = direction
+        self.frames[index] = bytes(frame)
+        self.count += 1
+
+    def entries(self):
+        '''
+        Yield (time, direction, frame) for every frame still held, oldest first
+        '''
+        first = max(0, self.count - self.size)
+        for position in range(first, self.count):
+            index = position % self.size
+            yield self.times[index], self.directions[index], self.frames[index]
+
+    def dump(self, stream=None):
+        '''
+        Write the ring to stream (stderr by default)
+        '''
+        stream = stream or sys.stderr
+        write = stream.write
+        names = ServerMessageTypes.strings
+        for timestamp, direction, frame in self.entries():
+            write('%.6f\t%s\t%s\t%s\n' % (timestamp, direction, names.get(frame[0], frame[0]),
+                                          binascii.hexlify(frame).decode('ascii')))
+        stream.flush()
+
+    def dumpToFile(self, path):
+        with open(path, 'w') as stream:
+            self.dump(stream)
+        logging.info('Wrote %d traced frames to %s', min(self.count, self.size), path)
+
+    def installCrashHandler(self, path=None):
+        '''
+        Dump the ring when the process dies from an uncaught exception
+
+        Goes to path if given, otherwise to stderr. Ctrl-C counts as a crash
+        here, which makes it the easiest way to get a dump on demand.
+        '''
+        previousHook = sys.excepthook
+
+        def dumpAndRaise(excType, excValue, excTraceback):
+            try:
+                if path:
+                    self.dumpToFile(path)
+                else:
+                    self.dump()
+            finally:
+                previousHook(excType, excValue, excTraceback)
+
+        sys.excepthook = dumpAndRaise
+
+
+def readTrace(path):
+    '''
+    Parse a FrameTrace dump, yielding (time, direction, messageType, payload)
+    '''
+    with open(path) as stream:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            timestamp, direction, name, frame = line.split('\t')
+            frame = binascii.unhexlify(frame)
+            yield float(timestamp), direction, frame[0], frame[2:]
@@ -0,0 +1,171 @@
+import math
+
+from tankbot.lazy import lazyImport
+from tankbot.geometry import angleDifferences, normalizeHeadings
+
+numpy = lazyImport('numpy')
+
+
+class MotionTracker(object):
+    '''
+    Constant turn rate and velocity (CTRV) Kalman filter for every tracked tank
+
+    Each row holds the state [x, y, v, heading, turnRate] of one tank as of
+    t[row], the time of its last measurement, with its covariance. Rows line
+    up with EnemyTable rows, like MotionHistory.
+
+    observe() only records a measurement of (X, Y, Heading); step() then
+    predicts every row that has a pending measurement forward to its own
+    measurement time and applies all of those updates at once as batched
+    extended Kalman filter equations, so a tick costs the same NumPy calls
+    whether one enemy reported or ten. estimate() extrapolates rows to any
+    time without touching the filter, which is how tanks that have not been
+    seen for a while still get a position, with an uncertainty that grows
+    the longer they stay unseen.
+
+    Internally heading is in radians and turnRate in radians per second,
+    using the same clockwise convention as tankbot.geometry; estimate()
+    hands both back in degrees.
+    '''
+    States = 5
+    Observed = (0, 1, 3)
+
+    def __init__(self, rows=16, positionNoise=0.5, headingNoise=2.0, accelerationNoise=5.0, turnNoise=90.0,
+                 initialSpeed=10.0, initialTurnRate=90.0):
+        '''
+        positionNoise and headingNoise are the measurement standard deviations
+        (units, degrees), accelerationNoise and turnNoise how quickly speed and
+        turn rate are expected to change (units/s², degrees/s²), and
+        initialSpeed and initialTurnRate the spread assumed for a tank seen
+        for the first time.
+        '''
+        self.measurementNoise = numpy.diag([positionNoise ** 2, positionNoise ** 2, math.radians(headingNoise) ** 2])
+        self.accelerationNoise = accelerationNoise
+        self.turnNoise = math.radians(turnNoise)
+        self.initialCovariance = numpy.diag([positionNoise ** 2, positionNoise ** 2, initialSpeed ** 2,
+                                             math.radians(headingNoise) ** 2, math.radians(initialTurnRate) ** 2])
+        self.observation = numpy.zeros((len(self.Observed), self.States))
+        self.observation[range(len(self.Observed)), self.Observed] = 1.0
+
+        self.rows = 0
+        self.state = numpy.zeros((0, self.States))
+        self.covariance = numpy.zeros((0, self.States, self.States))
+        self.t = numpy.zeros(0)
+        self.initialised = numpy.zeros(0, dtype=bool)
+        self.pending = numpy.zeros(0, dtype=bool)
+        self.measurement = numpy.zeros((0, len(self.Observed)))
+        self.measurementTime = numpy.zeros(0)
+        self.grow(rows)
+
+    def grow(self, rows):
+        extra = rows - self.rows
+        self.state = numpy.concatenate([self.state, numpy.zeros((extra, self.States))])
+        self.covariance = numpy.concatenate([self.covariance, numpy.zeros((extra, self.States, self.States))])
+        self.t = numpy.concatenate([self.t, numpy.zeros(extra)])
+        self.initialised = numpy.concatenate([self.initialised, numpy.zeros(extra, dtype=bool)])
+        self.pending = numpy.concatenate([self.pending, numpy.zeros(extra, dtype=bool)])
+        self.measurement = numpy.concatenate([self.measurement, numpy.zeros((extra, len(self.Observed)))])
+        self.measurementTime = numpy.concatenate([self.measurementTime, numpy.zeros(extra)])
+        self.rows = rows
+
+    def reset(self, row):
+        self.initialised[row] = False
+        self.pending[row] = False
+
+    def observe(self, row, t, x, y, heading):
+        '''
+        Queue a measurement for row; only the latest one per step() is used
+        '''
+        self.measurement[row] = (x, y, math.radians(heading))
+        self.measurementTime[row] = t
+        self.pending[row] = True
+
+    def step(self):
+        '''
+        Fold every pending measurement into its row, returning the rows updated
+        '''
+        rows = numpy.flatnonzero(self.pending)
+        self.pending[rows] = False
+        fresh = rows[~self.initialised[rows]]
+        if len(fresh):
+            self.state[fresh] = 0.0
+            self.state[fresh[:, None], self.Observed] = self.measurement[fresh]
+            self.covariance[fresh] = self.initialCovariance
+            self.t[fresh] = self.measurementTime[fresh]
+            self.initialised[fresh] = True
+        rows = rows[numpy.isin(rows, fresh, invert=True)]
+        if len(rows) == 0:
+            return numpy.concatenate([fresh, rows])
+
+        state, covariance = self.predict(rows, self.measurementTime[rows] - self.t[rows])
+        H = self.observation
+        innovation = self.measurement[rows] - state[:, self.Observed]
+        innovation[:, 2] = numpy.radians(angleDifferences(numpy.degrees(innovation[:, 2]), 0.0))
+        S = H @ covariance @ H.T + self.measurementNoise
+        # K = P H' S^-1, solved rather than inverted; S is symmetric
+        gain = numpy.linalg.solve(S, (covariance @ H.T).transpose(0, 2, 1)).transpose(0, 2, 1)
+        state = state + numpy.einsum('nij,nj->ni', gain, innovation)
+        covariance = covariance - gain @ H @ covariance
+        self.state[rows] = state
+        self.covariance[rows] = (covariance + covariance.transpose(0, 2, 1)) / 2.0
+        self.t[rows] = self.measurementTime[rows]
+        return numpy.concatenate([fresh, rows])
+
+    def predict(self, rows, dt):
+        '''
+        State and covariance of rows after dt seconds (scalar or per row)
+        '''
+        state = self.state[rows]
+        covariance = self.covariance[rows]
+        dt = numpy.broadcast_to(numpy.asarray(dt, dtype=float), (len(rows),))
+        x, y, v, h, w = state.T
+
+        turning = numpy.abs(w) > 1e-4
+        safeW = numpy.where(turning, w, 1.0)
+        h1 = h + w * dt
+        s0, c0 = numpy.sin(h), numpy.cos(h)
+        s1, c1 = numpy.sin(h1), numpy.cos(h1)
+
+        # heading h moves along (cos h, -sin h); integrate that over a constant
+        # turn, falling back to the straight line limit as w -> 0
+        dx = numpy.where(turning, v / safeW * (s1 - s0), v * c0 * dt)
+        dy = numpy.where(turning, v / safeW * (c1 - c0), -v * s0 * dt)
+
+        F = numpy.tile(numpy.eye(self.States), (len(rows), 1, 1))
+        F[:, 0, 2] = numpy.where(turning, (s1 - s0) / safeW, c0 * dt)
+        F[:, 0, 3] = numpy.where(turning, v / safeW * (c1 - c0), -v * s0 * dt)
+        F[:, 0, 4] = numpy.where(turning, v * c1 * dt / safeW - v * (s1 - s0) / safeW ** 2, -v * s0 * dt * dt / 2.0)
+        F[:, 1, 2] = numpy.where(turning, (c1 - c0) / safeW, -s0 * dt)
+        F[:, 1, 3] = numpy.where(turning, v / safeW * (s0 - s1), -v * c0 * dt)
+        F[:, 1, 4] = numpy.where(turning, -v * s1 * dt / safeW - v * (c1 - c0) / safeW ** 2, -v * c0 * dt * dt / 2.0)
+        F[:, 3, 4] = dt
+
+        # process noise from random longitudinal and angular acceleration
+        G = numpy.zeros((len(rows), self.States, 2))
+        G[:, 0, 0] = dt * dt / 2.0 * c0
+        G[:, 1, 0] = -dt * dt / 2.0 * s0
+        G[:, 2, 0] = dt
+        G[:, 3, 1] = dt * dt / 2.0
+        G[:, 4, 1] = dt
+        noise = numpy.diag([self.accelerationNoise ** 2, self.turnNoise ** 2])
+
+        state = numpy.stack([x + dx, y + dy, v, h1, w], axis=1)
+        covariance = F @ covariance @ F.transpose(0, 2, 1) + G @ noise @ G.transpose(0, 2, 1)
+        return state, covariance
+
+    def estimate(self, rows, now):
+        '''
+        (x, y, speed, heading, turnRate, sigma) of rows extrapolated to now,
+        which may also be an array with one time per row
+
+        Heading is in degrees and turnRate in degrees per second, positive
+        for clockwise. sigma is the standard deviation of the position error
+        (root of the summed x and y variances). Rows that have never been
+        updated come back as NaN.
+        '''
+        rows = numpy.asarray(rows, dtype=int)
+        state, covariance = self.predict(rows, now - self.t[rows])
+        sigma = numpy.sqrt(covariance[:, 0, 0] + covariance[:, 1, 1])
+        state[~self.initialised[rows]] = numpy.nan
+        x, y, v, h, w = state.T
+        return x, y, v, normalizeHeadings(numpy.degrees(h)), numpy.degrees(w), sigma
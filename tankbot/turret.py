@@ -0,0 +1,58 @@
+from tankbot import physics
+from tankbot.lazy import lazyImport
+from tankbot.geometry import angleDifferences, normalizeHeadings
+
+numpy = lazyImport('numpy')
+
+
+class TurretModel(object):
+    '''
+    When a turret catches up with an aim point that keeps moving
+
+    The turret turns the short way round towards its commanded heading at
+    turretTurnRate and stops there. The aim point, e.g. the lead on a
+    crossing target, is taken to swing at a constant aimRate (degrees per
+    second, positive clockwise) over the next moments, so the gap between
+    the two closes at turretTurnRate - aimRate when chasing clockwise and
+    turretTurnRate + aimRate when chasing anticlockwise. Everything accepts
+    scalars or NumPy arrays.
+    '''
+    def __init__(self, turretTurnRate=physics.turretTurnRate):
+        self.turretTurnRate = turretTurnRate
+
+    def convergence(self, turretHeading, aim, aimRate, tolerance=0.0):
+        '''
+        Seconds until a turret chasing aim is within tolerance degrees of
+        it, 0 if it already is and inf if the aim point outruns the turret
+        '''
+        gap = angleDifferences(aim, turretHeading)
+        closing = self.turretTurnRate - numpy.sign(gap) * aimRate
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t = numpy.where(closing > 0, (numpy.abs(gap) - tolerance) / closing, numpy.inf)
+        return numpy.where(numpy.abs(gap) <= tolerance, 0.0, t)
+
+    def meeting(self, turretHeading, aim, aimRate, overshoot=0.0):
+        '''
+        (heading, time) at which a turret chasing aim lines up with a point
+        overshoot degrees ahead of it in the direction it swings
+
+        Commanding that heading rather than the current aim lets the turret
+        wait there for the aim point to sweep through, instead of being
+        sent after it again every tick.
+        '''
+        ahead = numpy.add(aim, numpy.sign(aimRate) * overshoot)
+        t = self.convergence(turretHeading, ahead, aimRate)
+        # an aim point that is never caught is still the best place to head for
+        swing = aimRate * numpy.where(numpy.isfinite(t), t, 0.0)
+        return normalizeHeadings(ahead + swing), t
+
+    def advance(self, turretHeading, commanded, dt):
+        '''
+        Turret heading dt seconds on, turning towards commanded (None for a
+        turret standing still)
+        '''
+        if commanded is None:
+            return turretHeading
+        gap = angleDifferences(commanded, turretHeading)
+        step = numpy.minimum(numpy.abs(gap), self.turretTurnRate * dt)
+        return normalizeHeadings(turretHeading + numpy.sign(gap) * step)